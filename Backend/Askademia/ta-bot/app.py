@@ -0,0 +1,210 @@
+"""
+HTTP gateway for the UI, on aiohttp.
+
+    GET /?question=...[&course=ID]
+                               -> {"q": ..., "answer": ...} or {"q": ..., "error": ...}
+                                  (only that course's material is searched if given)
+    GET /stream?question=...[&course=ID]
+                               -> text/event-stream of `chunk` events (TAResponseChunk
+                                  JSON, last one has "final": true) or one `error`
+                                  event (ErrorResponse JSON)
+    GET /courses[?course=ID]   -> {"courses": {ID: {"files", "chunks", "tokens", ...}}}
+                                  from the document catalog (db/catalog.py)
+    GET /metrics               -> Prometheus metrics (utils/logging_conf.py)
+    GET /healthz               -> {"ok": true, "active": n, "waiting": n}
+
+Questions go through the same pipeline as the TA agent (src/pipeline.py:
+worker pool, answer cache, coalescing, shared Gemini/Mongo clients warmed
+up at startup). At most `HTTP_MAX_ACTIVE` requests are answered at once and
+up to `HTTP_MAX_QUEUE` more wait for a turn; a full queue is answered 429,
+a wait longer than `HTTP_QUEUE_TIMEOUT` 503 (both with Retry-After). Every
+request has an `HTTP_DEADLINE`; when it passes or the client disconnects,
+the remaining pipeline stages are cancelled.
+
+    python app.py                                   # real backends
+    python app.py --fake --ttft-ms 800 --token-ms 10  # local fakes, for load tests
+"""
+import sys
+import os
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+import json
+import time
+import asyncio
+import logging
+import argparse
+import contextlib
+from aiohttp import web
+
+from src.pipeline import answer_query, stream_answer, run_blocking, BUSY_MESSAGE, NO_MATERIAL_MESSAGE
+from src.models import ErrorResponse
+from db.catalog import course_stats
+from src.gemini_handler import RATE_LIMITED_MESSAGE
+from utils.logging_conf import render_metrics, trace, count, METRICS, setup_logging
+from utils import fakes
+import config
+
+logger = logging.getLogger("askademia.http")
+
+RETRY_AFTER = "5"                       # seconds suggested to clients on 429 / 503
+DEADLINE_MESSAGE = "Sorry, answering this question took too long. Please try again."
+
+class Overloaded(Exception):
+    def __init__(self, status: int, message: str):
+        super().__init__(message)
+        self.status = status
+
+class Gate:
+    """
+    Admission control: *active* requests run, up to *queue* more wait at most
+    *timeout* seconds for a turn. Rejections raise `Overloaded` (429 / 503).
+    """
+
+    def __init__(self, active: int, queue: int, timeout: float):
+        self._sem    = asyncio.Semaphore(active)
+        self.limit   = active
+        self.queue   = queue
+        self.timeout = timeout
+        self.active  = 0
+        self.waiting = 0
+
+    @contextlib.asynccontextmanager
+    async def admit(self):
+        if self.active + self.waiting >= self.limit + self.queue:
+            raise Overloaded(429, "Too many questions are queued, please try again shortly.")
+        start = time.perf_counter()
+        self.waiting += 1
+        try:
+            await asyncio.wait_for(self._sem.acquire(), timeout=self.timeout)
+        except asyncio.TimeoutError:
+            raise Overloaded(503, "The TA is busy right now, please try again in a moment.")
+        finally:
+            self.waiting -= 1
+            METRICS.observe("askademia_stage_seconds", time.perf_counter() - start, stage="http_queue")
+        self.active += 1
+        try:
+            yield
+        finally:
+            self.active -= 1
+            self._sem.release()
+
+def _params(request: web.Request) -> tuple[str | None, str]:
+    return request.query.get("question"), request.query.get("course") or config.DEFAULT_COURSE_ID
+
+def _error_status(error: str) -> int:
+    if error.startswith(NO_MATERIAL_MESSAGE.split("'")[0]):
+        return 404                      # course has no documents
+    return 503 if error in (BUSY_MESSAGE, RATE_LIMITED_MESSAGE) else 502
+
+def _json_error(question, status: int, error: str) -> web.Response:
+    headers = {"Retry-After": RETRY_AFTER} if status in (429, 503) else None
+    return web.json_response({"q": question, "error": error}, status=status, headers=headers)
+
+def _sse(event: str, msg) -> bytes:
+    return f"event: {event}\ndata: {json.dumps(msg.model_dump())}\n\n".encode("utf-8")
+
+# --- Handlers ---
+async def ask(request: web.Request) -> web.Response:
+    question, course_id = _params(request)
+    if not question:
+        return _json_error(question, 400, "Missing 'question' parameter.")
+
+    status = 200
+    try:
+        with trace("http_query", course_id=course_id):
+            async with request.app["gate"].admit():
+                async with asyncio.timeout(config.HTTP_DEADLINE):
+                    result = await answer_query(question, course_id)
+        if isinstance(result, ErrorResponse):
+            status = _error_status(result.error)
+            return _json_error(question, status, result.error)
+        return web.json_response({"q": question, "answer": result.answer})
+    except Overloaded as e:
+        status = e.status
+        return _json_error(question, status, str(e))
+    except TimeoutError:
+        status = 504
+        return _json_error(question, status, DEADLINE_MESSAGE)
+    except asyncio.CancelledError:
+        status = 499                    # client closed the connection
+        raise
+    finally:
+        count("askademia_http_requests_total", route="ask", status=status)
+
+async def stream(request: web.Request) -> web.StreamResponse:
+    question, course_id = _params(request)
+    if not question:
+        return _json_error(question, 400, "Missing 'question' parameter.")
+
+    status = 200
+    try:
+        with trace("http_stream", course_id=course_id):
+            async with request.app["gate"].admit():
+                resp = web.StreamResponse(headers={"Content-Type": "text/event-stream",
+                                                   "Cache-Control": "no-cache",
+                                                   "X-Accel-Buffering": "no"})
+                await resp.prepare(request)
+                try:
+                    async with asyncio.timeout(config.HTTP_DEADLINE):
+                        # aclosing: a disconnect / deadline also stops the Gemini stream
+                        async with contextlib.aclosing(stream_answer(question, course_id)) as parts:
+                            async for part in parts:
+                                event = "error" if isinstance(part, ErrorResponse) else "chunk"
+                                await resp.write(_sse(event, part))
+                except TimeoutError:
+                    status = 504
+                    await resp.write(_sse("error", ErrorResponse(error=DEADLINE_MESSAGE)))
+                await resp.write_eof()
+                return resp
+    except Overloaded as e:
+        status = e.status
+        return _json_error(question, status, str(e))
+    except (asyncio.CancelledError, ConnectionResetError):
+        status = 499
+        raise
+    finally:
+        count("askademia_http_requests_total", route="stream", status=status)
+
+async def courses(request: web.Request) -> web.Response:
+    stats = await run_blocking(course_stats, request.query.get("course"))
+    return web.json_response({"courses": stats})
+
+async def metrics(request: web.Request) -> web.Response:
+    return web.Response(text=render_metrics(), content_type="text/plain",
+                        headers={"X-Prometheus-Format": "0.0.4"})
+
+async def healthz(request: web.Request) -> web.Response:
+    gate = request.app["gate"]
+    return web.json_response({"ok": True, "active": gate.active, "waiting": gate.waiting})
+
+# --- Application ---
+async def _warm_up(app: web.Application):
+    if config.TA_WARMUP:
+        from src.warmup import warm_up
+        timings = await asyncio.get_running_loop().run_in_executor(None, warm_up)
+        logger.info("Warm-up: " + ", ".join(f"{k} {v:.0f} ms" for k, v in timings.items()))
+
+def create_app() -> web.Application:
+    app = web.Application()
+    app["gate"] = Gate(config.HTTP_MAX_ACTIVE, config.HTTP_MAX_QUEUE, config.HTTP_QUEUE_TIMEOUT)
+    app.router.add_get("/", ask)
+    app.router.add_get("/stream", stream)
+    app.router.add_get("/courses", courses)
+    app.router.add_get("/metrics", metrics)
+    app.router.add_get("/healthz", healthz)
+    app.on_startup.append(_warm_up)
+    return app
+
+if __name__ == "__main__":
+    ap = argparse.ArgumentParser(description="Askademia HTTP gateway.")
+    ap.add_argument("--host", default=config.HTTP_HOST)
+    ap.add_argument("--port", type=int, default=config.HTTP_PORT)
+    fakes.add_arguments(ap)
+    args = ap.parse_args()
+
+    setup_logging(logging.INFO)
+    if fakes.install_from_args(args):
+        logger.info(f"Serving from local fakes ({args.corpus_size} chunks)")
+    # handler_cancellation: a client disconnect cancels its handler (and the pipeline work)
+    web.run_app(create_app(), host=args.host, port=args.port, handler_cancellation=True,
+                backlog=2048, access_log=None)
@@ -10,16 +10,155 @@ MONGO_URI = os.getenv("MONGO_URI")
 GEMINI_API_KEY = os.getenv("GEMINI_API_KEY")
 
 # --- TA Agent Configuration ---
-TA_AGENT_NAME = "askademia_ta_agent"
+TA_AGENT_NAME = os.getenv("TA_AGENT_NAME", "askademia_ta_agent")
 # It's better practice to load sensitive seeds from environment variables
 TA_AGENT_SEED = os.getenv("TA_AGENT_SEED", "askademia_ta_default_dev_seed") 
-TA_AGENT_PORT = 8001 # Default port for the TA agent
-TA_AGENT_ENDPOINT = f"http://localhost:{TA_AGENT_PORT}/submit" # Default local endpoint
-# You might want to make the endpoint configurable via environment variables too:
-# TA_AGENT_ENDPOINT = os.getenv("TA_AGENT_ENDPOINT", f"http://localhost:{TA_AGENT_PORT}/submit")
+TA_AGENT_PORT = int(os.getenv("TA_AGENT_PORT", "8001")) # Default port for the TA agent
+TA_AGENT_ENDPOINT = os.getenv("TA_AGENT_ENDPOINT", f"http://localhost:{TA_AGENT_PORT}/submit")
+
+# Prometheus-style metrics endpoint for the agent (0 disables it); trace
+# sampling is set with TRACE_SAMPLE_RATE / TRACE_LOG_PATH (utils/logging_conf.py)
+METRICS_PORT = int(os.getenv("METRICS_PORT", "9108"))
+
+# Pre-open the Mongo pool and Gemini connections before accepting messages
+TA_WARMUP = os.getenv("TA_WARMUP", "1") == "1"
+
+# Concurrency: blocking RAG stages run on a worker pool; queries beyond the
+# in-flight limit wait up to TA_QUEUE_TIMEOUT seconds before being rejected
+TA_WORKER_THREADS = int(os.getenv("TA_WORKER_THREADS", "32"))
+TA_MAX_IN_FLIGHT = int(os.getenv("TA_MAX_IN_FLIGHT", "64"))
+TA_QUEUE_TIMEOUT = float(os.getenv("TA_QUEUE_TIMEOUT", "30"))
+# BatchStudentQuery: max questions per batch, and how many of them are answered at once
+# (a batch holds one in-flight slot; Gemini limits in utils/gemini_client.py still apply)
+TA_BATCH_MAX_QUERIES = int(os.getenv("TA_BATCH_MAX_QUERIES", "200"))
+TA_BATCH_CONCURRENCY = int(os.getenv("TA_BATCH_CONCURRENCY", "16"))
+# Course searched when a query does not name one; unset searches the whole
+# collection (no course filter), as the UI and send_test_query.py send none
+DEFAULT_COURSE_ID = os.getenv("DEFAULT_COURSE_ID") or None
+# Optional per-course retrieval tuning, JSON of
+# {"COURSE_ID": {"num_candidates": 150, "limit": 5}, ...}
+COURSE_SEARCH_SETTINGS_PATH = os.getenv("COURSE_SEARCH_SETTINGS_PATH", "data/course_search.json")
+# Answer questions for courses the document catalog (db/catalog.py) lists
+# without any chunks right away, without embedding or searching
+CATALOG_ROUTING = os.getenv("CATALOG_ROUTING", "1") == "1"
+
+# --- Prompt Context ---
+# Retrieved chunks are merged / de-duplicated and cut to this many tokens
+CONTEXT_TOKEN_BUDGET = int(os.getenv("CONTEXT_TOKEN_BUDGET", "2500"))
+CONTEXT_MMR_LAMBDA = float(os.getenv("CONTEXT_MMR_LAMBDA", "0.7")) # 1.0 = relevance only, lower = more diverse
+CONTEXT_DEDUP_THRESHOLD = float(os.getenv("CONTEXT_DEDUP_THRESHOLD", "0.8")) # shingle overlap counted as duplicate
+
+# --- Conversation Memory (src/conversation.py, TA agent only) ---
+# Per (sender, course) sessions: recent turns up to CONVERSATION_HISTORY_TOKENS,
+# older ones compacted into a summary of at most CONVERSATION_SUMMARY_TOKENS
+CONVERSATION_ENABLED = os.getenv("CONVERSATION_ENABLED", "1") == "1"
+CONVERSATION_HISTORY_TOKENS = int(os.getenv("CONVERSATION_HISTORY_TOKENS", "600"))
+CONVERSATION_SUMMARY_TOKENS = int(os.getenv("CONVERSATION_SUMMARY_TOKENS", "200"))
+CONVERSATION_IDLE_TTL = float(os.getenv("CONVERSATION_IDLE_TTL", "1800")) # seconds before a session is forgotten
+CONVERSATION_MAX_SESSIONS = int(os.getenv("CONVERSATION_MAX_SESSIONS", "5000"))
+CONVERSATION_MAX_MB = float(os.getenv("CONVERSATION_MAX_MB", "64")) # all sessions together (approximate)
+CONVERSATION_REUSE_THRESHOLD = float(os.getenv("CONVERSATION_REUSE_THRESHOLD", "0.9")) # re-use the previous chunks above this similarity
+
+# --- Gemini Client (utils/gemini_client.py) ---
+GEMINI_BASE_URL = os.getenv("GEMINI_BASE_URL", "") # e.g. http://127.0.0.1:8089 for utils/gemini_standin.py
+# Quotas per model family (0 = unlimited); set these to your API tier's limits
+GEMINI_EMBED_RPM = float(os.getenv("GEMINI_EMBED_RPM", "1500"))
+GEMINI_EMBED_TPM = float(os.getenv("GEMINI_EMBED_TPM", "0"))
+GEMINI_GENERATE_RPM = float(os.getenv("GEMINI_GENERATE_RPM", "1000"))
+GEMINI_GENERATE_TPM = float(os.getenv("GEMINI_GENERATE_TPM", "1000000"))
+# Calls in flight per call type
+GEMINI_QUERY_EMBED_CONCURRENCY = int(os.getenv("GEMINI_QUERY_EMBED_CONCURRENCY", "16"))
+GEMINI_INGEST_EMBED_CONCURRENCY = int(os.getenv("GEMINI_INGEST_EMBED_CONCURRENCY", "4"))
+GEMINI_GENERATE_CONCURRENCY = int(os.getenv("GEMINI_GENERATE_CONCURRENCY", "16"))
+# Share of the embed budget ingestion must leave for live queries
+GEMINI_INGEST_RESERVE = float(os.getenv("GEMINI_INGEST_RESERVE", "0.2"))
+# Deadlines (seconds) and retry policy (jittered exponential backoff)
+GEMINI_EMBED_DEADLINE = float(os.getenv("GEMINI_EMBED_DEADLINE", "10"))
+GEMINI_INGEST_DEADLINE = float(os.getenv("GEMINI_INGEST_DEADLINE", "300"))
+GEMINI_GENERATE_DEADLINE = float(os.getenv("GEMINI_GENERATE_DEADLINE", "60"))
+GEMINI_MAX_RETRIES = int(os.getenv("GEMINI_MAX_RETRIES", "5"))
+GEMINI_BACKOFF_BASE = float(os.getenv("GEMINI_BACKOFF_BASE", "0.5"))
+GEMINI_BACKOFF_MAX = float(os.getenv("GEMINI_BACKOFF_MAX", "20"))
+
+# --- Query Embedding Cache (embeddings/embed_cache.py) ---
+EMBED_CACHE_ENABLED = os.getenv("EMBED_CACHE_ENABLED", "1") == "1"
+EMBED_CACHE_MAX_ENTRIES = int(os.getenv("EMBED_CACHE_MAX_ENTRIES", "10000")) # in memory, ~3 KB each
+EMBED_CACHE_PATH = os.getenv("EMBED_CACHE_PATH", "") # SQLite file shared across processes/restarts; "" = memory only
+EMBED_CACHE_MAX_ROWS = int(os.getenv("EMBED_CACHE_MAX_ROWS", "100000")) # in the SQLite file (all models), oldest pruned
+
+# --- Semantic Answer Cache ---
+ANSWER_CACHE_ENABLED = os.getenv("ANSWER_CACHE_ENABLED", "1") == "1"
+ANSWER_CACHE_THRESHOLD = float(os.getenv("ANSWER_CACHE_THRESHOLD", "0.95")) # cosine similarity for a hit
+ANSWER_CACHE_TTL = int(os.getenv("ANSWER_CACHE_TTL", "3600")) # seconds
+ANSWER_CACHE_MAX_ENTRIES = int(os.getenv("ANSWER_CACHE_MAX_ENTRIES", "1000"))
+
+# --- Multi-worker Deployment (src/supervisor.py) ---
+# The supervisor keeps the TA agent's name/seed/port above (students see the
+# same address) and relays queries to TA_WORKERS worker processes; worker i
+# listens on TA_WORKER_BASE_PORT + i and uses the seed "<TA_AGENT_SEED>/worker-i"
+TA_WORKERS = int(os.getenv("TA_WORKERS", "0")) # 0 = one per CPU core
+TA_WORKER_BASE_PORT = int(os.getenv("TA_WORKER_BASE_PORT", "8101"))
+TA_ROUTING = os.getenv("TA_ROUTING", "affinity") # "affinity" (same course -> same worker) or "round_robin"
+TA_HEALTH_INTERVAL = float(os.getenv("TA_HEALTH_INTERVAL", "5")) # seconds between worker probes
+TA_HEALTH_FAILURES = int(os.getenv("TA_HEALTH_FAILURES", "3")) # failed probes in a row before a restart
+TA_WORKER_START_GRACE = float(os.getenv("TA_WORKER_START_GRACE", "60")) # seconds a new worker has to become ready
+TA_RELAY_TIMEOUT = float(os.getenv("TA_RELAY_TIMEOUT", "300")) # forget unanswered relays after this many seconds
+# Agents reachable without an Almanac lookup (local testing, load tests), as
+# "agent1...=http://127.0.0.1:8002/submit,agent1...=..."
+LOCAL_AGENT_ENDPOINTS = os.getenv("LOCAL_AGENT_ENDPOINTS", "")
+# Set by the supervisor on its workers: where to send replies (no Almanac lookup)
+TA_ROUTER_ADDRESS = os.getenv("TA_ROUTER_ADDRESS", "")
+TA_ROUTER_ENDPOINT = os.getenv("TA_ROUTER_ENDPOINT", "")
+
+# --- HTTP Gateway (app.py) ---
+HTTP_HOST = os.getenv("HTTP_HOST", "0.0.0.0")
+HTTP_PORT = int(os.getenv("HTTP_PORT", "5000"))
+# Requests being answered at once; up to HTTP_MAX_QUEUE more wait (429 beyond that)
+# for at most HTTP_QUEUE_TIMEOUT seconds (then 503)
+HTTP_MAX_ACTIVE = int(os.getenv("HTTP_MAX_ACTIVE", "256"))
+HTTP_MAX_QUEUE = int(os.getenv("HTTP_MAX_QUEUE", "1024"))
+HTTP_QUEUE_TIMEOUT = float(os.getenv("HTTP_QUEUE_TIMEOUT", "10"))
+# Whole-request deadline in seconds (504 / error event when exceeded)
+HTTP_DEADLINE = float(os.getenv("HTTP_DEADLINE", "60"))
 
 # --- Test Student Agent Configuration ---
 STUDENT_AGENT_NAME = "test_student_agent"
 STUDENT_AGENT_SEED = os.getenv("STUDENT_AGENT_SEED", "test_student_default_dev_seed")
 STUDENT_AGENT_PORT = 8002 # Default port for the student agent if it needs one
 STUDENT_AGENT_ENDPOINT = f"http://localhost:{STUDENT_AGENT_PORT}/submit"
+
+# --- Retrieval Backend ---
+# "atlas" queries MongoDB Atlas $vectorSearch; "local" serves top-k from an
+# in-process snapshot exported with `python db/local_index.py export <dir>`;
+# "two_stage" searches the small `embedding_small` index, then re-ranks with
+# the full vectors (needs SMALL_EMBEDDING_DIM, see below)
+RAG_BACKEND = os.getenv("RAG_BACKEND", "atlas")
+# How loader.py stores embeddings: "array" (BSON doubles) or "float32" (packed
+# binary vector, ~3x smaller); see db/vector_codec.py and db/migrate_vectors.py
+VECTOR_FORMAT = os.getenv("VECTOR_FORMAT", "array")
+# Atlas index quantization: "none", "scalar" (int8) or "binary" (1 bit/dim)
+VECTOR_INDEX_QUANTIZATION = os.getenv("VECTOR_INDEX_QUANTIZATION", "none")
+LOCAL_INDEX_DIR = os.getenv("LOCAL_INDEX_DIR", "data/local_index")
+LOCAL_INDEX_NPROBE = int(os.getenv("LOCAL_INDEX_NPROBE", "8")) # IVF lists scanned per query
+# Lexical fast path (db/lexical_index.py): an in-process BM25 index written
+# by loader.py. A confident match (every query term in the best chunk, which
+# scores at least LEXICAL_MIN_SCORE and LEXICAL_MARGIN x the runner-up, at
+# most LEXICAL_MAX_TERMS terms) skips the query embedding and vector search;
+# short fact lookups (at most LEXICAL_EXTRACTIVE_MAX_TERMS terms, asking for
+# a date, email, hours or room) are answered with the matching line, without
+# Gemini, if LEXICAL_EXTRACTIVE is on - off until `lexical_index.py measure
+# --show` on real questions says the answers are right. Other hits are fused
+# with the vector results.
+LEXICAL_ENABLED = os.getenv("LEXICAL_ENABLED", "1") == "1"
+LEXICAL_INDEX_DIR = os.getenv("LEXICAL_INDEX_DIR", "data/lexical_index")
+LEXICAL_MARGIN = float(os.getenv("LEXICAL_MARGIN", "1.5"))
+LEXICAL_MIN_SCORE = float(os.getenv("LEXICAL_MIN_SCORE", "3.0")) # BM25
+LEXICAL_MAX_TERMS = int(os.getenv("LEXICAL_MAX_TERMS", "6"))
+LEXICAL_EXTRACTIVE = os.getenv("LEXICAL_EXTRACTIVE", "0") == "1"
+LEXICAL_EXTRACTIVE_MAX_TERMS = int(os.getenv("LEXICAL_EXTRACTIVE_MAX_TERMS", "3"))
+# Two-stage retrieval: loader.py also stores the first SMALL_EMBEDDING_DIM
+# dimensions, renormalised, as `embedding_small` (0 = off; backfill existing
+# chunks with `python db/migrate_vectors.py small`). The small index returns
+# limit * TWO_STAGE_OVERSAMPLE candidates for exact re-ranking.
+SMALL_EMBEDDING_DIM = int(os.getenv("SMALL_EMBEDDING_DIM", "0"))
+TWO_STAGE_OVERSAMPLE = int(os.getenv("TWO_STAGE_OVERSAMPLE", "20"))
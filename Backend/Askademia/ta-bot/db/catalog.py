@@ -0,0 +1,177 @@
+# db/catalog.py
+"""
+Document catalog: one small document per (course, file) with its stats.
+`loader.ingest` updates it after every loaded PDF, so listing documents,
+course coverage and "does this course have any material" are reads of a
+few hundred documents instead of scans over every chunk.
+
+    python db/catalog.py list [--course CS101]
+    python db/catalog.py reconcile [--dry-run]     # rebuild from syllabus_chunks
+
+`reconcile` recomputes chunk / token / byte / page counts per file from the
+chunks themselves (one `$group` pass), fixes entries that drifted, adds
+files loaded before the catalog existed and removes files with no chunks
+left, along with their lexical shards. The PDF size and embed model are only known at ingest time and are
+kept as they are.
+
+Until a `reconcile` has completed the catalog may be missing files loaded
+before it existed, so `has_material` only says "no material" once
+`reconcile` has recorded its completion marker.
+"""
+import sys
+import os
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import time
+import argparse
+from db.mongo_client import get_db
+from db.lexical_index import prune_shards
+import config
+
+COLL_NAME   = "document_catalog"    # {_id: "course_id/file", chunks, tokens, text_bytes, pages, ...}
+STATUS_COLL = "document_catalog_status"     # {_id: "reconcile", completed_at, files}
+CHUNKS_COLL = "syllabus_chunks"
+MAX_AGE     = 30                    # seconds the per-course chunk counts are trusted
+STATS       = ("chunks", "tokens", "text_bytes", "pages")
+
+_courses = (None, False, 0.0)       # ({course_id: chunks}, reconciled, fetched_at)
+
+def catalog_id(course_id: str, file: str) -> str:
+    return f"{course_id}/{file}"
+
+def record_document(course_id: str, file: str, chunks: int, tokens: int, text_bytes: int,
+                    pages: int, file_bytes: int, embed_model: str):
+    """Store the stats of a freshly ingested file (replaces its previous entry)."""
+    global _courses
+    get_db()[COLL_NAME].update_one(
+        {"_id": catalog_id(course_id, file)},
+        {"$set": {"course_id": course_id, "file": file, "chunks": chunks, "tokens": tokens,
+                  "text_bytes": text_bytes, "pages": pages, "file_bytes": file_bytes,
+                  "embed_model": embed_model, "ingested_at": time.time()}},
+        upsert=True)
+    _courses = (None, False, 0.0)   # this process sees the change right away
+
+def has_document(course_id: str, file: str) -> bool:
+    return get_db()[COLL_NAME].find_one({"_id": catalog_id(course_id, file)}, {"_id": 1}) is not None
+
+def list_documents(course_id: str | None = None) -> list[dict]:
+    flt = {"course_id": course_id} if course_id else {}
+    return sorted(get_db()[COLL_NAME].find(flt), key=lambda d: (d["course_id"], d["file"]))
+
+def course_stats(course_id: str | None = None) -> dict[str, dict]:
+    """{course_id: {"files", "chunks", "tokens", "text_bytes", "pages", "last_ingested"}}."""
+    courses = {}
+    for d in list_documents(course_id):
+        c = courses.setdefault(d["course_id"], {"files": 0, **dict.fromkeys(STATS, 0),
+                                                "last_ingested": 0.0})
+        c["files"] += 1
+        for k in STATS:
+            c[k] += d.get(k) or 0
+        c["last_ingested"] = max(c["last_ingested"], d.get("ingested_at") or 0.0)
+    return courses
+
+def reconciled() -> bool:
+    """Has a `reconcile` completed (so the catalog covers every stored file)?"""
+    return get_db()[STATUS_COLL].find_one({"_id": "reconcile"}, {"_id": 1}) is not None
+
+def _refresh(max_age: float) -> tuple[dict[str, int], bool]:
+    global _courses
+    cached, complete, fetched = _courses
+    if cached is not None and time.monotonic() - fetched < max_age:
+        return cached, complete
+    counts = {}
+    for d in get_db()[COLL_NAME].find({}, {"course_id": 1, "chunks": 1}):
+        counts[d["course_id"]] = counts.get(d["course_id"], 0) + (d.get("chunks") or 0)
+    _courses = (counts, reconciled(), time.monotonic())
+    return _courses[:2]
+
+def course_chunks(max_age: float = MAX_AGE) -> dict[str, int]:
+    """Chunks per course, re-read at most every *max_age* s."""
+    return _refresh(max_age)[0]
+
+def has_material(course_id: str, max_age: float = MAX_AGE) -> bool:
+    """
+    False only if the catalog is complete (a `reconcile` has finished) and
+    *course_id* has no chunks in it. Before that, files loaded before the
+    catalog existed may be missing, so every course is assumed to have
+    material.
+    """
+    counts, complete = _refresh(max_age)
+    return not complete or counts.get(course_id, 0) > 0
+
+def reconcile(dry_run: bool = False) -> dict:
+    """Rebuild the catalog's counts from the chunks; returns what changed."""
+    global _courses
+    db = get_db()
+    tokens = {"$ifNull": ["$tokens", {"$ceil": {"$divide": [{"$strLenCP": "$chunk"}, 4]}}]}
+    actual = {}
+    for g in db[CHUNKS_COLL].aggregate([
+            {"$group": {"_id": {"course_id": "$course_id", "file": "$file"},
+                        "chunks":     {"$sum": 1},
+                        "tokens":     {"$sum": tokens},       # chunks loaded before token counts
+                        "text_bytes": {"$sum": {"$strLenBytes": "$chunk"}},
+                        "pages":      {"$max": "$page_end"}}}], allowDiskUse=True):
+        key = g.pop("_id")
+        actual[catalog_id(key["course_id"], key["file"])] = {**key, **g, "pages": g["pages"] or 0}
+
+    coll    = db[COLL_NAME]
+    current = {d["_id"]: d for d in coll.find()}
+    changes = {"added": [], "updated": [], "removed": sorted(set(current) - set(actual))}
+    for _id, stats in sorted(actual.items()):
+        old = current.get(_id)
+        if old is None:
+            changes["added"].append(_id)
+        elif any(old.get(k) != stats[k] for k in STATS):
+            changes["updated"].append(_id)
+        else:
+            continue
+        if not dry_run:
+            coll.update_one({"_id": _id}, {"$set": {**stats, "reconciled_at": time.time()}}, upsert=True)
+    if changes["removed"] and not dry_run:
+        coll.delete_many({"_id": {"$in": changes["removed"]}})
+    if not dry_run:                 # lexical shards of files whose chunks are gone
+        changes["lexical"] = prune_shards(config.LEXICAL_INDEX_DIR,
+                                                 {(s["course_id"], s["file"]) for s in actual.values()})
+    if not dry_run:                 # from now on the catalog is trusted for routing
+        db[STATUS_COLL].update_one({"_id": "reconcile"},
+                                   {"$set": {"completed_at": time.time(), "files": len(actual)}},
+                                   upsert=True)
+    _courses = (None, False, 0.0)
+    return changes
+
+def _print_documents(course_id: str | None):
+    docs = list_documents(course_id)
+    if not docs:
+        print("The catalog is empty; run `python db/catalog.py reconcile` to build it from the chunks.")
+        return
+    if not reconciled():
+        print("Note: no reconcile has completed yet, so files loaded before the catalog may be "
+              "missing and course routing is off; run `python db/catalog.py reconcile`.")
+    for cid, s in course_stats(course_id).items():
+        print(f"\n{cid}: {s['files']} files, {s['chunks']} chunks, {s['tokens']} tokens")
+        for d in (d for d in docs if d["course_id"] == cid):
+            when = time.strftime("%Y-%m-%d %H:%M", time.localtime(d["ingested_at"])) \
+                   if d.get("ingested_at") else "-"
+            print(f"  {d['file']:<40} {d.get('chunks', 0):>6} chunks {d.get('tokens', 0):>9} tokens "
+                  f"{d.get('pages', 0):>5} pages  {when}  {d.get('embed_model') or ''}")
+
+if __name__ == "__main__":
+    ap  = argparse.ArgumentParser(description="Document catalog (per-course / per-file stats).")
+    sub = ap.add_subparsers(dest="cmd", required=True)
+    ls  = sub.add_parser("list", help="documents and course totals")
+    ls.add_argument("--course", help="only this course")
+    rc  = sub.add_parser("reconcile", help="rebuild the catalog from syllabus_chunks")
+    rc.add_argument("--dry-run", action="store_true", help="report drift without writing")
+    args = ap.parse_args()
+
+    if args.cmd == "list":
+        _print_documents(args.course)
+    else:
+        changes = reconcile(args.dry_run)
+        for kind, ids in changes.items():
+            for _id in ids:
+                print(f"  {kind:<8} {_id}")
+        verb = "would change" if args.dry_run else "changed"
+        print(f"✔ Catalog {verb}: {len(changes['added'])} added, "
+              f"{len(changes['updated'])} updated, {len(changes['removed'])} removed"
+              + (f", {len(changes['lexical'])} lexical shards deleted" if changes.get("lexical") else ""))
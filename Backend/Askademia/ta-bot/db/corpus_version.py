@@ -0,0 +1,38 @@
+# db/corpus_version.py
+"""
+Per-course corpus version counter.
+`loader.ingest` bumps it whenever a course's chunks change; readers (e.g. the
+TA agent's answer cache) compare versions to drop results built on stale material.
+Every bump also bumps `ALL_COURSES`, the version of questions that name no
+course and search the whole collection (`course_id=None`).
+"""
+import time
+from pymongo import ReturnDocument
+from db.mongo_client import get_db
+
+COLL_NAME = "corpus_versions"       # {_id: course_id, version: int}
+ALL_COURSES = "*"                   # _id counting changes to any course
+MAX_AGE   = 30                      # seconds a fetched version is trusted
+
+_seen = {}                          # course_id -> (version, fetched_at)
+
+def bump_corpus_version(course_id: str) -> int:
+    coll = get_db()[COLL_NAME]
+    coll.update_one({"_id": ALL_COURSES}, {"$inc": {"version": 1}}, upsert=True)
+    _seen.pop(ALL_COURSES, None)
+    doc = coll.find_one_and_update(
+        {"_id": course_id}, {"$inc": {"version": 1}},
+        upsert=True, return_document=ReturnDocument.AFTER)
+    _seen[course_id] = (doc["version"], time.monotonic())
+    return doc["version"]
+
+def get_corpus_version(course_id: str | None, max_age: float = MAX_AGE) -> int:
+    """Current version of *course_id* (None: any course; 0 if never ingested), cached for *max_age* s."""
+    course_id = ALL_COURSES if course_id is None else course_id
+    cached = _seen.get(course_id)
+    if cached and time.monotonic() - cached[1] < max_age:
+        return cached[0]
+    doc = get_db()[COLL_NAME].find_one({"_id": course_id})
+    version = doc["version"] if doc else 0
+    _seen[course_id] = (version, time.monotonic())
+    return version
@@ -4,13 +4,20 @@ Run once on an empty cluster or anytime you want to (re-)create the
 Atlas Vector Search index for the TA-bot project.
 """
 import sys
+import os
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
 from pymongo.operations import SearchIndexModel        # needs PyMongo ≥ 4.6
-from mongo_client import get_db
+from db.mongo_client import get_db
+import config
 
 DB_NAME        = "Classroom-qna"
 COLL_NAME      = "syllabus_chunks"
 INDEX_NAME     = "syllabus_emb"
+SMALL_INDEX_NAME = "syllabus_emb_small"   # two-stage retrieval (SMALL_EMBEDDING_DIM)
 EMBEDDING_SIZE = 768            # Gemini returns 768-D vectors
+FILTER_FIELDS  = ("course_id", "file")   # pre-filters usable in $vectorSearch
+QUANTIZATIONS  = ("none", "scalar", "binary")
 
 def ensure_collection():
     db = get_db()
@@ -18,21 +25,40 @@ def ensure_collection():
         db.create_collection(COLL_NAME)                # empty stub
     return db[COLL_NAME]
 
-def ensure_vector_index(coll):
+def vector_field(quantization: str = "none", path: str = "embedding",
+                 dims: int = EMBEDDING_SIZE) -> dict:
+    field = {
+        "type":        "vector",
+        "path":        path,
+        "numDimensions": dims,
+        "similarity":  "cosine"
+    }
+    if quantization not in QUANTIZATIONS:
+        raise ValueError(f"quantization must be one of {QUANTIZATIONS}")
+    if quantization != "none":
+        # int8 / 1-bit index vectors; Atlas keeps full fidelity for rescoring
+        field["quantization"] = quantization
+    return field
+
+def ensure_vector_index(coll, quantization: str = config.VECTOR_INDEX_QUANTIZATION,
+                        name: str = INDEX_NAME, path: str = "embedding", dims: int = EMBEDDING_SIZE):
     # ——— definition per Atlas docs ———
     vector_def = {
         "fields": [
-            {
-                "type":        "vector",
-                "path":        "embedding",
-                "numDimensions": EMBEDDING_SIZE,
-                "similarity":  "cosine"
-            }
+            vector_field(quantization, path, dims),
+            # filter fields let a query search only one course's (or file's)
+            # chunks instead of spending candidates on every course
+            *({"type": "filter", "path": f} for f in FILTER_FIELDS)
         ]
     }
 
+    existing = {ix["name"] for ix in coll.list_search_indexes()}
+    if name in existing:
+        coll.update_search_index(name, vector_def)   # adds the filter fields in place
+        return
+
     model = SearchIndexModel(
-        name       = INDEX_NAME,
+        name       = name,
         definition = vector_def,
         type       = "vectorSearch"
     )
@@ -41,7 +67,13 @@ def ensure_vector_index(coll):
 def main():
     coll = ensure_collection()
     ensure_vector_index(coll)
-    print("✔ Vector index creation requested. Check Atlas UI for status.")
+    if config.SMALL_EMBEDDING_DIM:
+        # first-stage index for RAG_BACKEND=two_stage: SMALL_EMBEDDING_DIM / 768 of the RAM
+        ensure_vector_index(coll, name=SMALL_INDEX_NAME, path="embedding_small",
+                            dims=config.SMALL_EMBEDDING_DIM)
+        print(f"  small index: {SMALL_INDEX_NAME} ({config.SMALL_EMBEDDING_DIM}-D embedding_small)")
+    print(f"  quantization: {config.VECTOR_INDEX_QUANTIZATION}, stored vectors: {config.VECTOR_FORMAT}")
+    print("✔ Vector index creation/update requested. Check Atlas UI for status.")
 
 if __name__ == "__main__":
     sys.exit(main())
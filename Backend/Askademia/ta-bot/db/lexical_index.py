@@ -0,0 +1,451 @@
+# db/lexical_index.py
+"""
+In-process BM25 index over the chunk texts, for exact-fact questions.
+
+"What is the professor's email?" or "office hours" is answered by a literal
+line of the syllabus; a keyword lookup finds it in well under a millisecond,
+where the vector path pays a remote embedding, a `$vectorSearch` and a full
+generation. `loader.ingest` writes one shard per (course, file) after it
+stores the file's chunks; when `meta.json` changes the TA reads the shards
+written since and drops those deleted (`delete_shard`, catalog reconcile).
+
+    python db/lexical_index.py build [DIR]                  # from syllabus_chunks
+    python db/lexical_index.py search "office hours" [--course CS101]
+    python db/lexical_index.py measure questions.txt [--course CS101]
+
+Directory layout (`LEXICAL_INDEX_DIR`):
+    <hash>.json   {"course_id", "file", "chunks": [{"chunk", "chunk_index", "page_start", "page_end"}]}
+    meta.json     {"files", "updated"}; rewritten after every shard write/delete
+
+`lookup()` classifies a question for the pipeline: `confident` when the
+best chunk holds every query term, scores at least `LEXICAL_MIN_SCORE` and
+clearly beats the runner-up (the vector search can be skipped), `answer`
+when the query is also short, asks for a fact (a date, email, office hours,
+room) and one line of that chunk holds every term plus a value of that kind
+(returned as is, no generation; only with `LEXICAL_EXTRACTIVE`). `measure`
+reports how often each case happens for a list of questions, and `--show`
+prints the extractive answers so they can be checked before turning it on.
+"""
+import sys
+import os
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import re
+import json
+import math
+import time
+import hashlib
+import pathlib
+import argparse
+import threading
+from collections import Counter, defaultdict
+
+import config
+
+COLL_NAME      = "syllabus_chunks"  # Should match index_setup.py
+EXPORT_BATCH   = 1000
+K1, B          = 1.2, 0.75          # BM25 parameters
+RRF_K          = 60                 # reciprocal rank fusion constant
+EXTRACT_CHARS  = 300                # longest extractive answer
+EXTRACT_EXTRA  = 2                  # terms an extractive answer needs beyond the query's (no bare headings)
+
+_MONTHS = r"(jan|feb|mar|apr|may|jun|jul|aug|sep|sept|oct|nov|dec)[a-z]*\.?"
+_DAYS   = r"(mon|tue|tues|wed|thu|thur|thurs|fri|sat|sun)[a-z]*\.?"
+_TIME   = r"\b\d{1,2}(:\d{2})?\s*([ap]\.?m\b\.?)|\b\d{1,2}:\d{2}\b"
+# fact lookups answered extractively: question words -> what the answer line must contain
+FACT_INTENTS = {
+    "date":  ({"when", "date", "dates", "due", "deadline", "deadlines"},
+              re.compile(rf"\b{_MONTHS}\s*\d{{1,2}}\b|\b\d{{1,2}}/\d{{1,2}}\b|\b{_DAYS}\b", re.I)),
+    "email": ({"email", "e-mail", "mail"}, re.compile(r"\S+@\S+\.\w+")),
+    "hours": ({"hours", "hour", "time", "times"}, re.compile(_TIME, re.I)),
+    "room":  ({"where", "room", "location", "building", "classroom"},
+              re.compile(r"\b(room|rm\.?|hall|bldg\.?|building|online|zoom)\b|\b[A-Z]{1,4}\s?\d{2,4}\b")),
+}
+# a "." after these does not end a sentence ("Dr. Smith", "Oct. 12")
+ABBREVIATIONS = {"dr", "prof", "mr", "mrs", "ms", "st", "no", "vs", "etc", "eg", "ie", "jr", "sr",
+                 "dept", "rm", "bldg", "approx", "fig", "ph", "phd", "am", "pm", "ave", "univ",
+                 "jan", "feb", "mar", "apr", "jun", "jul", "aug", "sep", "sept", "oct", "nov", "dec",
+                 "mon", "tue", "tues", "wed", "thu", "thur", "thurs", "fri", "sat", "sun"}
+
+STOPWORDS = {"a", "an", "the", "is", "are", "was", "were", "be", "been", "do", "does", "did",
+             "what", "when", "where", "who", "whom", "which", "why", "how", "can", "could",
+             "will", "would", "should", "i", "me", "my", "we", "our", "you", "your", "it", "its",
+             "of", "in", "on", "at", "to", "for", "from", "by", "with", "about", "and", "or",
+             "this", "that", "these", "those", "there", "please", "tell", "give", "any", "s"}
+
+def terms(text: str) -> list[str]:
+    """Lower-cased word tokens without stopwords, plural "s" stripped."""
+    out = []
+    for w in re.findall(r"[a-z0-9]+", text.lower()):
+        if w in STOPWORDS:
+            continue
+        if len(w) > 3 and w.endswith("s") and not w.endswith("ss"):
+            w = w[:-1]
+        out.append(w)
+    return out
+
+class LexicalIndex:
+    """BM25 over chunk records; `search()` returns `[{"chunk", "score", ...}]` like the vector backends."""
+
+    def __init__(self, records: list[dict] | None = None):
+        self.records  = []                      # None once the row's shard is removed
+        self.postings = defaultdict(dict)       # term -> {row: term frequency}
+        self.lengths  = []
+        self.terms    = []                      # set of terms per row
+        self.total    = 0
+        self.live     = 0
+        self.shards   = {}                      # shard file name -> (mtime_ns, rows)
+        self.lock     = threading.Lock()        # `refresh` vs concurrent searches
+        for r in records or []:
+            self._add(r, Counter(terms(r["chunk"])))
+
+    def __len__(self):
+        return self.live
+
+    def _add(self, record: dict, counts: Counter) -> int:
+        row = len(self.records)
+        for t, n in counts.items():
+            self.postings[t][row] = n
+        self.records.append(record)
+        self.lengths.append(sum(counts.values()))
+        self.terms.append(set(counts))
+        self.total += self.lengths[-1]
+        self.live  += 1
+        return row
+
+    def _remove(self, row: int):
+        for t in self.terms[row]:
+            del self.postings[t][row]
+            if not self.postings[t]:
+                del self.postings[t]
+        self.total -= self.lengths[row]
+        self.live  -= 1
+        self.records[row], self.lengths[row], self.terms[row] = None, 0, set()
+
+    def _idf(self, term: str) -> float:
+        df = len(self.postings.get(term, ()))
+        return math.log(1 + (self.live - df + 0.5) / (df + 0.5))
+
+    def scores(self, query_terms: list[str], course_id: str | None = None) -> dict[int, float]:
+        if not self.live:
+            return {}
+        avgdl  = self.total / self.live or 1.0
+        scores = defaultdict(float)
+        for t in set(query_terms):
+            idf = self._idf(t)
+            for row, tf in self.postings.get(t, {}).items():
+                if course_id is not None and self.records[row].get("course_id") != course_id:
+                    continue
+                norm = K1 * (1 - B + B * self.lengths[row] / avgdl)
+                scores[row] += idf * tf * (K1 + 1) / (tf + norm)
+        return scores
+
+    def search(self, query: str, limit: int = 5, course_id: str | None = None) -> list[dict]:
+        """Top *limit* chunks by BM25; `score` is relative to the best hit (1.0)."""
+        with self.lock:
+            ranked = sorted(self.scores(terms(query), course_id).items(), key=lambda kv: -kv[1])[:limit]
+            if not ranked:
+                return []
+            best = ranked[0][1]
+            return [{**self.records[row], "score": s / best, "bm25": s, "_row": row} for row, s in ranked]
+
+    def coverage(self, row: int, query_terms: list[str]) -> float:
+        """IDF-weighted share of the query terms found in *row*."""
+        with self.lock:
+            weights = {t: self._idf(t) for t in set(query_terms)}
+            total   = sum(weights.values())
+            return sum(w for t, w in weights.items() if t in self.terms[row]) / total if total else 0.0
+
+    # --- Persistence ---
+    @classmethod
+    def load(cls, path: str | pathlib.Path) -> "LexicalIndex":
+        index = cls()
+        index.refresh(path)
+        return index
+
+    def refresh(self, path: str | pathlib.Path) -> int:
+        """
+        Bring the index in line with the shards in *path*: only new or
+        rewritten shards are read and tokenized, rows of replaced or deleted
+        shards are dropped. Returns the number of shards that changed.
+        """
+        on_disk = {}
+        for shard in pathlib.Path(path).glob("*.json"):
+            if shard.name != "meta.json":
+                try:
+                    on_disk[shard.name] = shard.stat().st_mtime_ns
+                except FileNotFoundError:       # deleted since the glob
+                    pass
+        gone    = [name for name in self.shards if name not in on_disk]
+        changed = {}                            # parsed outside the lock, searches keep running
+        for name, mtime in on_disk.items():
+            if self.shards.get(name, (None,))[0] == mtime:
+                continue
+            try:
+                data = json.loads((pathlib.Path(path) / name).read_text(encoding="utf-8"))
+            except FileNotFoundError:
+                gone.append(name)
+                continue
+            changed[name] = (mtime, [({**c, "course_id": data["course_id"], "file": data["file"]},
+                                      Counter(terms(c["chunk"]))) for c in data["chunks"]])
+        with self.lock:
+            for name in gone + list(changed):
+                for row in self.shards.pop(name, (None, []))[1]:
+                    self._remove(row)
+            for name, (mtime, rows) in changed.items():
+                self.shards[name] = (mtime, [self._add(r, counts) for r, counts in rows])
+            if len(self.records) > 2 * self.live:   # mostly removed rows: renumber
+                self._compact()
+        return len(set(gone)) + len(changed)
+
+    def _compact(self):
+        """Renumber the live rows, keeping their term counts (no re-tokenizing)."""
+        counts = defaultdict(Counter)
+        for t, rows in self.postings.items():
+            for row, n in rows.items():
+                counts[row][t] = n
+        old, shards = self.records, self.shards
+        self.records, self.lengths, self.terms = [], [], []
+        self.postings, self.total, self.live = defaultdict(dict), 0, 0
+        moved = {row: self._add(r, counts[row]) for row, r in enumerate(old) if r is not None}
+        self.shards = {name: (mtime, [moved[row] for row in rows])
+                       for name, (mtime, rows) in shards.items()}
+
+def _shard_path(path: pathlib.Path, course_id: str, file: str) -> pathlib.Path:
+    return path / (hashlib.blake2b(f"{course_id}/{file}".encode("utf-8"), digest_size=12).hexdigest() + ".json")
+
+def _write_json(target: pathlib.Path, data):
+    tmp = target.with_suffix(".tmp")
+    tmp.write_text(json.dumps(data, ensure_ascii=False), encoding="utf-8")
+    os.replace(tmp, target)                 # readers never see half a file
+
+def _write_meta(path: pathlib.Path):
+    shards = [p for p in path.glob("*.json") if p.name != "meta.json"]
+    _write_json(path / "meta.json", {"files": len(shards), "updated": time.time()})
+
+def has_shard(path: str | pathlib.Path, course_id: str, file: str) -> bool:
+    return _shard_path(pathlib.Path(path), course_id, file).exists()
+
+def write_shard(path: str | pathlib.Path, course_id: str, file: str, chunks, meta: bool = True):
+    """
+    Replace the file's chunks in the on-disk index (called by the loader).
+    *chunks* may be any iterable, e.g. a Mongo cursor; it is written as it
+    is read.
+    """
+    path = pathlib.Path(path)
+    path.mkdir(parents=True, exist_ok=True)
+    keep   = ("chunk", "chunk_index", "page_start", "page_end")
+    target = _shard_path(path, course_id, file)
+    tmp    = target.with_suffix(".tmp")
+    with open(tmp, "w", encoding="utf-8") as f:
+        f.write(json.dumps({"course_id": course_id, "file": file}, ensure_ascii=False)[:-1] + ', "chunks": [')
+        for i, c in enumerate(chunks):
+            f.write(("," if i else "") + json.dumps({k: c.get(k) for k in keep}, ensure_ascii=False))
+        f.write("]}")
+    os.replace(tmp, target)                 # readers never see half a file
+    if meta:
+        _write_meta(path)
+
+def delete_shard(path: str | pathlib.Path, course_id: str, file: str) -> bool:
+    """Remove the file's chunks from the on-disk index; False if it had none."""
+    path = pathlib.Path(path)
+    try:
+        _shard_path(path, course_id, file).unlink()
+    except FileNotFoundError:
+        return False
+    _write_meta(path)
+    return True
+
+def prune_shards(path: str | pathlib.Path, keep: set[tuple[str, str]]) -> list[str]:
+    """Delete every shard whose (course_id, file) is not in *keep*; returns "course/file" of each."""
+    path = pathlib.Path(path)
+    if not path.is_dir():
+        return []
+    wanted  = {_shard_path(path, c, f).name for c, f in keep}
+    removed = []
+    for shard in path.glob("*.json"):
+        if shard.name == "meta.json" or shard.name in wanted:
+            continue
+        with open(shard, encoding="utf-8") as f:    # only the header: {"course_id", "file", ...
+            head = f.read(4096)
+        m = re.match(r'\{"course_id": ("(?:[^"\\]|\\.)*"|null), "file": ("(?:[^"\\]|\\.)*"|null)', head)
+        removed.append("/".join(str(json.loads(g)) for g in m.groups()) if m else shard.name)
+        shard.unlink(missing_ok=True)
+    if removed:
+        _write_meta(path)
+    return removed
+
+# --- Shared instance (refreshed when the loader changes the directory) ---
+_index      = (None, None, 0.0)       # (LexicalIndex, meta mtime_ns, checked_at)
+_index_lock = threading.Lock()
+RELOAD_CHECK = 5.0                    # seconds between meta.json checks
+
+def get_index(path: str = config.LEXICAL_INDEX_DIR) -> LexicalIndex:
+    global _index
+    index, mtime, checked = _index
+    if index is not None and time.monotonic() - checked < RELOAD_CHECK:
+        return index
+    with _index_lock:
+        index, mtime, checked = _index
+        try:
+            current = os.stat(os.path.join(path, "meta.json")).st_mtime_ns
+        except FileNotFoundError:
+            current = None
+        if index is None:
+            index = LexicalIndex()
+        if current != mtime:
+            index.refresh(path)         # only the shards written or deleted since
+        _index = (index, current, time.monotonic())
+    return index
+
+# --- Pipeline entry point ---
+class Lookup:
+    """What the lexical index says about one question."""
+
+    __slots__ = ("results", "confident", "answer")
+
+    def __init__(self, results: list[dict], confident: bool = False, answer: str | None = None):
+        self.results   = results
+        self.confident = confident
+        self.answer    = answer
+
+def fact_intents(query: str) -> list[re.Pattern]:
+    """Patterns of the facts *query* asks for ("when is ..." -> a date); empty for other questions."""
+    words = set(re.findall(r"[a-z][a-z-]*", query.lower()))
+    return [pattern for cues, pattern in FACT_INTENTS.values() if words & cues]
+
+def _sentences(line: str) -> list[str]:
+    """*line* split into sentences, not after abbreviations or initials."""
+    out = []
+    for part in re.split(r"(?<=[.!?])\s+", line):
+        last = out[-1].rsplit(None, 1)[-1].rstrip(".").replace(".", "").lower() if out else ""
+        if out and out[-1].endswith(".") and (last in ABBREVIATIONS or len(last) == 1):
+            out[-1] += " " + part
+        else:
+            out.append(part)
+    return out
+
+def _best_line(chunk: str, query_terms: set[str], patterns: list[re.Pattern]) -> str | None:
+    """
+    The shortest line/sentence of *chunk* containing every query term and a
+    value one of *patterns* matches, or two adjacent ones ("Instructor: ..."
+    above "Email: ..."). A line made of the query terms alone ("Midterm
+    Exam") is a heading, not an answer.
+    """
+    pieces = [p.strip() for line in chunk.splitlines() for p in _sentences(line)]
+    pieces = [p for p in pieces if p]
+    pieces += [f"{a}\n{b}" for a, b in zip(pieces, pieces[1:])]
+    hits   = [p for p in pieces if query_terms <= set(terms(p))
+              and len(set(terms(p)) - query_terms) >= EXTRACT_EXTRA
+              and any(pattern.search(p) for pattern in patterns)]
+    return min(hits, key=len) if hits else None
+
+def lookup(query: str, course_id: str | None = None, limit: int = 5,
+           index: LexicalIndex | None = None, extractive: bool | None = None) -> Lookup:
+    """*extractive* (default `LEXICAL_EXTRACTIVE`) allows `answer` to be set."""
+    index = index or get_index()
+    extractive = config.LEXICAL_EXTRACTIVE if extractive is None else extractive
+    query_terms = terms(query)
+    results = index.search(query, limit=limit, course_id=course_id) if query_terms else []
+    if not results:
+        return Lookup([])
+    top    = results[0]
+    runner = results[1]["bm25"] if len(results) > 1 else 0.0
+    # a lone hit has no runner-up to beat, so the minimum score is what makes it trustworthy
+    confident = (len(set(query_terms)) <= config.LEXICAL_MAX_TERMS
+                 and index.coverage(top["_row"], query_terms) >= 1.0
+                 and top["bm25"] >= config.LEXICAL_MIN_SCORE
+                 and top["bm25"] >= config.LEXICAL_MARGIN * runner)
+    answer = None
+    patterns = fact_intents(query) if extractive else []
+    if confident and patterns and len(set(query_terms)) <= config.LEXICAL_EXTRACTIVE_MAX_TERMS:
+        line = _best_line(top["chunk"], set(query_terms), patterns)
+        if line is not None and len(line) <= EXTRACT_CHARS:
+            page   = f", p. {top['page_start']}" if top.get("page_start") else ""
+            answer = f"{line}\n\n(From {top['file']}{page})"
+    for r in results:
+        r.pop("_row", None)
+    return Lookup(results, confident, answer)
+
+def fuse(vector_results: list[dict], lexical_results: list[dict], limit: int) -> list[dict]:
+    """Reciprocal rank fusion of both result lists; `score` is scaled so the best is 1.0."""
+    fused, rrf = {}, defaultdict(float)
+    for results in (vector_results, lexical_results):
+        for rank, r in enumerate(results):
+            key = (r.get("file"), r.get("chunk_index"), r["chunk"][:64])   # both are course-filtered
+            rrf[key] += 1.0 / (RRF_K + rank + 1)
+            fused.setdefault(key, r)
+    ranked = sorted(rrf, key=lambda k: -rrf[k])[:limit]
+    best   = rrf[ranked[0]] if ranked else 1.0
+    return [{**fused[k], "score": rrf[k] / best} for k in ranked]
+
+# --- Build from MongoDB / measurement ---
+def build_from_mongo(path: str | pathlib.Path) -> int:
+    """Rewrite every shard from syllabus_chunks; shards of files no longer stored are deleted."""
+    from db.mongo_client import get_db
+    path = pathlib.Path(path)
+    path.mkdir(parents=True, exist_ok=True)
+    files = defaultdict(list)
+    for doc in get_db()[COLL_NAME].find({}, {"_id": 0, "chunk": 1, "course_id": 1, "file": 1,
+                                             "chunk_index": 1, "page_start": 1, "page_end": 1},
+                                        batch_size=EXPORT_BATCH):
+        files[(doc.get("course_id"), doc.get("file"))].append(doc)
+    for (course_id, file), chunks in files.items():
+        chunks.sort(key=lambda c: c.get("chunk_index") or 0)
+        write_shard(path, course_id, file, chunks, meta=False)
+    prune_shards(path, set(files))
+    _write_meta(path)
+    return sum(len(c) for c in files.values())
+
+def measure(questions: list[str], course_id: str | None, index: LexicalIndex,
+            show: bool = False) -> dict:
+    """
+    Share of *questions* answered extractively / without vector search /
+    fused / vector only. Extractive answers are counted as if
+    `LEXICAL_EXTRACTIVE` were on; *show* prints them for review.
+    """
+    kinds, seconds = Counter(), []
+    for q in questions:
+        start = time.perf_counter()
+        hit   = lookup(q, course_id, index=index, extractive=True)
+        seconds.append(time.perf_counter() - start)
+        if show and hit.answer:
+            print(f"  Q: {q}\n  A: {hit.answer.replace(chr(10), chr(10) + '     ')}\n")
+        kinds["extractive" if hit.answer else "lexical_only" if hit.confident
+              else "fused" if hit.results else "vector_only"] += 1
+    n = len(questions) or 1
+    seconds.sort()
+    return {"questions": len(questions), **{k: kinds[k] / n for k in
+            ("extractive", "lexical_only", "fused", "vector_only")},
+            "lookup_ms_p50": seconds[len(seconds) // 2] * 1000 if seconds else 0.0}
+
+if __name__ == "__main__":
+    ap  = argparse.ArgumentParser(description="Local BM25 index for exact-fact questions.")
+    sub = ap.add_subparsers(dest="cmd", required=True)
+    bd  = sub.add_parser("build", help="rebuild the index from syllabus_chunks")
+    bd.add_argument("path", nargs="?", default=config.LEXICAL_INDEX_DIR)
+    sr  = sub.add_parser("search", help="classify one question and show the hits")
+    sr.add_argument("query")
+    sr.add_argument("--course")
+    ms  = sub.add_parser("measure", help="share of questions each path would take")
+    ms.add_argument("questions", help="one question per line")
+    ms.add_argument("--course")
+    ms.add_argument("--show", action="store_true", help="print each extractive answer")
+    args = ap.parse_args()
+
+    if args.cmd == "build":
+        print(f"✔ Indexed {build_from_mongo(args.path)} chunks in {args.path}")
+    elif args.cmd == "search":
+        hit = lookup(args.query, args.course, extractive=True)
+        print(f"confident: {hit.confident}")
+        if hit.answer:
+            print(f"extractive answer{'' if config.LEXICAL_EXTRACTIVE else ' (LEXICAL_EXTRACTIVE is off)'}:\n{hit.answer}\n")
+        for r in hit.results:
+            print(f"  {r['score']:.3f}  {r['file']}#{r.get('chunk_index')}  {r['chunk'][:80]!r}")
+    else:
+        with open(args.questions, encoding="utf-8") as f:
+            questions = [line.strip() for line in f if line.strip()]
+        index = get_index()
+        print(f"{len(index)} chunks indexed")
+        for k, v in measure(questions, args.course, index, args.show).items():
+            print(f"  {k:<14}{v:>10.3f}" if isinstance(v, float) else f"  {k:<14}{v:>10}")
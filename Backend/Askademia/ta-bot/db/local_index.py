@@ -0,0 +1,190 @@
+# db/local_index.py
+"""
+In-process vector index over a snapshot of `syllabus_chunks`.
+
+Export the collection once, then point the RAG pipeline at the snapshot:
+    python db/local_index.py export data/local_index [--ivf-lists 256]
+    RAG_BACKEND=local LOCAL_INDEX_DIR=data/local_index python src/ta_agent.py
+
+Snapshot layout (one directory):
+    vectors.npy   float32 [N, D], L2-normalised rows (memory-mapped on load)
+    chunks.jsonl  one {"chunk", "course_id", "file", "page_start", ...} record per row
+    meta.json     dim / count / IVF settings
+    ivf.npz       optional centroids + per-list row offsets (rows are stored
+                  grouped by list, so each list is one contiguous slice)
+"""
+import sys
+import os
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import json, pathlib, argparse
+import numpy as np
+
+COLL_NAME     = "syllabus_chunks"   # Should match index_setup.py
+EXPORT_BATCH  = 1000                # docs pulled from Mongo per round trip
+KMEANS_ITERS  = 10
+KMEANS_SAMPLE = 50_000              # rows used to train IVF centroids
+
+def _normalise(m: np.ndarray) -> np.ndarray:
+    norms = np.linalg.norm(m, axis=-1, keepdims=True)
+    norms[norms == 0] = 1.0
+    return m / norms
+
+def _kmeans(x: np.ndarray, k: int, iters: int = KMEANS_ITERS, seed: int = 0) -> np.ndarray:
+    """Spherical k-means (cosine); returns [k, D] unit centroids."""
+    rng = np.random.default_rng(seed)
+    if len(x) > KMEANS_SAMPLE:
+        x = x[rng.choice(len(x), KMEANS_SAMPLE, replace=False)]
+    cent = x[rng.choice(len(x), k, replace=False)].copy()
+    for _ in range(iters):
+        assign = np.argmax(x @ cent.T, axis=1)
+        for j in range(k):
+            members = x[assign == j]
+            if len(members):
+                cent[j] = members.sum(axis=0)
+        cent = _normalise(cent)
+    return cent.astype(np.float32)
+
+class LocalIndex:
+    """
+    Brute-force (or IVF-partitioned) cosine top-k over a float32 matrix.
+    `search()` returns the same `[{"chunk", "score", ...}]` shape as the Atlas
+    `$vectorSearch` + `$project` pipeline, with Atlas' cosine score scaling,
+    optionally restricted to one course / file.
+    """
+
+    def __init__(self, vectors: np.ndarray, records: list[dict],
+                 centroids: np.ndarray | None = None,
+                 offsets: np.ndarray | None = None,
+                 nprobe: int = 8):
+        self.vectors   = vectors
+        self.records   = records
+        self.centroids = centroids
+        self.offsets   = offsets
+        self.nprobe    = nprobe
+        self._filter_rows = {}               # (course_id, file) -> sorted row ids
+
+    def __len__(self):
+        return len(self.records)
+
+    # --- Build / load ---
+    @classmethod
+    def build(cls, vectors, records: list[dict], n_lists: int = 0, nprobe: int = 8) -> "LocalIndex":
+        """Build an in-memory index; *n_lists* > 0 enables the IVF mode."""
+        vecs = _normalise(np.asarray(vectors, dtype=np.float32))
+        centroids = offsets = None
+        if n_lists:
+            centroids = _kmeans(vecs, min(n_lists, len(vecs)))
+            assign    = np.argmax(vecs @ centroids.T, axis=1)
+            order     = np.argsort(assign, kind="stable")
+            vecs      = vecs[order]
+            records   = [records[i] for i in order]
+            offsets   = np.concatenate(([0], np.cumsum(np.bincount(assign, minlength=len(centroids)))))
+        return cls(np.ascontiguousarray(vecs), records, centroids, offsets, nprobe)
+
+    def save(self, path: str | pathlib.Path):
+        path = pathlib.Path(path)
+        path.mkdir(parents=True, exist_ok=True)
+        np.save(path / "vectors.npy", self.vectors)
+        with open(path / "chunks.jsonl", "w", encoding="utf-8") as f:
+            for r in self.records:
+                f.write(json.dumps(r, ensure_ascii=False) + "\n")
+        if self.centroids is not None:
+            np.savez(path / "ivf.npz", centroids=self.centroids, offsets=self.offsets)
+        meta = {"dim":      int(self.vectors.shape[1]),
+                "count":    len(self.records),
+                "ivf_lists": 0 if self.centroids is None else len(self.centroids)}
+        (path / "meta.json").write_text(json.dumps(meta, indent=2))
+
+    @classmethod
+    def load(cls, path: str | pathlib.Path, nprobe: int = 8) -> "LocalIndex":
+        """Memory-map a snapshot written by `save()`."""
+        path    = pathlib.Path(path)
+        vectors = np.load(path / "vectors.npy", mmap_mode="r")
+        with open(path / "chunks.jsonl", encoding="utf-8") as f:
+            records = [json.loads(line) for line in f]
+        centroids = offsets = None
+        if (path / "ivf.npz").exists():
+            ivf = np.load(path / "ivf.npz")
+            centroids, offsets = ivf["centroids"], ivf["offsets"]
+        return cls(vectors, records, centroids, offsets, nprobe)
+
+    # --- Query ---
+    def rows_for(self, course_id: str | None = None, file: str | None = None) -> np.ndarray:
+        """Row ids matching a course / file filter (computed once per filter)."""
+        key = (course_id, file)
+        rows = self._filter_rows.get(key)
+        if rows is None:
+            rows = np.fromiter((i for i in range(len(self.records))
+                                if (course_id is None or self.records[i].get("course_id") == course_id)
+                                and (file is None or self.records[i].get("file") == file)),
+                               dtype=np.int64)
+            self._filter_rows[key] = rows
+        return rows
+
+    def _score(self, q: np.ndarray, nprobe: int,
+               allowed: np.ndarray | None = None) -> tuple[np.ndarray, np.ndarray | None]:
+        """Similarities for the scanned rows, plus their row ids (None = all rows)."""
+        if allowed is not None:
+            # rows an unfiltered probe would scan; a course smaller than that
+            # is cheaper (and exact) to score directly
+            probed = len(self.vectors) if self.centroids is None else \
+                     nprobe * len(self.vectors) // len(self.centroids)
+            if len(allowed) <= probed:
+                return self.vectors[allowed] @ q, allowed
+        if self.centroids is None:
+            return self.vectors @ q, None        # exact: scan everything
+        lists  = np.argsort(-(self.centroids @ q))[:nprobe]
+        spans  = [(self.offsets[j], self.offsets[j + 1]) for j in lists]
+        # each list is a contiguous slice, so score slices instead of gathering rows
+        sims = np.concatenate([self.vectors[a:b] @ q for a, b in spans])
+        rows = np.concatenate([np.arange(a, b) for a, b in spans])
+        if allowed is not None:
+            keep = np.isin(rows, allowed, assume_unique=True)
+            sims, rows = sims[keep], rows[keep]
+        return sims, rows
+
+    def search(self, query_vector, limit: int = 5, nprobe: int | None = None,
+               course_id: str | None = None, file: str | None = None) -> list[dict]:
+        q          = _normalise(np.asarray(query_vector, dtype=np.float32))
+        allowed    = self.rows_for(course_id, file) if (course_id or file) else None
+        sims, rows = self._score(q, nprobe or self.nprobe, allowed)
+        k    = min(limit, len(sims))
+        if k == 0:
+            return []
+        top = np.argpartition(-sims, k - 1)[:k]
+        top = top[np.argsort(-sims[top])]
+        ids = top if rows is None else rows[top]
+        # Atlas reports cosine as (1 + cos) / 2, keep scores comparable
+        return [{**self.records[i], "score": float((1 + s) / 2)}
+                for i, s in zip(ids, sims[top])]
+
+# --- Export from MongoDB ---
+def export_from_mongo(path: str | pathlib.Path, n_lists: int = 0) -> LocalIndex:
+    from db.mongo_client import get_db
+    from db.vector_codec import decode_vector
+    coll = get_db()[COLL_NAME]
+    vectors, records = [], []
+    cursor = coll.find({}, {"_id": 0, "embedding": 1, "chunk": 1, "course_id": 1, "file": 1,
+                            "chunk_index": 1, "page_start": 1, "page_end": 1},
+                       batch_size=EXPORT_BATCH)
+    for doc in cursor:
+        vectors.append(decode_vector(doc.pop("embedding")))
+        records.append(doc)
+    if not records:
+        raise ValueError(f"No documents in '{COLL_NAME}' to export")
+    index = LocalIndex.build(vectors, records, n_lists=n_lists)
+    index.save(path)
+    return index
+
+if __name__ == "__main__":
+    ap = argparse.ArgumentParser(description="Manage the local vector index snapshot.")
+    sub = ap.add_subparsers(dest="cmd", required=True)
+    ex = sub.add_parser("export", help="snapshot syllabus_chunks from MongoDB")
+    ex.add_argument("path")
+    ex.add_argument("--ivf-lists", type=int, default=0,
+                    help="partition into N clusters for approximate search (0 = exact)")
+    args = ap.parse_args()
+
+    idx = export_from_mongo(args.path, args.ivf_lists)
+    print(f"✔ Exported {len(idx)} chunks ({idx.vectors.shape[1]}-D) to {args.path}")
@@ -0,0 +1,52 @@
+# db/manifest.py
+"""
+Per-document ingest manifest.
+`loader.ingest` records what a PDF was last loaded from (content hash,
+chunker parameters, embed model, per-chunk hashes) so re-running the loader
+only embeds new or changed chunks, deletes stale ones and skips unchanged
+files entirely. A manifest left "in_progress" marks an interrupted run; the
+next run resumes from the chunks that were already committed.
+"""
+import time
+import hashlib
+from db.mongo_client import get_db
+
+COLL_NAME = "ingest_manifests"      # {_id: "course_id/file", status, file_hash, params, chunk_hashes, ...}
+READ_SIZE = 1 << 20                 # bytes hashed per read
+
+def manifest_id(course_id: str, file: str) -> str:
+    return f"{course_id}/{file}"
+
+def file_hash(path) -> str:
+    """SHA-256 of the file's bytes, read in blocks."""
+    h = hashlib.sha256()
+    with open(path, "rb") as f:
+        while block := f.read(READ_SIZE):
+            h.update(block)
+    return h.hexdigest()
+
+def chunk_hash(text: str) -> str:
+    return hashlib.blake2b(text.encode("utf-8"), digest_size=16).hexdigest()
+
+def get_manifest(course_id: str, file: str) -> dict | None:
+    return get_db()[COLL_NAME].find_one({"_id": manifest_id(course_id, file)})
+
+def start_manifest(course_id: str, file: str, digest: str):
+    """
+    Mark an ingest as running; stays "in_progress" if it never completes.
+    `params` keep describing the last completed run until `complete_manifest`.
+    """
+    get_db()[COLL_NAME].update_one(
+        {"_id": manifest_id(course_id, file)},
+        {"$set": {"course_id": course_id, "file": file, "status": "in_progress",
+                  "file_hash": digest, "started_at": time.time()}},
+        upsert=True)
+
+def complete_manifest(course_id: str, file: str, digest: str, params: dict,
+                      chunk_hashes: list[str]):
+    get_db()[COLL_NAME].update_one(
+        {"_id": manifest_id(course_id, file)},
+        {"$set": {"course_id": course_id, "file": file, "status": "complete",
+                  "file_hash": digest, "params": params, "chunk_hashes": chunk_hashes,
+                  "chunks": len(chunk_hashes), "updated_at": time.time()}},
+        upsert=True)
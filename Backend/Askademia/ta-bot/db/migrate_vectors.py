@@ -0,0 +1,233 @@
+# db/migrate_vectors.py
+"""
+Rewrite stored embeddings between formats, and measure what it buys.
+
+    python db/migrate_vectors.py migrate --to float32 [--batch 500]
+    python db/migrate_vectors.py migrate --to array          # roll back
+    python db/migrate_vectors.py small [--dim 256]           # backfill embedding_small
+    python db/migrate_vectors.py compare [--sample 5000] [--k 5]
+    python db/migrate_vectors.py compare --synthetic 20000   # no database needed
+
+`migrate` converts `syllabus_chunks` in place (`embedding` and, where
+present, `embedding_small`), in `_id` order and in batches; only documents
+with a vector still in the old format are selected, so an
+interrupted run just continues where it stopped. `small` adds the
+truncated `embedding_small` vector (two-stage retrieval) to documents that
+lack it, the same way. `compare` reports the per-document BSON size of each
+format and recall@k of float32 storage, of int8 / binary index quantization
+and of two-stage (small-dimension candidates, full-vector re-ranking)
+search against exact float64 search, plus the scan time of the latter.
+"""
+import sys
+import os
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import argparse, time
+import bson
+import numpy as np
+from pymongo import UpdateOne
+from db.vector_codec import encode_vector, decode_vector, truncate_vector, FORMATS
+import config
+
+COLL_NAME = "syllabus_chunks"   # Should match index_setup.py
+FIELDS    = ("embedding", "embedding_small")   # every stored vector field
+BATCH     = 500                 # documents rewritten per bulk_write
+OVERSAMPLE = 4                  # candidates per result rescored after a quantized search
+
+def collection_stats(coll) -> dict:
+    """Data / storage size of the collection (empty dict if the tier hides it)."""
+    try:
+        stats = next(coll.aggregate([{"$collStats": {"storageStats": {}}}]))["storageStats"]
+        return {k: stats.get(k) for k in ("count", "size", "avgObjSize", "storageSize")}
+    except Exception:
+        return {}
+
+# --- Migration ---
+def migrate(to: str, batch: int = BATCH) -> int:
+    from db.mongo_client import get_db
+    coll  = get_db()[COLL_NAME]
+    # documents with a vector still in the other format (the two formats are BSON array / binData)
+    old   = "array" if to == "float32" else "binData"
+    flt   = {"$or": [{f: {"$type": old}} for f in FIELDS]}
+
+    before, done, last_id = collection_stats(coll), 0, None
+    start = time.perf_counter()
+    while True:
+        page_flt = dict(flt, **({"_id": {"$gt": last_id}} if last_id is not None else {}))
+        docs = list(coll.find(page_flt, dict.fromkeys(FIELDS, 1)).sort("_id", 1).limit(batch))
+        if not docs:
+            break
+        coll.bulk_write([UpdateOne({"_id": d["_id"]},
+                                   {"$set": {f: encode_vector(decode_vector(d[f]), to)
+                                             for f in FIELDS if d.get(f) is not None}})
+                         for d in docs], ordered=False)
+        done   += len(docs)
+        last_id = docs[-1]["_id"]
+        print(f"  {done} documents converted ({done / (time.perf_counter() - start):.0f}/s)")
+
+    after = collection_stats(coll)
+    print(f"✔ {done} embeddings rewritten as {to}")
+    if before and after:
+        print(f"  collection data size: {before['size'] / 2**20:.1f} MB -> {after['size'] / 2**20:.1f} MB "
+              f"(avg doc {before['avgObjSize']} -> {after['avgObjSize']} B)")
+    return done
+
+def add_small_vectors(dim: int, batch: int = BATCH) -> int:
+    """
+    Store `embedding_small` (first *dim* dimensions, renormalised) where it is
+    missing or has another length (SMALL_EMBEDDING_DIM changed).
+    """
+    from db.mongo_client import get_db
+    coll = get_db()[COLL_NAME]
+    small = "$embedding_small"
+    flt  = {"$or": [
+        {"embedding_small": {"$exists": False}},
+        {"$expr": {"$and": [{"$isArray": small}, {"$ne": [{"$size": small}, dim]}]}},
+        # float32 binData: 2 header bytes + 4 per dimension
+        {"$expr": {"$and": [{"$eq": [{"$type": small}, "binData"]},
+                            {"$ne": [{"$binarySize": small}, 2 + 4 * dim]}]}},
+    ]}
+    done, last_id = 0, None
+    start = time.perf_counter()
+    while True:
+        page_flt = dict(flt, **({"_id": {"$gt": last_id}} if last_id is not None else {}))
+        docs = list(coll.find(page_flt, {"embedding": 1}).sort("_id", 1).limit(batch))
+        if not docs:
+            break
+        coll.bulk_write([UpdateOne({"_id": d["_id"]},
+                                   {"$set": {"embedding_small": encode_vector(
+                                       truncate_vector(decode_vector(d["embedding"]), dim))}})
+                         for d in docs], ordered=False)
+        done   += len(docs)
+        last_id = docs[-1]["_id"]
+        print(f"  {done} documents updated ({done / (time.perf_counter() - start):.0f}/s)")
+    print(f"✔ {done} documents got a {dim}-D embedding_small")
+    return done
+
+# --- Comparison ---
+def _top_k(scores: np.ndarray, k: int) -> np.ndarray:
+    top = np.argpartition(-scores, k - 1, axis=1)[:, :k]
+    return np.take_along_axis(top, np.argsort(-np.take_along_axis(scores, top, axis=1), axis=1), axis=1)
+
+def _recall(found: np.ndarray, truth: np.ndarray) -> float:
+    return float(np.mean([len(set(f) & set(t)) / len(t) for f, t in zip(found, truth)]))
+
+def _rescore(candidates: np.ndarray, queries: np.ndarray, corpus: np.ndarray, k: int) -> np.ndarray:
+    """Re-rank quantized candidates with full vectors (what Atlas does for quantized indexes)."""
+    out = []
+    for q, cand in zip(queries, candidates):
+        exact = corpus[cand] @ q
+        out.append(cand[np.argsort(-exact)[:k]])
+    return np.array(out)
+
+def _timed(fn) -> tuple:
+    start = time.perf_counter()
+    out = fn()
+    return out, time.perf_counter() - start
+
+def compare(vectors: np.ndarray, n_queries: int = 200, k: int = 5,
+            small_dims: tuple = (128, 256), oversample: int = 8) -> dict:
+    """
+    Storage size per document and recall@k of each representation. The first
+    *n_queries* vectors are the queries, searched against the rest.
+    """
+    vectors  = vectors / np.linalg.norm(vectors, axis=1, keepdims=True)
+    queries  = vectors[:n_queries].astype(np.float64)
+    corpus64 = vectors[n_queries:].astype(np.float64)
+    truth    = _top_k(queries @ corpus64.T, k)
+
+    corpus32 = corpus64.astype(np.float32)
+    # int8 scalar quantization: per-dimension min/max mapped to [-128, 127]
+    lo, hi   = corpus32.min(axis=0), corpus32.max(axis=0)
+    scale    = np.where(hi > lo, (hi - lo) / 255, 1)
+    int8     = np.round((corpus32 - lo) / scale - 128).astype(np.int8)
+    deq      = (int8.astype(np.float32) + 128) * scale + lo
+    # binary quantization: one sign bit per dimension
+    bits     = np.where(corpus32 > 0, 1.0, -1.0).astype(np.float32)
+    qbits    = np.where(queries > 0, 1.0, -1.0).astype(np.float32)
+    q32      = queries.astype(np.float32)
+
+    sample = vectors[0]
+    sizes  = {f: len(bson.encode({"embedding": encode_vector(sample, f)})) for f in FORMATS}
+    sizes["int8 index"]   = len(sample) + 2
+    sizes["binary index"] = (len(sample) + 7) // 8 + 2
+
+    wide = k * OVERSAMPLE
+    recall = {
+        "float32 storage":      _recall(_top_k(q32 @ corpus32.T, k), truth),
+        "int8 (scalar) index":  _recall(_top_k(q32 @ deq.T, k), truth),
+        "int8 + rescoring":     _recall(_rescore(_top_k(q32 @ deq.T, wide), q32, corpus32, k), truth),
+        "binary index":         _recall(_top_k(qbits @ bits.T, k), truth),
+        "binary + rescoring":   _recall(_rescore(_top_k(qbits @ bits.T, wide), q32, corpus32, k), truth),
+    }
+
+    # two-stage: scan a truncated, renormalised copy, re-rank limit * oversample with full vectors
+    _, full_time = _timed(lambda: _top_k(q32 @ corpus32.T, k))
+    scan_ms = {"full 768-D scan": full_time / n_queries * 1000}
+    for dim in small_dims:
+        small  = np.stack([truncate_vector(v, dim) for v in corpus32])
+        qsmall = np.stack([truncate_vector(q, dim) for q in q32])
+        found, t = _timed(lambda: _rescore(_top_k(qsmall @ small.T, k * oversample), q32, corpus32, k))
+        name = f"two-stage {dim}-D x{oversample}"
+        recall[f"{dim}-D only"] = _recall(_top_k(qsmall @ small.T, k), truth)
+        recall[name]            = _recall(found, truth)
+        sizes[f"{dim}-D index"] = dim * 4
+        scan_ms[name]           = t / n_queries * 1000
+    return {"bytes_per_vector": sizes, f"recall@{k}": recall, "scan_ms_per_query": scan_ms,
+            "corpus": len(corpus64), "queries": n_queries}
+
+def synthetic_vectors(n: int, dim: int = 768, topics: int = 200, seed: int = 0) -> np.ndarray:
+    """Clustered random vectors (real embeddings group by topic; pure noise has no neighbours)."""
+    rng     = np.random.default_rng(seed)
+    centers = rng.standard_normal((topics, dim)).astype(np.float32)
+    return centers[rng.integers(topics, size=n)] + 0.6 * rng.standard_normal((n, dim)).astype(np.float32)
+
+def sample_vectors(n: int) -> np.ndarray:
+    from db.mongo_client import get_db
+    coll = get_db()[COLL_NAME]
+    docs = coll.aggregate([{"$sample": {"size": n}}, {"$project": {"_id": 0, "embedding": 1}}])
+    vecs = [decode_vector(d["embedding"]) for d in docs]
+    if not vecs:
+        raise ValueError(f"No documents in '{COLL_NAME}' to sample")
+    return np.stack(vecs)
+
+if __name__ == "__main__":
+    ap = argparse.ArgumentParser(description="Convert stored embeddings and compare formats.")
+    sub = ap.add_subparsers(dest="cmd", required=True)
+    mg = sub.add_parser("migrate", help="rewrite syllabus_chunks embeddings in place")
+    mg.add_argument("--to", choices=FORMATS, default="float32")
+    mg.add_argument("--batch", type=int, default=BATCH, help="documents per bulk write")
+    sm = sub.add_parser("small", help="add embedding_small for two-stage retrieval")
+    sm.add_argument("--dim", type=int, default=config.SMALL_EMBEDDING_DIM or 256)
+    sm.add_argument("--batch", type=int, default=BATCH, help="documents per bulk write")
+    cp = sub.add_parser("compare", help="size and recall@k of each representation")
+    cp.add_argument("--sample", type=int, default=5000, help="documents sampled from MongoDB")
+    cp.add_argument("--synthetic", type=int, default=0, help="use N clustered random 768-D vectors instead")
+    cp.add_argument("--queries", type=int, default=200)
+    cp.add_argument("--k", type=int, default=5)
+    cp.add_argument("--small-dims", default="128,256", help="two-stage first-stage dimensions")
+    cp.add_argument("--oversample", type=int, default=config.TWO_STAGE_OVERSAMPLE,
+                    help="two-stage candidates per result")
+    args = ap.parse_args()
+
+    if args.cmd == "migrate":
+        migrate(args.to, args.batch)
+    elif args.cmd == "small":
+        add_small_vectors(args.dim, args.batch)
+    else:
+        if args.synthetic:
+            vecs = synthetic_vectors(args.synthetic)
+        else:
+            vecs = sample_vectors(args.sample)
+        result = compare(vecs, args.queries, args.k,
+                         tuple(int(d) for d in args.small_dims.split(",") if d), args.oversample)
+        print(f"Vectors: {result['corpus']} corpus, {result['queries']} queries")
+        print("Bytes per stored / indexed vector:")
+        for name, size in result["bytes_per_vector"].items():
+            print(f"  {name:<22}{size:>8}")
+        print(f"Recall@{args.k} vs exact float64 search:")
+        for name, r in result[f"recall@{args.k}"].items():
+            print(f"  {name:<22}{r:>8.3f}")
+        print("Scan time per query (numpy, this machine):")
+        for name, ms in result["scan_ms_per_query"].items():
+            print(f"  {name:<22}{ms:>8.3f} ms")
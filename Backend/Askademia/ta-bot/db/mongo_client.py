@@ -1,10 +1,31 @@
-import os, pymongo
+import os, threading, pymongo
+from dotenv import load_dotenv
+
+load_dotenv()
+
+DB_NAME = "Classroom-qna"                    # single DB
+
 _client = None
+_lock   = threading.Lock()
 
-def get_db():
+def get_client() -> pymongo.MongoClient:
+    """
+    Shared MongoClient, built on first use. Construction does no network I/O;
+    the pool connects lazily on the first command (or in `warm_up()`).
+    """
     global _client
-    if not _client:
-        _client = pymongo.MongoClient(os.getenv("MONGODB_URI"))
-    return _client["Classroom-qna"]          # single DB
+    if _client is None:
+        with _lock:
+            if _client is None:
+                _client = pymongo.MongoClient(os.getenv("MONGO_URI") or os.getenv("MONGODB_URI"))
+    return _client
+
+def get_db():
+    return get_client()[DB_NAME]
+
+def warm_up():
+    """Open a pooled connection (server selection + handshake) ahead of the first query."""
+    get_client().admin.command("ping")
 
-print(get_db().list_collection_names())
+if __name__ == "__main__":
+    print(get_db().list_collection_names())
@@ -0,0 +1,66 @@
+# db/vector_codec.py
+"""
+One place to convert embeddings between `embed()`'s `list[float]` and what
+is stored in `syllabus_chunks.embedding`.
+
+    "array"    BSON array of doubles (~9.9 KB for 768-D, the original format)
+    "float32"  BSON binary vector, packed little-endian float32 (~3.1 KB)
+
+`decode_vector` reads either format (plus int8 / packed-bit binary vectors)
+back into a float32 numpy array, so readers never care which one a document
+uses. Atlas indexes both; `VECTOR_INDEX_QUANTIZATION` in db/index_setup.py
+controls int8 ("scalar") or 1-bit ("binary") quantization of the index.
+`truncate_vector` derives the reduced-dimension `embedding_small` used by
+two-stage retrieval (`RAG_BACKEND=two_stage`).
+"""
+import sys
+import os
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import numpy as np
+from bson.binary import Binary, BinaryVectorDtype, VECTOR_SUBTYPE
+import config
+
+FORMATS = ("array", "float32")
+
+# BSON binary vector layout: [dtype byte][padding byte][data...]
+_FLOAT32 = BinaryVectorDtype.FLOAT32.value[0]
+_INT8    = BinaryVectorDtype.INT8.value[0]
+_BIT     = BinaryVectorDtype.PACKED_BIT.value[0]
+
+def encode_vector(vector, fmt: str | None = None):
+    """`list[float]` / ndarray -> value to store in the `embedding` field."""
+    fmt = fmt or config.VECTOR_FORMAT
+    if fmt == "array":
+        return [float(x) for x in vector]
+    if fmt == "float32":
+        # same bytes as Binary.from_vector(..., FLOAT32), without a Python float loop
+        data = np.asarray(vector, dtype="<f4").tobytes()
+        return Binary(bytes((_FLOAT32, 0)) + data, subtype=VECTOR_SUBTYPE)
+    raise ValueError(f"Unknown vector format '{fmt}', expected one of {FORMATS}")
+
+def decode_vector(value) -> np.ndarray:
+    """Stored `embedding` value (any supported format) -> float32 ndarray."""
+    if isinstance(value, Binary) and value.subtype == VECTOR_SUBTYPE:
+        dtype, padding, data = value[0], value[1], bytes(value[2:])
+        if dtype == _FLOAT32:
+            return np.frombuffer(data, dtype="<f4").copy()
+        if dtype == _INT8:
+            return np.frombuffer(data, dtype=np.int8).astype(np.float32)
+        if dtype == _BIT:
+            bits = np.unpackbits(np.frombuffer(data, dtype=np.uint8))
+            return bits[:len(bits) - padding].astype(np.float32) * 2 - 1
+        raise ValueError(f"Unsupported binary vector dtype 0x{dtype:02x}")
+    return np.asarray(value, dtype=np.float32)
+
+def truncate_vector(vector, dim: int) -> np.ndarray:
+    """First *dim* dimensions renormalised to unit length (the `embedding_small` field)."""
+    v = np.asarray(vector, dtype=np.float32)[:dim]
+    norm = np.linalg.norm(v)
+    return v / norm if norm else v
+
+def vector_format(value) -> str:
+    """Which format a stored value uses ("array", "float32", or the binary dtype)."""
+    if isinstance(value, Binary) and value.subtype == VECTOR_SUBTYPE:
+        return {_FLOAT32: "float32", _INT8: "int8", _BIT: "binary"}.get(value[0], "unknown")
+    return "array"
@@ -3,13 +3,56 @@ Robust token-window splitter.
 Works even when the PDF is one long paragraph or OCR’d text.
 """
 
+import functools
 import tiktoken
+from typing import Iterable, Iterator
 
-# GPT-4o / GPT-4 / GPT-3.5 all share cl100k_base
-try:
-    ENC = tiktoken.encoding_for_model("gpt-4o")
-except KeyError:
-    ENC = tiktoken.get_encoding("cl100k_base")
+@functools.lru_cache(maxsize=None)
+def get_encoder():
+    """Tokenizer, loaded on first use (the BPE file may need a download)."""
+    # GPT-4o / GPT-4 / GPT-3.5 all share cl100k_base
+    try:
+        return tiktoken.encoding_for_model("gpt-4o")
+    except KeyError:
+        return tiktoken.get_encoding("cl100k_base")
+
+def count_tokens(text: str) -> int:
+    return len(get_encoder().encode(text, disallowed_special=()))
+
+def stream_chunks(pages: Iterable[tuple[int, str]],
+                  max_tokens: int = 800,
+                  overlap: int = 80) -> Iterator[dict]:
+    """
+    Single-pass token windows over `(page_number, text)` pairs.
+
+    Pages are tokenized one at a time and only the current window's tokens
+    are kept, so memory stays flat however long the document is. Yields
+    `{"text", "chunk_index", "page_start", "page_end", "tokens"}` for windows of
+    ≤ *max_tokens* tokens sharing *overlap* tokens with the previous one.
+    """
+    if not 0 <= overlap < max_tokens:
+        raise ValueError("overlap must be in [0, max_tokens)")
+    enc  = get_encoder()
+    step = max_tokens - overlap
+    toks, pages_of = [], []                  # current window + page of every token
+    index = 0
+
+    def window(n: int) -> dict:
+        return {"text": enc.decode(toks[:n]), "chunk_index": index,
+                "page_start": pages_of[0], "page_end": pages_of[n - 1], "tokens": n}
+
+    for page_no, text in pages:
+        page_toks = enc.encode(text, disallowed_special=())
+        toks.extend(page_toks)
+        pages_of.extend([page_no] * len(page_toks))
+        while len(toks) >= max_tokens:
+            yield window(max_tokens)
+            index += 1
+            del toks[:step], pages_of[:step]  # keep the overlap, never re-encode it
+
+    # leftovers not already covered by the last full window
+    if len(toks) > (overlap if index else 0):
+        yield window(len(toks))
 
 def sliding_chunks(text: str,
                    max_tokens: int = 800,
@@ -17,8 +60,5 @@ def sliding_chunks(text: str,
     """
     Yield chunks of ≤ *max_tokens* tokens with *overlap* tokens of context.
     """
-    toks = ENC.encode(text, disallowed_special=())
-    step = max_tokens - overlap
-    for i in range(0, len(toks), step):
-        yield ENC.decode(toks[i:i + max_tokens])
-
+    for c in stream_chunks([(1, text)], max_tokens, overlap):
+        yield c["text"]
@@ -0,0 +1,135 @@
+"""
+Embedding cache used by `embed()` / `embed_batch()`.
+
+Vectors are keyed by (model, normalised text), kept in a bounded in-memory
+LRU and, when a path is given, in a SQLite file that survives restarts and
+can be shared by several processes (TA workers, the loader). Lookups only
+match rows of the cache's own model, so changing `EMBED_MODEL` never serves
+stale vectors, and processes on different models can share one file. The
+file keeps at most *max_rows* rows over all models; the oldest are pruned.
+"""
+import time
+import hashlib
+import sqlite3
+import threading
+import unicodedata
+from collections import OrderedDict
+import numpy as np
+
+ENTRY_OVERHEAD = 200                # approx. bytes per entry besides the vector (key, dict slot)
+PRUNE_EVERY    = 1000               # rows written between checks of the disk row cap
+
+def normalise(text: str) -> str:
+    """Unicode NFC with whitespace runs collapsed; case is kept (it can change the meaning)."""
+    return " ".join(unicodedata.normalize("NFC", text).split())
+
+class EmbeddingCache:
+    """Thread-safe LRU of float32 vectors with an optional SQLite backing store."""
+
+    def __init__(self, model: str, max_entries: int = 10_000, path: str | None = None,
+                 max_rows: int = 100_000):
+        self.model       = model
+        self.max_entries = max_entries
+        self.max_rows    = max_rows
+        self.path        = path
+        self._written    = 0                # rows written since the last prune
+        self._mem        = OrderedDict()    # key -> np.ndarray, least recently used first
+        self._lock       = threading.Lock()
+        self._db         = None
+        self.hits = self.disk_hits = self.misses = 0
+        if path:
+            self._open(path)
+
+    # --- Disk store ---
+    def _open(self, path: str):
+        db = sqlite3.connect(path, check_same_thread=False, timeout=30)
+        db.execute("PRAGMA journal_mode=WAL")          # concurrent readers across processes
+        db.execute("CREATE TABLE IF NOT EXISTS embeddings "
+                   "(key TEXT PRIMARY KEY, model TEXT, vector BLOB, created REAL)")
+        db.execute("CREATE INDEX IF NOT EXISTS embeddings_created ON embeddings (created)")
+        db.commit()
+        self._db = db
+        self._prune()
+
+    def _prune(self):
+        """Delete the oldest rows beyond `max_rows` (any model); caller holds the lock or is `_open`."""
+        self._written = 0
+        (rows,) = self._db.execute("SELECT COUNT(*) FROM embeddings").fetchone()
+        if rows > self.max_rows:
+            self._db.execute("DELETE FROM embeddings WHERE key IN "
+                             "(SELECT key FROM embeddings ORDER BY created LIMIT ?)",
+                             (rows - self.max_rows,))
+            self._db.commit()
+
+    def _key(self, text: str) -> str:
+        return hashlib.sha256(f"{self.model}\0{normalise(text)}".encode("utf-8")).hexdigest()
+
+    def _remember(self, key: str, vec: np.ndarray):
+        self._mem[key] = vec
+        self._mem.move_to_end(key)
+        while len(self._mem) > self.max_entries:
+            self._mem.popitem(last=False)
+
+    # --- API ---
+    def get_many(self, texts: list[str]) -> list[np.ndarray | None]:
+        """Cached vector per text, None where it has to be embedded."""
+        keys, out, missing = [self._key(t) for t in texts], [], []
+        with self._lock:
+            for i, k in enumerate(keys):
+                vec = self._mem.get(k)
+                if vec is not None:
+                    self._mem.move_to_end(k)
+                    self.hits += 1
+                else:
+                    missing.append(i)
+                out.append(vec)
+            if missing and self._db is not None:
+                wanted = {keys[i] for i in missing}
+                marks  = ",".join("?" * len(wanted))
+                rows   = dict(self._db.execute(
+                    f"SELECT key, vector FROM embeddings WHERE model = ? AND key IN ({marks})",
+                    (self.model, *wanted)))
+                for i in missing:
+                    blob = rows.get(keys[i])
+                    if blob is not None:
+                        out[i] = np.frombuffer(blob, dtype=np.float32)
+                        self._remember(keys[i], out[i])
+                        self.disk_hits += 1
+            self.misses += sum(1 for v in out if v is None)
+        return out
+
+    def put_many(self, texts: list[str], vectors):
+        items = [(self._key(t), np.asarray(v, dtype=np.float32)) for t, v in zip(texts, vectors)]
+        with self._lock:
+            for k, v in items:
+                self._remember(k, v)
+            if self._db is not None:
+                now = time.time()
+                self._db.executemany("INSERT OR REPLACE INTO embeddings VALUES (?, ?, ?, ?)",
+                                     [(k, self.model, v.tobytes(), now) for k, v in items])
+                self._db.commit()
+                self._written += len(items)
+                if self._written >= PRUNE_EVERY:
+                    self._prune()
+
+    def get(self, text: str) -> np.ndarray | None:
+        return self.get_many([text])[0]
+
+    def put(self, text: str, vector):
+        self.put_many([text], [vector])
+
+    def clear(self):
+        with self._lock:
+            self._mem.clear()
+            if self._db is not None:
+                self._db.execute("DELETE FROM embeddings WHERE model = ?", (self.model,))
+                self._db.commit()
+
+    def stats(self) -> dict:
+        with self._lock:
+            lookups = self.hits + self.disk_hits + self.misses
+            memory  = sum(v.nbytes for v in self._mem.values()) + ENTRY_OVERHEAD * len(self._mem)
+            return {"hits": self.hits, "disk_hits": self.disk_hits, "misses": self.misses,
+                    "hit_ratio": (self.hits + self.disk_hits) / lookups if lookups else 0.0,
+                    "entries": len(self._mem), "memory_mb": memory / 2**20,
+                    "disk": self.path}
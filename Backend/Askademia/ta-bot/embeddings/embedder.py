@@ -1,26 +1,82 @@
+import sys
 import os
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import threading
 from dotenv import load_dotenv          # pip install python-dotenv
-from google import genai                # pip install --upgrade google-genai
+from embeddings.embed_cache import EmbeddingCache
+from utils.logging_conf import count
+from utils import gemini_client
+import config
 
 
 load_dotenv()
 
-API_KEY = os.getenv("GEMINI_KEY") or os.getenv("GEMINI_API_KEY")
+EMBED_MODEL = "text-embedding-004"     # or text-embedding-005 (cached vectors are per model)
+MAX_BATCH   = 100                      # texts per embed_content call (API limit)
+
+_cache  = None
+_lock   = threading.Lock()
 
-if not API_KEY:
-    raise ValueError("GEMINI_KEY or GEMINI_API_KEY must be set")
+def get_cache() -> EmbeddingCache | None:
+    """Shared embedding cache (None when EMBED_CACHE_ENABLED=0), opened on first use."""
+    global _cache
+    if _cache is None and config.EMBED_CACHE_ENABLED:
+        with _lock:
+            if _cache is None:
+                _cache = EmbeddingCache(EMBED_MODEL, max_entries=config.EMBED_CACHE_MAX_ENTRIES,
+                                        path=config.EMBED_CACHE_PATH or None,
+                                        max_rows=config.EMBED_CACHE_MAX_ROWS)
+    return _cache
 
-client = genai.Client(api_key=API_KEY)         # one client per process
-EMBED_MODEL = "text-embedding-004"     # or text-embedding-005
+def _embed_remote(text: str, kind: str = "query_embed") -> list[float]:
+    # rate limiting, retries and deadlines live in the shared client layer
+    return gemini_client.embed([text], EMBED_MODEL, kind)[0]
 
-def embed(text: str) -> list[float]:
+def embed(text: str, kind: str = "query_embed") -> list[float]:
     """
     Return a list[float] vector for *text* (length = 768 for this model).
+    Identical (normalised) text is served from the embedding cache. *kind*
+    is the call type for rate limiting ("query_embed" or "ingest_embed").
+    """
+    cache = get_cache()
+    if cache is not None:
+        vec = cache.get(text)
+        count("askademia_embed_cache_total", result="miss" if vec is None else "hit")
+        if vec is not None:
+            return vec.tolist()
+    vec = _embed_remote(text, kind)
+    if cache is not None:
+        cache.put(text, vec)
+    return vec
+
+def embed_batch(texts: list[str], kind: str = "ingest_embed") -> list[list[float]]:
+    """
+    Embed several texts with as few `embed_content` calls as possible
+    (`MAX_BATCH` texts each). Vectors come back in the same order as *texts*;
+    cached texts are not sent.
     """
-    resp = client.models.embed_content(model=EMBED_MODEL, contents=text)
-    # SDK returns `.embedding` (single) or `.embeddings` (batch) – handle both
-    return getattr(resp, "embedding", resp.embeddings[0].values)
+    texts  = list(texts)
+    cache  = get_cache()
+    cached = cache.get_many(texts) if cache is not None else [None] * len(texts)
+    out    = [None if v is None else v.tolist() for v in cached]
+    todo   = list(dict.fromkeys(t for t, v in zip(texts, cached) if v is None))   # unique, in order
+    if todo:
+        fresh = {}
+        for i in range(0, len(todo), MAX_BATCH):
+            part = todo[i:i + MAX_BATCH]
+            fresh.update(zip(part, gemini_client.embed(part, EMBED_MODEL, kind)))
+        out   = [fresh[t] if v is None else v for t, v in zip(texts, out)]
+        if cache is not None:
+            cache.put_many(todo, list(fresh.values()))
+    return out
+
+def warm_up():
+    """Build the client and open its HTTPS connection with a tiny embed call."""
+    get_cache()
+    _embed_remote("hello")
 
-vec = embed("hello")
-print("dims:", len(vec))          # expect: 768
-print("first 4:", vec[:4])
\ No newline at end of file
+if __name__ == "__main__":
+    vec = embed("hello")
+    print("dims:", len(vec))          # expect: 768
+    print("first 4:", vec[:4])
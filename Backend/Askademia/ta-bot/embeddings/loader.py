@@ -2,38 +2,333 @@ import sys
 import os
 sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 
-import pathlib, fitz, tqdm, sys, glob
-from embeddings.embedder         import embed
-from embeddings.chunk_utils      import sliding_chunks as chunks
+import pathlib, fitz, tqdm, sys, glob, time, argparse
+from collections                 import deque
+from concurrent.futures          import ThreadPoolExecutor, ProcessPoolExecutor
+from itertools                   import islice
+from pymongo                     import UpdateOne
+from embeddings.embedder         import embed, embed_batch, EMBED_MODEL
+from embeddings.chunk_utils      import stream_chunks
 from db.mongo_client             import get_db
+from db.corpus_version           import bump_corpus_version
+from db.catalog                  import record_document, has_document
+from db.lexical_index            import write_shard, has_shard
+from db.vector_codec             import encode_vector, decode_vector, truncate_vector
+from db.manifest                 import (file_hash, chunk_hash, get_manifest,
+                                         start_manifest, complete_manifest)
+import config
 
-COLL = get_db()["syllabus_chunks"]          # or "syllabus_chunks"
-BATCH = 64                                # Mongo bulk-insert size
+COLL_NAME   = "syllabus_chunks"
+BATCH       = 64                          # Mongo bulk-insert size
+EMBED_BATCH = 32                          # chunks per embed_content call (API max 100)
+CONCURRENCY = 4                           # embed calls in flight at once
+CHUNK_TOKENS  = 800                       # token window size
+CHUNK_OVERLAP = 80                        # tokens shared by consecutive windows
+WRITE_BATCH   = 1000                      # metadata updates / deletes per round trip
+
+class IngestStats:
+    """Throughput counters for one or more `ingest()` runs."""
+
+    def __init__(self):
+        self.chunks      = 0             # chunks embedded
+        self.embed_calls = 0
+        self.batch_sizes = []
+        self.seconds     = 0.0
+        self.reused      = 0             # unchanged chunks kept without embedding
+        self.deleted     = 0             # stale chunks removed
+        self.unchanged   = 0             # files skipped entirely
+
+    def record_batch(self, size: int):
+        self.chunks      += size
+        self.embed_calls += 1
+        self.batch_sizes.append(size)
+
+    def report(self) -> str:
+        rate  = self.chunks / self.seconds if self.seconds else 0.0
+        sizes = self.batch_sizes or [0]
+        return (f"{self.chunks} chunks in {self.seconds:.1f}s ({rate:.1f} chunks/s), "
+                f"{self.embed_calls} embed calls, batch size "
+                f"min/mean/max {min(sizes)}/{sum(sizes) / len(sizes):.1f}/{max(sizes)}; "
+                f"{self.reused} reused, {self.deleted} stale removed, "
+                f"{self.unchanged} unchanged files skipped")
+
+def pdf_pages(path: pathlib.Path):
+    """Yield `(page_number, text)` one page at a time (PyMuPDF), 1-based."""
+    with fitz.open(path) as doc:
+        for page in doc:
+            yield page.number + 1, page.get_text("text")
 
 def pdf_text(path: pathlib.Path) -> str:
     """Return plain text from a PDF (PyMuPDF)."""
-    return "".join(p.get_text("text") for p in fitz.open(path))
+    return "".join(text for _, text in pdf_pages(path))
+
+def pdf_chunks(path: str | pathlib.Path, max_tokens: int = CHUNK_TOKENS,
+               overlap: int = CHUNK_OVERLAP):
+    """Stream token-window chunks (with page numbers) without loading the whole PDF."""
+    return stream_chunks(pdf_pages(pathlib.Path(path)), max_tokens, overlap)
+
+def extract_chunks(path: str | pathlib.Path) -> list[dict]:
+    """`pdf_chunks` materialised; runs in a worker process for `--processes`."""
+    return list(pdf_chunks(path))
+
+def ingest_params() -> dict:
+    """What a stored chunk depends on besides its text (recorded in the manifest)."""
+    return {"max_tokens": CHUNK_TOKENS, "overlap": CHUNK_OVERLAP, "embed_model": EMBED_MODEL,
+            "small_dim": config.SMALL_EMBEDDING_DIM}
+
+def _unchanged(manifest: dict | None, digest: str, params: dict) -> bool:
+    return bool(manifest and manifest.get("status") == "complete"
+                and manifest.get("file_hash") == digest and manifest.get("params") == params)
+
+def needs_ingest(pdf: str | pathlib.Path, course_id: str) -> bool:
+    """False if `ingest` would skip *pdf* as unchanged (checked before extracting it)."""
+    p = pathlib.Path(pdf)
+    return not _unchanged(get_manifest(course_id, p.name), file_hash(p), ingest_params())
+
+def _batched(it, n: int):
+    it = iter(it)
+    while group := list(islice(it, n)):
+        yield group
+
+def _embed_group(group: list[dict]) -> list[list[float]]:
+    texts = [c["text"] for c in group]
+    # a batch of one goes through the plain single-text path (= old serial behaviour)
+    return embed_batch(texts) if len(texts) > 1 else [embed(texts[0], kind="ingest_embed")]
+
+def _stored_chunks(coll, course_id: str, file: str, model: str | None,
+                   vectors: bool = False) -> tuple[dict, list]:
+    """
+    Chunks already in Mongo for this file: `(reusable, outdated)`, reusable as
+    chunk_hash -> [docs]. Only vectors from the current embed model are
+    reusable; chunks stored before they carried `embed_model` count as
+    *model*, the last completed run's. The full `embedding` is only fetched
+    with *vectors* (to re-derive `embedding_small`).
+    """
+    stored, outdated = {}, []
+    fields = {"embedding_small": 0} if vectors else {"embedding": 0, "embedding_small": 0}
+    for d in coll.find({"course_id": course_id, "file": file}, fields):
+        if (d.get("embed_model") or model) != EMBED_MODEL:
+            outdated.append(d)
+            continue
+        h = d.get("chunk_hash") or chunk_hash(d["chunk"])     # docs loaded before manifests
+        stored.setdefault(h, []).append(d)
+    return stored, outdated
+
+def _write_lexical(coll, course_id: str, file: str):
+    """The file's lexical shard, streamed from its stored chunks."""
+    write_shard(config.LEXICAL_INDEX_DIR, course_id, file,
+                coll.find({"course_id": course_id, "file": file},
+                          {"_id": 0, "chunk": 1, "chunk_index": 1, "page_start": 1, "page_end": 1}))
 
-def ingest(pdf: str | pathlib.Path, course_id: str = "GEN"):
-    p    = pathlib.Path(pdf)
-    text = pdf_text(p)
-    buf  = []
+def _backfill(coll, course_id: str, p: pathlib.Path):
+    """
+    Catalog entry and lexical shard of an unchanged file, if missing: files
+    loaded before either existed are skipped by the manifest check and would
+    otherwise never get them. Built from the stored chunks, no PDF parsing.
+    """
+    catalog = has_document(course_id, p.name)
+    lexical = not config.LEXICAL_ENABLED or has_shard(config.LEXICAL_INDEX_DIR, course_id, p.name)
+    if catalog and lexical:
+        return
+    if not catalog:
+        docs = list(coll.find({"course_id": course_id, "file": p.name},
+                              {"_id": 0, "chunk": 1, "page_end": 1, "tokens": 1}))
+        record_document(course_id, p.name, chunks=len(docs),
+                        tokens=sum(d.get("tokens") or (len(d["chunk"]) + 3) // 4 for d in docs),
+                        text_bytes=sum(len(d["chunk"].encode("utf-8")) for d in docs),
+                        pages=max((d.get("page_end") or 0 for d in docs), default=0),
+                        file_bytes=p.stat().st_size, embed_model=EMBED_MODEL)
+    if not lexical:
+        _write_lexical(coll, course_id, p.name)
+    missing = [name for name, ok in (("catalog entry", catalog), ("lexical shard", lexical)) if not ok]
+    print(f"   {p.name}: added missing {' and '.join(missing)}")
 
-    for c in tqdm.tqdm(chunks(text)):            # token-window splitter
-        buf.append({"course_id": course_id,
-                    "file":       p.name,
-                    "chunk":      c,
-                    "embedding":  embed(c)})
-        if len(buf) == BATCH:
-            COLL.insert_many(buf); buf.clear()
+def ingest(pdf: str | pathlib.Path, course_id: str = "GEN",
+           embed_batch_size: int = EMBED_BATCH,
+           concurrency: int = CONCURRENCY,
+           stats: IngestStats | None = None,
+           chunks=None, force: bool = False) -> IngestStats:
+    """
+    Chunk, embed and store one PDF, incrementally.
+    An unchanged file (same content hash and chunker/embed parameters as its
+    manifest) is skipped, apart from adding a missing catalog entry / lexical
+    shard. Otherwise only chunks whose text is not already
+    stored for the file are embedded; kept chunks get their index/page
+    metadata refreshed and chunks no longer produced are deleted once the new
+    ones are in. Inserted batches carry their `chunk_hash`, so a crashed run
+    resumes from the last committed batch. *force* re-embeds everything.
 
-    if buf: COLL.insert_many(buf)                # flush leftovers
-    print(f"✅ {p.name}: {COLL.count_documents({'file': p.name})} chunks")
+    Pages are read and chunked lazily (or *chunks* from `extract_chunks` are
+    used as is). Chunks are embedded *embed_batch_size* at a time with up to
+    *concurrency* embed calls in flight, while a writer thread bulk-inserts
+    finished chunks. `embed_batch_size=1, concurrency=1` reproduces the old
+    serial path.
+    """
+    p      = pathlib.Path(pdf)
+    coll   = get_db()[COLL_NAME]
+    stats  = stats or IngestStats()
+    start  = time.perf_counter()
+    params = ingest_params()
+    digest = file_hash(p)
+
+    manifest = get_manifest(course_id, p.name)
+    if not force and _unchanged(manifest, digest, params):
+        stats.unchanged += 1
+        print(f"⏭  {p.name}: unchanged, skipped")
+        _backfill(coll, course_id, p)
+        return stats
+
+    # stored vectors are only reusable if they came from the same embed model
+    previous = (manifest or {}).get("params", {})
+    # kept chunks need a new embedding_small if the dimension changed (or is unknown)
+    resize = previous.get("small_dim") != params["small_dim"]
+    stored, outdated = _stored_chunks(coll, course_id, p.name,
+                                      previous.get("embed_model", EMBED_MODEL),
+                                      vectors=resize and bool(params["small_dim"]))
+    if force:
+        outdated += [d for docs in stored.values() for d in docs]
+        stored    = {}
+    start_manifest(course_id, p.name, digest)
+
+    hashes, updates = [], []
+    inserted = 0
+    totals   = {"tokens": 0, "text_bytes": 0, "pages": 0}     # for the document catalog
+
+    def to_embed():
+        """Chunks that need an embedding; reused ones are matched against `stored`."""
+        for c in (pdf_chunks(p) if chunks is None else chunks):
+            h = chunk_hash(c["text"])
+            hashes.append(h)
+            totals["tokens"]     += c.get("tokens", 0)
+            totals["text_bytes"] += len(c["text"].encode("utf-8"))
+            totals["pages"]       = max(totals["pages"], c["page_end"])
+            same = stored.get(h)
+            if same:
+                d    = same.pop()                 # what's left in `stored` at the end is stale
+                meta = {k: c[k] for k in ("chunk_index", "page_start", "page_end")}
+                update = {}
+                if (d.get("chunk_hash") != h or d.get("embed_model") != EMBED_MODEL
+                        or any(d.get(k) != v for k, v in meta.items())):
+                    update["$set"] = {**meta, "chunk_hash": h, "embed_model": EMBED_MODEL}
+                if resize and config.SMALL_EMBEDDING_DIM:
+                    update.setdefault("$set", {})["embedding_small"] = encode_vector(
+                        truncate_vector(decode_vector(d["embedding"]), config.SMALL_EMBEDDING_DIM))
+                elif resize:                      # two-stage turned off: drop the old prefix
+                    update["$unset"] = {"embedding_small": ""}
+                if update:
+                    updates.append(UpdateOne({"_id": d["_id"]}, update))
+                stats.reused += 1
+                continue
+            yield {**c, "chunk_hash": h}
+
+    buf, writes = [], []
+
+    with ThreadPoolExecutor(max_workers=concurrency) as pool, \
+         ThreadPoolExecutor(max_workers=1) as writer, \
+         tqdm.tqdm(desc=p.name, unit="chunk") as bar:
+
+        inflight = deque()                       # (group, future), submission order
+
+        def collect():
+            nonlocal inserted
+            group, fut = inflight.popleft()
+            stats.record_batch(len(group))
+            for c, vec in zip(group, fut.result()):
+                doc = {"course_id":   course_id,
+                       "file":        p.name,
+                       "chunk":       c["text"],
+                       "chunk_index": c["chunk_index"],
+                       "page_start":  c["page_start"],
+                       "page_end":    c["page_end"],
+                       "chunk_hash":  c["chunk_hash"],
+                       "tokens":      c.get("tokens"),
+                       "embed_model": EMBED_MODEL,
+                       "embedding":   encode_vector(vec)}
+                if config.SMALL_EMBEDDING_DIM:       # first-stage vector for two-stage retrieval
+                    doc["embedding_small"] = encode_vector(truncate_vector(vec, config.SMALL_EMBEDDING_DIM))
+                buf.append(doc)
+            inserted += len(group)
+            bar.update(len(group))
+            while len(buf) >= BATCH:             # Mongo writes overlap embedding
+                writes.append(writer.submit(coll.insert_many, buf[:BATCH]))
+                del buf[:BATCH]
+
+        for group in _batched(to_embed(), embed_batch_size):      # token-window splitter
+            if len(inflight) >= concurrency:
+                collect()
+            inflight.append((group, pool.submit(_embed_group, group)))
+        while inflight:
+            collect()
+
+        if buf: writes.append(writer.submit(coll.insert_many, list(buf)))   # flush leftovers
+        for w in writes:
+            w.result()                           # surface insert errors
+
+    # replacements are in; now fix kept chunks' metadata and drop stale ones
+    for i in range(0, len(updates), WRITE_BATCH):
+        coll.bulk_write(updates[i:i + WRITE_BATCH], ordered=False)
+    stale = [d["_id"] for docs in stored.values() for d in docs] + [d["_id"] for d in outdated]
+    for i in range(0, len(stale), WRITE_BATCH):
+        coll.delete_many({"_id": {"$in": stale[i:i + WRITE_BATCH]}})
+    stats.deleted += len(stale)
+    complete_manifest(course_id, p.name, digest, params, hashes)
+    record_document(course_id, p.name, chunks=len(hashes), file_bytes=p.stat().st_size,
+                    embed_model=EMBED_MODEL, **totals)
+    if config.LEXICAL_ENABLED:                   # from Mongo, so the chunks are never all in memory
+        _write_lexical(coll, course_id, p.name)
+
+    stats.seconds += time.perf_counter() - start
+    if inserted or stale or updates:
+        bump_corpus_version(course_id)           # invalidates cached answers for the course
+    print(f"✅ {p.name}: {len(hashes)} chunks ({inserted} embedded, "
+          f"{len(hashes) - inserted} reused, {len(stale)} stale removed)")
+    return stats
 
 # ── CLI ──────────────────────────────────────────────────────────────
 if __name__ == "__main__":
-    # Usage:  python embeddings/loader.py *.pdf COURSE_ID
-    pdfs      = sys.argv[1:-1] or glob.glob("*.pdf")
-    course_id = sys.argv[-1]   if len(sys.argv) > 2 else "GEN"
-    for pdf in pdfs:
-        ingest(pdf, course_id)
+    # Usage:  python embeddings/loader.py *.pdf COURSE_ID [--serial] [--processes N]
+    ap = argparse.ArgumentParser(description="Chunk, embed and load PDFs into MongoDB.")
+    ap.add_argument("args", nargs="*", help="PDF files followed by an optional COURSE_ID")
+    ap.add_argument("--batch-size",  type=int, default=EMBED_BATCH, help="chunks per embed call")
+    ap.add_argument("--concurrency", type=int, default=CONCURRENCY, help="embed calls in flight")
+    ap.add_argument("--serial", action="store_true",
+                    help="one chunk per embed call, one call at a time (baseline)")
+    ap.add_argument("--processes", type=int, default=1,
+                    help="extract and chunk PDFs in N worker processes (many/large PDFs)")
+    ap.add_argument("--force", action="store_true",
+                    help="re-embed every chunk even if the manifest says it is unchanged")
+    opts = ap.parse_args()
+
+    pdfs      = opts.args[:-1] or glob.glob("*.pdf")
+    course_id = opts.args[-1]  if len(opts.args) > 1 else "GEN"
+    if len(opts.args) == 1:                      # single arg is a PDF, not a course id
+        pdfs = opts.args
+    if opts.serial:
+        opts.batch_size, opts.concurrency = 1, 1
+
+    stats = IngestStats()
+    if opts.processes > 1 and len(pdfs) > 1:
+        # CPU-bound extraction/tokenization runs across cores; the parent
+        # embeds and stores each PDF as soon as its chunks are ready. Unchanged
+        # files are never extracted, and at most N extractions are pending so
+        # their chunk lists don't pile up while the parent embeds.
+        todo = []
+        for pdf in pdfs:
+            if opts.force or needs_ingest(pdf, course_id):
+                todo.append(pdf)
+            else:                                # skip path (catalog / lexical backfill)
+                ingest(pdf, course_id, opts.batch_size, opts.concurrency, stats)
+        todo = iter(todo)
+        with ProcessPoolExecutor(max_workers=opts.processes) as procs:
+            pending = deque((pdf, procs.submit(extract_chunks, pdf))
+                            for pdf in islice(todo, opts.processes))
+            while pending:
+                pdf, fut = pending.popleft()
+                if (nxt := next(todo, None)) is not None:
+                    pending.append((nxt, procs.submit(extract_chunks, nxt)))
+                ingest(pdf, course_id, opts.batch_size, opts.concurrency, stats,
+                       chunks=fut.result(), force=opts.force)
+    else:
+        for pdf in pdfs:
+            ingest(pdf, course_id, opts.batch_size, opts.concurrency, stats, force=opts.force)
+    print(f"📈 {stats.report()}")
@@ -0,0 +1,202 @@
+"""
+Offline RAG latency benchmark.
+
+Runs the real pipeline code (embed -> vector search -> prompt assembly ->
+Gemini generation -> agent send) on top of the deterministic fakes in
+utils/fakes.py, with injected per-stage latency and a synthetic corpus.
+
+    python scripts/bench_rag_pipeline.py --corpus-sizes 10000,100000 \\
+        --embed-ms 40 --search-ms 30 --ttft-ms 400 --out bench.json
+    python scripts/bench_rag_pipeline.py ... --baseline bench.json   # diff against a previous run
+"""
+import sys
+import os
+# Add project root to sys.path to allow sibling imports
+project_root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.append(project_root)
+
+import argparse
+import asyncio
+import json
+import logging
+import platform
+import resource
+import subprocess
+import time
+import numpy as np
+
+from utils import fakes
+import config
+
+QUESTIONS = [
+    "When is the midterm exam?",
+    "What is the professor's email address?",
+    "Summarize the main points of Lecture 3.",
+    "What topics are covered in week 5?",
+    "How is the final grade calculated?",
+    "What are the office hours?",
+]
+
+def percentiles(samples: list[float]) -> dict:
+    a = np.asarray(samples) * 1000
+    return {"p50": float(np.percentile(a, 50)), "p95": float(np.percentile(a, 95)),
+            "p99": float(np.percentile(a, 99)), "mean": float(a.mean()), "n": len(a)}
+
+def peak_rss_mb() -> float:
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024   # KiB on Linux
+
+class _SendContext:
+    """Stands in for uagents' Context: `send` serializes the message like a real send would."""
+    def __init__(self):
+        self.sent = 0
+
+    async def send(self, destination: str, msg):
+        msg.model_dump_json()
+        self.sent += 1
+
+def course_of(i: int, courses: int) -> str:
+    return f"C{i % courses}"                     # synthetic rows are spread the same way
+
+async def run_stages(n_queries: int, courses: int = 1) -> dict:
+    """Sequential queries, timing each stage of retrieve_context -> generate_response -> send."""
+    from embeddings.embedder import embed
+    from src.rag_handler import search_chunks, build_context
+    from src.gemini_handler import generate_response
+    from src.models import TAResponse
+    from prompts.ta_system_prompts import TA_SYSTEM_PROMPT
+
+    ctx = _SendContext()
+    stages = {k: [] for k in ("embed", "search", "prompt", "generate", "send", "end_to_end")}
+    for i in range(n_queries):
+        query = f"{QUESTIONS[i % len(QUESTIONS)]} ({i})"
+        t0 = time.perf_counter()
+        vec = embed(query)
+        t1 = time.perf_counter()
+        results = search_chunks(vec, course_id=course_of(i, courses))
+        t2 = time.perf_counter()
+        context = build_context(results)
+        t3 = time.perf_counter()
+        answer = generate_response(TA_SYSTEM_PROMPT, query, context)
+        t4 = time.perf_counter()
+        await ctx.send("student", TAResponse(answer=answer))
+        t5 = time.perf_counter()
+        for name, dt in zip(stages, (t1 - t0, t2 - t1, t3 - t2, t4 - t3, t5 - t4, t5 - t0)):
+            stages[name].append(dt)
+    return {name: percentiles(v) for name, v in stages.items()}
+
+async def run_concurrent(n_queries: int, concurrency: int, courses: int = 1) -> dict:
+    """End-to-end through src.pipeline.answer_query with *concurrency* students at once."""
+    from src import pipeline
+
+    pipeline._slots = asyncio.Semaphore(config.TA_MAX_IN_FLIGHT)   # fresh event loop per run
+    ctx  = _SendContext()
+    sem  = asyncio.Semaphore(concurrency)
+    lat  = []
+
+    async def one(i: int):
+        async with sem:
+            t0 = time.perf_counter()
+            response = await pipeline.answer_query(f"{QUESTIONS[i % len(QUESTIONS)]} [{i}]",
+                                                   course_of(i, courses))
+            await ctx.send("student", response)
+            lat.append(time.perf_counter() - t0)
+
+    start = time.perf_counter()
+    await asyncio.gather(*(one(i) for i in range(n_queries)))
+    wall = time.perf_counter() - start
+    return {"latency_ms": percentiles(lat), "throughput_qps": n_queries / wall,
+            "concurrency": concurrency}
+
+def git_revision() -> str:
+    try:
+        return subprocess.check_output(["git", "rev-parse", "--short", "HEAD"], cwd=project_root,
+                                       stderr=subprocess.DEVNULL, text=True).strip()
+    except Exception:
+        return "unknown"
+
+def print_diff(current: dict, baseline_path: str):
+    with open(baseline_path) as f:
+        base = {r["corpus_size"]: r for r in json.load(f)["results"]}
+    print(f"\nChange vs {baseline_path}:")
+    for r in current["results"]:
+        b = base.get(r["corpus_size"])
+        if not b:
+            continue
+        for key in ("p50", "p95", "p99"):
+            old, new = b["stages"]["end_to_end"][key], r["stages"]["end_to_end"][key]
+            print(f"  {r['corpus_size']:>9} chunks e2e {key}: {old:8.1f} -> {new:8.1f} ms "
+                  f"({(new - old) / old * 100:+.1f}%)")
+        old, new = b["concurrent"]["throughput_qps"], r["concurrent"]["throughput_qps"]
+        print(f"  {r['corpus_size']:>9} chunks throughput: {old:.1f} -> {new:.1f} q/s "
+              f"({(new - old) / old * 100:+.1f}%)")
+
+def main():
+    ap = argparse.ArgumentParser(description="Offline RAG pipeline latency benchmark.")
+    ap.add_argument("--corpus-sizes", default="10000,100000",
+                    help="comma separated synthetic corpus sizes (e.g. 10000,100000,1000000)")
+    ap.add_argument("--dim", type=int, default=fakes.DIM, help="embedding dimensions")
+    ap.add_argument("--courses", type=int, default=1,
+                    help="spread the corpus over N courses; queries are course-filtered")
+    ap.add_argument("--queries", type=int, default=200, help="queries per measurement")
+    ap.add_argument("--concurrency", type=int, default=16, help="simultaneous students in the e2e run")
+    ap.add_argument("--embed-ms", type=float, default=0.0, help="injected embed latency")
+    ap.add_argument("--search-ms", type=float, default=0.0, help="injected $vectorSearch latency")
+    ap.add_argument("--ttft-ms", type=float, default=0.0, help="injected time to first generated token")
+    ap.add_argument("--token-ms", type=float, default=0.0, help="injected latency per output token")
+    ap.add_argument("--output-tokens", type=int, default=200)
+    ap.add_argument("--jitter", type=float, default=0.0, help="+/- fraction applied to injected latency")
+    ap.add_argument("--backend", choices=["atlas", "local", "two_stage"], default="atlas",
+                    help="'atlas' = fake $vectorSearch, 'local' = db/local_index.py over the same vectors, "
+                         "'two_stage' = --small-dim candidates re-ranked with full vectors")
+    ap.add_argument("--small-dim", type=int, default=256, help="embedding_small dimensions for two_stage")
+    ap.add_argument("--out", default="bench_results.json", help="machine-readable results file")
+    ap.add_argument("--baseline", help="previous results file to diff against")
+    args = ap.parse_args()
+
+    config.ANSWER_CACHE_ENABLED = False          # measure the pipeline, not the cache
+    logging.getLogger(config.TA_AGENT_NAME).setLevel(logging.WARNING)
+    config.RAG_BACKEND = args.backend
+    config.SMALL_EMBEDDING_DIM = args.small_dim
+
+    report = {"meta": {"timestamp": time.strftime("%Y-%m-%dT%H:%M:%S"),
+                       "git_rev": git_revision(), "python": platform.python_version(),
+                       "args": vars(args)},
+              "results": []}
+
+    for size in [int(s) for s in args.corpus_sizes.split(",")]:
+        print(f"Building synthetic corpus of {size} chunks ({args.dim}-D)...")
+        installed = fakes.install(corpus_size=size, dim=args.dim, courses=args.courses,
+                                  embed_latency=args.embed_ms / 1000,
+                                  search_latency=args.search_ms / 1000,
+                                  gen_ttft=args.ttft_ms / 1000,
+                                  gen_token_latency=args.token_ms / 1000,
+                                  output_tokens=args.output_tokens, jitter=args.jitter)
+        if args.backend == "local":
+            from db.local_index import LocalIndex
+            from src import rag_handler
+            coll = installed.mongo["Classroom-qna"]["syllabus_chunks"]
+            rag_handler._local_index = LocalIndex(coll.vectors, fakes.SyntheticRecords(coll))
+
+        stages = asyncio.run(run_stages(args.queries, args.courses))
+        concurrent = asyncio.run(run_concurrent(args.queries, args.concurrency, args.courses))
+        result = {"corpus_size": size, "stages": stages, "concurrent": concurrent,
+                  "peak_rss_mb": peak_rss_mb(),
+                  "corpus_mb": installed.mongo["Classroom-qna"]["syllabus_chunks"].vectors.nbytes / 2**20}
+        report["results"].append(result)
+
+        print(f"  {'stage':<11}{'p50':>10}{'p95':>10}{'p99':>10}  (ms)")
+        for name, p in stages.items():
+            print(f"  {name:<11}{p['p50']:>10.2f}{p['p95']:>10.2f}{p['p99']:>10.2f}")
+        c = concurrent["latency_ms"]
+        print(f"  concurrent x{args.concurrency}: p50 {c['p50']:.1f} / p95 {c['p95']:.1f} / "
+              f"p99 {c['p99']:.1f} ms, {concurrent['throughput_qps']:.1f} q/s, "
+              f"peak RSS {result['peak_rss_mb']:.0f} MB")
+
+    with open(args.out, "w") as f:
+        json.dump(report, f, indent=2)
+    print(f"\nResults written to {args.out}")
+    if args.baseline:
+        print_diff(report, args.baseline)
+
+if __name__ == "__main__":
+    main()
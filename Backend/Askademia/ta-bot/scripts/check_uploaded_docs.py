@@ -10,34 +10,32 @@ from pymongo.errors import ConnectionFailure
 # Import DB utility and configuration
 try:
     from db.mongo_client import get_db
-    import config
+    from db.catalog import list_documents, course_stats, COLL_NAME
 except ImportError as e:
     print(f"Error importing necessary modules: {e}")
-    print("Please ensure db/mongo_client.py and config.py exist and are correct.")
+    print("Please ensure db/mongo_client.py and db/catalog.py exist and are correct.")
     sys.exit(1)
 
-def check_documents():
+def check_documents(course_id: str | None = None):
     """
-    Connects to MongoDB and lists the distinct filenames found in the collection.
+    Lists the loaded documents per course from the document catalog
+    (kept by the loader; no scan over the chunks).
     """
     try:
         db = get_db() # Get database object
-        # Use collection name from config if available, otherwise default
-        collection_name = getattr(config, 'COLL_NAME', 'syllabus_chunks') 
-        coll = db[collection_name]
+        print(f"Checking catalog '{db.name}.{COLL_NAME}' for loaded documents...")
 
-        print(f"Checking collection '{db.name}.{collection_name}' for distinct document filenames...")
-
-        # Find distinct values in the 'file' field
-        distinct_files = coll.distinct("file")
-
-        if not distinct_files:
-            print("No documents found in the collection (based on the 'file' field).")
+        docs = list_documents(course_id)
+        if not docs:
+            print("No documents found in the catalog.")
+            print("If chunks were loaded before the catalog existed, run `python db/catalog.py reconcile`.")
         else:
-            print("\nFound the following document filenames in the database:")
-            for filename in sorted(distinct_files):
-                print(f"- {filename}")
-            print(f"\nTotal distinct files found: {len(distinct_files)}")
+            for cid, stats in course_stats(course_id).items():
+                print(f"\n{cid}: {stats['files']} files, {stats['chunks']} chunks, {stats['tokens']} tokens")
+                for d in docs:
+                    if d["course_id"] == cid:
+                        print(f"- {d['file']} ({d.get('chunks', 0)} chunks, {d.get('pages', 0)} pages)")
+            print(f"\nTotal files found: {len(docs)}")
 
     except ConnectionFailure:
         print("Error: Could not connect to MongoDB.")
@@ -46,4 +44,5 @@ def check_documents():
         print(f"An unexpected error occurred: {e}")
 
 if __name__ == "__main__":
-    check_documents() 
\ No newline at end of file
+    # Usage: python scripts/check_uploaded_docs.py [COURSE_ID]
+    check_documents(sys.argv[1] if len(sys.argv) > 1 else None) 
\ No newline at end of file
@@ -0,0 +1,267 @@
+"""
+Retrieval recall-vs-cost sweep, and per-course search settings from it.
+
+    python scripts/eval_retrieval.py labels.jsonl --candidates 25,50,100,200,400 --limits 3,5,8
+    python scripts/eval_retrieval.py labels.jsonl --truth exact --out eval.json
+    python scripts/eval_retrieval.py labels.jsonl --docs embeddings/ --course CS101 \\
+        --chunk-sizes 400,800,1200 --overlaps 40,80
+    python scripts/eval_retrieval.py labels.jsonl ... --write     # save the recommended settings
+
+Labelled questions, one JSON object per line:
+
+    {"question": "When is the midterm?", "course_id": "CS101", "expected": ["Syllabus.pdf#3", "Schedule.pdf"]}
+
+"file#chunk_index" names one chunk, a bare file name any chunk of that file.
+Questions without "expected" only count with `--truth exact`. Questions
+without a course (and no DEFAULT_COURSE_ID) search the whole collection;
+they are reported as "(all)" and get no per-course settings.
+
+Every course's questions are searched through `rag_handler.search_chunks`
+(so `RAG_BACKEND` applies) for each numCandidates x limit, reporting
+recall@limit, MRR, search latency and the prompt-context tokens of the
+retrieved chunks. `--truth exact` scores against an exact brute-force search
+over the course's stored vectors, computed locally, which shows what the
+approximate index loses. The recommendation per course is the smallest
+numCandidates, then limit, whose recall is within `--tolerance` of the best
+setting; `--write` merges it into `COURSE_SEARCH_SETTINGS_PATH`, which the
+running TA re-reads. Exact truth scores every limit against its own exact
+top-k, so it says nothing about the limit: only numCandidates is
+recommended, for the course's current limit (or the largest swept one).
+
+`--docs` re-chunks the course's PDFs with each chunk size / overlap, embeds
+them and evaluates exact search over the result (file-level labels). Chunk
+settings apply at ingest time (embeddings/loader.py), so they are reported,
+not written.
+"""
+import sys
+import os
+# Add project root to sys.path to allow sibling imports
+project_root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.append(project_root)
+
+import argparse
+import collections
+import json
+import pathlib
+import time
+
+from src import rag_handler
+from src.context_builder import assemble_context
+from embeddings.embedder import embed_batch
+from db.local_index import LocalIndex
+from scripts.bench_rag_pipeline import percentiles, git_revision
+from utils import fakes
+import config
+
+DEFAULT_CANDIDATES = "25,50,100,200,400"
+DEFAULT_LIMITS     = "3,5,8"
+
+def load_labels(path: str) -> list[dict]:
+    with open(path, encoding="utf-8") as f:
+        rows = [json.loads(line) for line in f if line.strip()]
+    for r in rows:
+        r["course_id"] = r.get("course_id") or config.DEFAULT_COURSE_ID
+        r["expected"]  = set(r.get("expected") or [])
+    return rows
+
+def chunk_key(result: dict) -> str:
+    return f"{result.get('file')}#{result.get('chunk_index')}"
+
+def score(results: list[dict], expected: set[str]) -> tuple[float, float]:
+    """`(recall, reciprocal rank)` of *results* against chunk / file labels."""
+    found, rr = set(), 0.0
+    for rank, r in enumerate(results, 1):
+        hit = {e for e in expected if e == chunk_key(r) or e == r.get("file")}
+        if hit and not rr:
+            rr = 1.0 / rank
+        found |= hit
+    return len(found) / len(expected), rr
+
+def context_tokens(results: list[dict]) -> int:
+    _, report = assemble_context(results, budget=config.CONTEXT_TOKEN_BUDGET,
+                                 mmr_lambda=config.CONTEXT_MMR_LAMBDA,
+                                 dedup_threshold=config.CONTEXT_DEDUP_THRESHOLD)
+    return report["tokens"]
+
+def evaluate(search, questions: list[tuple[list[float], set[str]]]) -> dict:
+    """Run *search(vector)* for each `(vector, expected)` question and aggregate."""
+    recall, rr, latency, tokens = [], [], [], []
+    for vector, expected in questions:
+        start   = time.perf_counter()
+        results = search(vector)
+        latency.append(time.perf_counter() - start)
+        r, m = score(results, expected)
+        recall.append(r)
+        rr.append(m)
+        tokens.append(context_tokens(results) if results else 0)
+    n = len(questions)
+    return {"questions": n, "recall": sum(recall) / n, "mrr": sum(rr) / n,
+            "latency_ms": percentiles(latency), "context_tokens": sum(tokens) / n}
+
+# --- Exact baseline ---
+def exact_index(course_id: str | None) -> LocalIndex:
+    """Brute-force index over the course's stored vectors (all of them for None)."""
+    from db.mongo_client import get_db
+    from db.vector_codec import decode_vector
+    coll = get_db()[rag_handler.COLL_NAME]
+    vectors, records = [], []
+    for doc in coll.find({"course_id": course_id} if course_id else {},
+                         {"_id": 0, "embedding": 1, "chunk": 1, "course_id": 1, "file": 1,
+                          "chunk_index": 1, "page_start": 1, "page_end": 1}):
+        vectors.append(decode_vector(doc.pop("embedding")))
+        records.append(doc)
+    if not records:
+        raise ValueError(f"No chunks stored for course '{course_id}'")
+    return LocalIndex.build(vectors, records)
+
+# --- Sweeps ---
+def search_sweep(labels: list[dict], vectors: list[list[float]], candidates: list[int],
+                 limits: list[int], truth: str) -> list[dict]:
+    by_course = collections.defaultdict(list)
+    for label, vector in zip(labels, vectors):
+        if truth == "exact" or label["expected"]:
+            by_course[label["course_id"]].append((vector, label["expected"]))
+
+    rows = []
+    for course_id, questions in sorted(by_course.items(), key=lambda kv: kv[0] or ""):
+        exact = exact_index(course_id) if truth == "exact" else None
+        rag_handler.search_chunks(questions[0][0], course_id=course_id)     # warm the connection
+        for limit in limits:
+            scored = questions if exact is None else \
+                     [(v, {chunk_key(r) for r in exact.search(v, limit=limit)}) for v, _ in questions]
+            for n in candidates:
+                if n < limit:                   # Atlas requires numCandidates >= limit
+                    continue
+                search = lambda v: rag_handler.search_chunks(v, limit=limit, num_candidates=n,
+                                                             course_id=course_id)
+                rows.append({"course_id": course_id, "num_candidates": n, "limit": limit,
+                             **evaluate(search, scored)})
+                print_row(rows[-1])
+    return rows
+
+def chunker_sweep(labels: list[dict], vectors: list[list[float]], docs: str, course_id: str,
+                  sizes: list[int], overlaps: list[int], limits: list[int]) -> list[dict]:
+    from embeddings.loader import pdf_chunks
+    pdfs = sorted(pathlib.Path(docs).glob("*.pdf"))
+    # re-chunking renumbers chunks, so only the file part of a label still applies
+    questions = [(v, {e.split("#")[0] for e in l["expected"]}) for l, v in zip(labels, vectors)
+                 if l["course_id"] == course_id and l["expected"]]
+    if not pdfs or not questions:
+        raise ValueError(f"Need PDFs in {docs} and labelled questions for course '{course_id}'")
+
+    rows = []
+    for size in sizes:
+        for overlap in overlaps:
+            if overlap >= size:
+                continue
+            records = [{"chunk": c["text"], "course_id": course_id, "file": pdf.name,
+                        "chunk_index": c["chunk_index"], "page_start": c["page_start"],
+                        "page_end": c["page_end"]}
+                       for pdf in pdfs for c in pdf_chunks(pdf, size, overlap)]
+            index = LocalIndex.build(embed_batch([r["chunk"] for r in records]), records)
+            for limit in limits:
+                rows.append({"chunk_tokens": size, "overlap": overlap, "chunks": len(records),
+                             "limit": limit,
+                             **evaluate(lambda v: index.search(v, limit=limit), questions)})
+                print_row(rows[-1])
+    return rows
+
+# --- Recommendation ---
+def recommend(rows: list[dict], tolerance: float, truth: str = "labels") -> dict:
+    """
+    Per course: smallest numCandidates, then limit, within *tolerance* of the
+    best recall. With exact truth, numCandidates only, at the current limit.
+    """
+    settings = {}
+    for course_id in sorted({r["course_id"] for r in rows if r["course_id"]}):
+        mine = [r for r in rows if r["course_id"] == course_id]
+        if truth == "exact":
+            limits  = {r["limit"] for r in mine}
+            current = rag_handler.search_params(course_id)[0]
+            mine    = [r for r in mine if r["limit"] == (current if current in limits else max(limits))]
+        best = max(r["recall"] for r in mine)
+        pick = min((r for r in mine if r["recall"] >= best - tolerance),
+                   key=lambda r: (r["num_candidates"], r["limit"]))
+        settings[course_id] = {"num_candidates": pick["num_candidates"]}
+        if truth != "exact":
+            settings[course_id]["limit"] = pick["limit"]
+    return settings
+
+def write_settings(settings: dict, path: str = config.COURSE_SEARCH_SETTINGS_PATH):
+    """Merge into the settings file (written whole, then renamed, so readers never see half of it)."""
+    try:
+        with open(path, encoding="utf-8") as f:
+            current = json.load(f)
+    except FileNotFoundError:
+        current = {}
+    for course_id, s in settings.items():
+        current[course_id] = {**current.get(course_id, {}), **s}
+    os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+    tmp = f"{path}.tmp"
+    with open(tmp, "w", encoding="utf-8") as f:
+        json.dump(current, f, indent=2, sort_keys=True)
+    os.replace(tmp, path)
+
+def print_row(r: dict):
+    where = (f"{r['course_id'] or '(all)':<10} cand {r['num_candidates']:>5}" if "course_id" in r
+             else f"chunk {r['chunk_tokens']:>5}/{r['overlap']:<4} ({r['chunks']} chunks)")
+    p = r["latency_ms"]
+    print(f"  {where}  k {r['limit']:>2}  recall {r['recall']:.3f}  MRR {r['mrr']:.3f}  "
+          f"p50 {p['p50']:7.2f} / p95 {p['p95']:7.2f} ms  context {r['context_tokens']:7.0f} tok")
+
+def _ints(s: str) -> list[int]:
+    return [int(x) for x in s.split(",") if x]
+
+def main():
+    ap = argparse.ArgumentParser(description="Evaluate retrieval settings and recommend per-course values.")
+    ap.add_argument("labels", help="labelled questions (JSON lines)")
+    ap.add_argument("--candidates", default=DEFAULT_CANDIDATES, help="numCandidates values to sweep")
+    ap.add_argument("--limits", default=DEFAULT_LIMITS, help="limit (k) values to sweep")
+    ap.add_argument("--truth", choices=["labels", "exact"], default="labels",
+                    help="score against the labels or against exact local brute-force search")
+    ap.add_argument("--tolerance", type=float, default=0.01,
+                    help="recall a recommended setting may give up against the best one")
+    ap.add_argument("--docs", help="directory of PDFs to re-chunk for the chunker sweep")
+    ap.add_argument("--course", help="course of the --docs PDFs (default: DEFAULT_COURSE_ID)")
+    ap.add_argument("--chunk-sizes", default="", help="chunk token windows to sweep with --docs")
+    ap.add_argument("--overlaps", default="", help="chunk overlaps to sweep with --docs")
+    ap.add_argument("--write", action="store_true", help="merge the recommendations into "
+                    f"COURSE_SEARCH_SETTINGS_PATH ({config.COURSE_SEARCH_SETTINGS_PATH})")
+    ap.add_argument("--out", help="write all results as JSON")
+    fakes.add_arguments(ap)
+    args = ap.parse_args()
+
+    if config.RAG_BACKEND == "local":
+        print("Note: RAG_BACKEND=local ignores numCandidates")
+    if fakes.install_from_args(args):
+        print(f"Evaluating on local fakes ({args.corpus_size} chunks)")
+    labels  = load_labels(args.labels)
+    vectors = embed_batch([l["question"] for l in labels], kind="query_embed")
+    print(f"{len(labels)} questions, {len({l['course_id'] for l in labels})} courses, truth: {args.truth}")
+
+    report = {"meta": {"timestamp": time.strftime("%Y-%m-%dT%H:%M:%S"), "git_rev": git_revision(),
+                       "backend": config.RAG_BACKEND, "args": vars(args)}}
+    report["search"] = search_sweep(labels, vectors, _ints(args.candidates), _ints(args.limits), args.truth)
+    report["recommended"] = recommend(report["search"], args.tolerance, args.truth) if report["search"] else {}
+    print("\nRecommended settings:")
+    for course_id, s in report["recommended"].items():
+        limit = f"limit {s['limit']:>2}" if "limit" in s else \
+                f"limit {rag_handler.search_params(course_id)[0]:>2} (kept; exact truth cannot rank limits)"
+        print(f"  {course_id:<10} num_candidates {s['num_candidates']:>5}  {limit}")
+
+    if args.docs:
+        print("\nChunker sweep (exact search over re-chunked documents):")
+        report["chunking"] = chunker_sweep(labels, vectors, args.docs, args.course or config.DEFAULT_COURSE_ID,
+                                           _ints(args.chunk_sizes) or [800], _ints(args.overlaps) or [80],
+                                           _ints(args.limits))
+
+    if args.write and report["recommended"]:
+        write_settings(report["recommended"])
+        print(f"\nSettings written to {config.COURSE_SEARCH_SETTINGS_PATH}")
+    if args.out:
+        with open(args.out, "w") as f:
+            json.dump(report, f, indent=2)
+        print(f"Results written to {args.out}")
+
+if __name__ == "__main__":
+    main()
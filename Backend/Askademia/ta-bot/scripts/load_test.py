@@ -0,0 +1,328 @@
+"""
+Concurrent load generator for the TA agent.
+
+Many logical students are multiplexed over a few local student agents
+(`--agents`, ports `--base-port` + i). Each question is a `StudentQuery`
+with a fresh `request_id`, which the TA echoes on its `TAResponse` /
+`TAResponseChunk` / `ErrorResponse`, so every reply is matched to the
+question it answers.
+
+    # TA agent (or supervisor) on local fakes, started by the load test:
+    python scripts/load_test.py --spawn agent --rate 20 --duration 60 -- --fake --ttft-ms 400
+    python scripts/load_test.py --spawn supervisor --mode closed --students 64 -- --workers 2 -- --fake
+
+    # against a TA started separately (prints the LOCAL_AGENT_ENDPOINTS it needs):
+    python scripts/load_test.py --print-env
+    python scripts/load_test.py --mode closed --students 50 --think 2 --requests 1000 --out load.json
+
+Open loop (`--mode open`) sends at `--rate` questions per second (Poisson
+arrivals) whether or not earlier ones were answered; closed loop
+(`--mode closed`) keeps every student waiting for its answer, then
+thinking for `--think` seconds (exponential), before asking again. The
+report has throughput, latency percentiles (and time to first chunk with
+`--stream`), timeout and error rates.
+"""
+import sys
+import os
+# Add project root to sys.path to allow sibling imports
+project_root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.append(project_root)
+
+import argparse
+import asyncio
+import collections
+import itertools
+import json
+import logging
+import random
+import subprocess
+import threading
+import time
+import uuid
+import aiohttp
+from uagents import Agent, Context
+from uagents.communication import send_message
+from uagents.crypto import Identity
+from uagents.resolver import RulesBasedResolver
+from uagents_core.types import DeliveryStatus
+
+from src.models import StudentQuery, TAResponse, TAResponseChunk, ErrorResponse
+from src.routing import LocalFirstResolver, NoRegistration
+from scripts.bench_rag_pipeline import QUESTIONS, percentiles, git_revision
+import config
+
+BASE_PORT = 8200                    # load-test student agents listen on BASE_PORT + i
+READY_TIMEOUT = 120.0               # seconds a spawned TA has to answer its first question
+
+SPAWN_SCRIPTS = {"agent": "src/ta_agent.py", "supervisor": "src/supervisor.py"}
+
+class Request:
+    """One question in flight."""
+
+    def __init__(self, student: int, query: str, course_id: str):
+        self.id      = uuid.uuid4().hex
+        self.student = student
+        self.query   = query
+        self.course  = course_id
+        self.sent    = time.perf_counter()
+        self.first   = None             # first reply (first chunk when streaming)
+        self.done    = asyncio.get_running_loop().create_future()
+
+class LoadStudents:
+    """
+    *n* local student agents; `ask()` sends a question as student *s* and
+    awaits its answer. The agents run on their own event loop in a daemon
+    thread (uagents agents sharing a loop cancel each other's tasks when
+    they stop); replies are handed to the caller's loop.
+    """
+
+    def __init__(self, n: int, base_port: int, ta_address: str, ta_endpoint: str):
+        self.ta       = ta_address
+        self.endpoint = ta_endpoint
+        self.resolver = RulesBasedResolver({ta_address: ta_endpoint})
+        self.pending  = {}              # request_id -> Request
+        self.late     = 0               # replies that arrived after their timeout
+        self.loop     = asyncio.new_event_loop()
+        self.agents   = []
+        self.ports    = [base_port + i for i in range(n)]
+        for i, port in enumerate(self.ports):
+            agent = Agent(name=f"load_student_{i}", seed=f"{config.STUDENT_AGENT_SEED}/load-{i}",
+                          port=port, endpoint=f"http://127.0.0.1:{port}/submit", loop=self.loop,
+                          resolve=LocalFirstResolver({ta_address: ta_endpoint}),
+                          registration_policy=NoRegistration(), handle_messages_concurrently=True,
+                          publish_agent_details=False, report_events=False,
+                          enable_agent_inspector=False, mark_inactive_on_shutdown=False,
+                          log_level=logging.WARNING)
+            for model in (TAResponse, TAResponseChunk, ErrorResponse):
+                agent.on_message(model=model)(self._on_reply)
+            self.agents.append(agent)
+        self.identities = [Identity.from_seed(f"{config.STUDENT_AGENT_SEED}/load-{i}", 0) for i in range(n)]
+
+    def endpoints(self) -> str:
+        """LOCAL_AGENT_ENDPOINTS value the TA needs to reach these agents."""
+        return ",".join(f"{a.address}=http://127.0.0.1:{port}/submit" for a, port in zip(self.agents, self.ports))
+
+    async def _on_reply(self, ctx: Context, sender: str, msg):
+        self.caller.call_soon_threadsafe(self._settle, msg, time.perf_counter())
+
+    def _settle(self, msg, received: float):
+        req = self.pending.get(msg.request_id)
+        if req is None:
+            self.late += 1
+            return
+        if req.first is None:
+            req.first = received
+        if isinstance(msg, TAResponseChunk) and not msg.final:
+            return
+        del self.pending[msg.request_id]
+        req.done.set_result((msg, received))
+
+    async def ask(self, student: int, query: str, course_id: str, stream: bool, timeout: float) -> dict:
+        req = Request(student, query, course_id)
+        self.pending[req.id] = req
+        status = await send_message(self.ta, StudentQuery(query=query, course_id=course_id, stream=stream,
+                                                          request_id=req.id),
+                                    sender=self.identities[student % len(self.identities)],
+                                    resolver=self.resolver)
+        result = {"student": student, "course_id": course_id, "sent": req.sent}
+        if status.status == DeliveryStatus.FAILED:
+            self.pending.pop(req.id, None)
+            return {**result, "outcome": "send_failed", "error": status.detail}
+        try:
+            reply, received = await asyncio.wait_for(req.done, timeout)
+        except asyncio.TimeoutError:
+            self.pending.pop(req.id, None)
+            return {**result, "outcome": "timeout"}
+        result.update(latency=received - req.sent, ttfb=req.first - req.sent)
+        if isinstance(reply, ErrorResponse):
+            return {**result, "outcome": "error", "error": reply.error}
+        return {**result, "outcome": "ok"}
+
+    async def _serve(self):
+        await asyncio.gather(*(a.run_async() for a in self.agents))
+
+    async def start(self):
+        """Start the agents and wait until each answers the readiness probe."""
+        self.caller = asyncio.get_running_loop()
+        threading.Thread(target=self.loop.run_until_complete, args=(self._serve(),), daemon=True).start()
+        async with aiohttp.ClientSession() as session:
+            for a, port in zip(self.agents, self.ports):
+                while not await _ready(session, f"http://127.0.0.1:{port}/submit", a.address):
+                    await asyncio.sleep(0.1)
+
+async def _ready(session: aiohttp.ClientSession, endpoint: str, address: str) -> bool:
+    """uagents readiness probe (same as src/supervisor.py)."""
+    try:
+        async with session.head(endpoint, headers={"x-uagents-address": address},
+                                timeout=aiohttp.ClientTimeout(total=2)) as resp:
+            return resp.headers.get("x-uagents-status") == "ready"
+    except (aiohttp.ClientError, TimeoutError):
+        return False
+
+def load_corpus(path: str | None) -> list[str]:
+    if not path:
+        return QUESTIONS
+    with open(path, encoding="utf-8") as f:
+        return [line.strip() for line in f if line.strip()]
+
+# --- Arrival processes ---
+async def run_open(students: LoadStudents, questions, args) -> list[dict]:
+    """Poisson arrivals at args.rate/s from random students, not waiting for answers."""
+    tasks, deadline = [], time.perf_counter() + args.duration
+    for i in itertools.count():
+        if (args.requests and i >= args.requests) or time.perf_counter() >= deadline:
+            break
+        student = random.randrange(args.students)
+        query, course_id = next(questions)
+        tasks.append(asyncio.create_task(students.ask(student, query, course_id, args.stream, args.timeout)))
+        await asyncio.sleep(random.expovariate(args.rate))
+    return await asyncio.gather(*tasks)
+
+async def run_closed(students: LoadStudents, questions, args) -> list[dict]:
+    """Every student asks, waits for the answer, thinks, asks again."""
+    results, deadline = [], time.perf_counter() + args.duration
+    budget = itertools.count()
+
+    async def student(s: int):
+        while time.perf_counter() < deadline and (not args.requests or next(budget) < args.requests):
+            query, course_id = next(questions)
+            results.append(await students.ask(s, query, course_id, args.stream, args.timeout))
+            if args.think:
+                await asyncio.sleep(random.expovariate(1 / args.think))
+
+    await asyncio.gather(*(student(s) for s in range(args.students)))
+    return results
+
+def question_stream(corpus: list[str], courses: list[str], unique: bool):
+    for i in itertools.count():
+        query = corpus[i % len(corpus)]
+        yield (f"{query} [{i}]" if unique else query), courses[i % len(courses)]
+
+# --- Report ---
+def summarize(results: list[dict], wall: float, args) -> dict:
+    outcomes = collections.Counter(r["outcome"] for r in results)
+    ok = [r for r in results if r["outcome"] == "ok"]
+    n = len(results) or 1
+    report = {"requests": len(results), "outcomes": dict(outcomes), "wall_s": wall,
+              "offered_qps": len(results) / wall, "throughput_qps": len(ok) / wall,
+              "timeout_rate": outcomes["timeout"] / n,
+              "error_rate": (outcomes["error"] + outcomes["send_failed"]) / n,
+              "errors": dict(collections.Counter(r["error"] for r in results if "error" in r).most_common(5))}
+    if ok:
+        report["latency_ms"] = percentiles([r["latency"] for r in ok])
+        if args.stream:
+            report["ttfc_ms"] = percentiles([r["ttfb"] for r in ok])
+    return report
+
+def print_report(report: dict, args):
+    print(f"\n{args.mode}-loop, {args.students} students over {args.agents} agents"
+          + (f", {args.rate}/s offered" if args.mode == "open" else f", think {args.think}s"))
+    print(f"  requests    {report['requests']} in {report['wall_s']:.1f}s "
+          f"({report['offered_qps']:.1f} sent/s, {report['throughput_qps']:.1f} answered/s)")
+    print("  outcomes    " + ", ".join(f"{k} {v}" for k, v in sorted(report["outcomes"].items())))
+    print(f"  timeouts    {report['timeout_rate']:.1%}   errors {report['error_rate']:.1%}")
+    for key, label in (("latency_ms", "latency"), ("ttfc_ms", "1st chunk")):
+        if key in report:
+            p = report[key]
+            print(f"  {label:<11} p50 {p['p50']:.0f} / p95 {p['p95']:.0f} / p99 {p['p99']:.0f} / "
+                  f"mean {p['mean']:.0f} ms")
+    for error, n in report["errors"].items():
+        print(f"  {n:>6} x {error}")
+
+# --- Main ---
+def spawn_ta(kind: str, env: dict, extra: list[str], log_path: str | None) -> subprocess.Popen:
+    out = open(log_path, "w") if log_path else subprocess.DEVNULL
+    return subprocess.Popen([sys.executable, os.path.join(project_root, SPAWN_SCRIPTS[kind]), *extra],
+                            env={**os.environ, **env}, stdout=out, stderr=subprocess.STDOUT)
+
+async def wait_until_answering(students: LoadStudents, course_id: str, proc: subprocess.Popen) -> bool:
+    """A spawned TA (and a supervisor's workers) must answer one question before the clock starts."""
+    deadline = time.perf_counter() + READY_TIMEOUT
+    async with aiohttp.ClientSession() as session:
+        while not await _ready(session, students.endpoint, students.ta):
+            if time.perf_counter() > deadline or proc.poll() is not None:
+                return False
+            await asyncio.sleep(0.5)
+    while time.perf_counter() < deadline and proc.poll() is None:
+        r = await students.ask(0, "warm-up question", course_id, False, 5.0)
+        if r["outcome"] == "ok":
+            return True
+        await asyncio.sleep(1.0)
+    return False
+
+async def main(args, spawn_args: list[str]) -> dict:
+    students = LoadStudents(args.agents, args.base_port, args.ta_address, args.ta_endpoint)
+    if args.print_env:
+        print(f"LOCAL_AGENT_ENDPOINTS={students.endpoints()}")
+        return {}
+
+    courses   = args.courses.split(",")
+    questions = question_stream(load_corpus(args.questions), courses, args.unique)
+    proc      = None
+    await students.start()
+    try:
+        if args.spawn:
+            proc = spawn_ta(args.spawn, {"LOCAL_AGENT_ENDPOINTS": students.endpoints()},
+                            spawn_args, args.ta_log)
+            print(f"Started {SPAWN_SCRIPTS[args.spawn]} (pid {proc.pid}), waiting for it to answer...")
+            if not await wait_until_answering(students, courses[0], proc):
+                state = f"exited with code {proc.returncode}" if proc.poll() is not None else "is not answering"
+                print(f"The spawned TA {state}" + (f", see {args.ta_log}" if args.ta_log else ""))
+                return {}
+
+        print(f"Sending to {args.ta_address} @ {args.ta_endpoint}")
+        start   = time.perf_counter()
+        run     = run_open if args.mode == "open" else run_closed
+        results = await run(students, questions, args)
+        report  = summarize(results, time.perf_counter() - start, args)
+        report["late_replies"] = students.late
+        return report
+    finally:
+        if proc is not None:
+            proc.terminate()
+            try:
+                proc.wait(10)
+            except subprocess.TimeoutExpired:
+                proc.kill()
+
+if __name__ == "__main__":
+    ap = argparse.ArgumentParser(description="Concurrent load generator for the TA agent.",
+                                 usage="%(prog)s [options] [-- options for the spawned TA]")
+    ap.add_argument("--mode", choices=["open", "closed"], default="open")
+    ap.add_argument("--rate", type=float, default=10.0, help="open loop: questions per second")
+    ap.add_argument("--students", type=int, default=100, help="logical students")
+    ap.add_argument("--think", type=float, default=1.0, help="closed loop: mean think time (s)")
+    ap.add_argument("--agents", type=int, default=4, help="student agents the students share")
+    ap.add_argument("--base-port", type=int, default=BASE_PORT)
+    ap.add_argument("--duration", type=float, default=30.0, help="seconds to send for")
+    ap.add_argument("--requests", type=int, default=0, help="stop after this many questions (0 = no limit)")
+    ap.add_argument("--timeout", type=float, default=60.0, help="seconds before a question counts as timed out")
+    ap.add_argument("--questions", help="question corpus, one per line (default: built-in questions)")
+    ap.add_argument("--courses", default="C0", help="comma separated course ids, assigned round robin")
+    ap.add_argument("--unique", action="store_true",
+                    help="make every question distinct (no answer cache hits / coalescing)")
+    ap.add_argument("--stream", action="store_true", help="ask for streamed answers")
+    ap.add_argument("--ta-address", default=Identity.from_seed(config.TA_AGENT_SEED, 0).address)
+    ap.add_argument("--ta-endpoint", default=config.TA_AGENT_ENDPOINT)
+    ap.add_argument("--spawn", choices=sorted(SPAWN_SCRIPTS),
+                    help="start src/ta_agent.py or src/supervisor.py, reachable from the students")
+    ap.add_argument("--ta-log", help="write the spawned TA's output to this file")
+    ap.add_argument("--print-env", action="store_true",
+                    help="print the LOCAL_AGENT_ENDPOINTS a separately started TA needs, then exit")
+    ap.add_argument("--seed", type=int, default=0, help="random seed for arrivals / think times")
+    ap.add_argument("--out", help="write the report as JSON")
+    argv = sys.argv[1:]
+    spawn_args = argv[argv.index("--") + 1:] if "--" in argv else []
+    args = ap.parse_args(argv[:argv.index("--")] if "--" in argv else argv)
+
+    logging.basicConfig(level=logging.WARNING)
+    random.seed(args.seed)
+    report = asyncio.run(main(args, spawn_args))
+    if report:
+        print_report(report, args)
+    if args.out and report:
+        report["meta"] = {"timestamp": time.strftime("%Y-%m-%dT%H:%M:%S"), "git_rev": git_revision(),
+                          "args": vars(args), "spawn_args": spawn_args}
+        with open(args.out, "w") as f:
+            json.dump(report, f, indent=2)
+        print(f"\nReport written to {args.out}")
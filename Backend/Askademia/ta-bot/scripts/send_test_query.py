@@ -10,7 +10,7 @@ from uagents import Agent, Context, Model
 from uagents.setup import fund_agent_if_low
 
 # Import the message models and config
-from src.models import StudentQuery, TAResponse, ErrorResponse
+from src.models import StudentQuery, TAResponse, ErrorResponse, BatchStudentQuery, BatchTAResponse
 import config
 
 # --- Configuration (from config.py) ---
@@ -41,6 +41,15 @@ async def handle_ta_response(ctx: Context, sender: str, msg: TAResponse):
     # await asyncio.sleep(1.0) # Give time for logs to flush
     # ctx.stop()
 
+@sender_agent.on_message(model=BatchTAResponse)
+async def handle_batch_response(ctx: Context, sender: str, msg: BatchTAResponse):
+    ctx.logger.info(f"Received {len(msg.results)} batch results from {sender}")
+    for i, r in enumerate(msg.results):
+        if r.error is not None:
+            ctx.logger.error(f"  [{i}] error: {r.error}")
+        else:
+            ctx.logger.info(f"  [{i}] {r.answer}")
+
 @sender_agent.on_message(model=ErrorResponse)
 async def handle_error_response(ctx: Context, sender: str, msg: ErrorResponse):
     ctx.logger.error(f"Received error from {sender}: {msg.error}")
@@ -62,6 +71,8 @@ if __name__ == "__main__":
     parser.add_argument("ta_address", type=str, help="The address of the running TA agent.")
     parser.add_argument("--query", type=str, default=DEFAULT_QUERY_TEXT, 
                         help=f"The query text to send (default: '{DEFAULT_QUERY_TEXT}')")
+    parser.add_argument("--batch-file", type=str, default=None,
+                        help="Send every non-empty line of this file as one BatchStudentQuery")
     args = parser.parse_args()
 
     TA_AGENT_ADDRESS = args.ta_address
@@ -70,6 +81,12 @@ if __name__ == "__main__":
     # Define the startup behavior *after* getting the address and query
     @sender_agent.on_event("startup")
     async def startup_event(ctx: Context):
+        if args.batch_file:
+            with open(args.batch_file, encoding="utf-8") as f:
+                queries = [line.strip() for line in f if line.strip()]
+            ctx.logger.info(f"Sending batch of {len(queries)} queries to TA Agent {TA_AGENT_ADDRESS}")
+            await ctx.send(TA_AGENT_ADDRESS, BatchStudentQuery(queries=queries))
+            return
         ctx.logger.info(f"Sending query to TA Agent {TA_AGENT_ADDRESS}: '{query_to_send}'")
         # Send the query from the arguments
         await ctx.send(TA_AGENT_ADDRESS, StudentQuery(query=query_to_send))
@@ -0,0 +1,122 @@
+"""
+Semantic answer cache for the TA agent.
+
+Answers are keyed by the query embedding: a new query whose cosine similarity
+to a cached query is at least `threshold`, for the same course and corpus
+version, gets the stored response back without retrieval or generation.
+"""
+import threading
+import time
+from collections import OrderedDict
+import numpy as np
+
+class _Entry:
+    __slots__ = ("course_id", "version", "vector", "response", "created")
+
+    def __init__(self, course_id, version, vector, response):
+        self.course_id = course_id
+        self.version   = version
+        self.vector    = vector
+        self.response  = response
+        self.created   = time.monotonic()
+
+class SemanticAnswerCache:
+    """
+    Thread-safe, size-bounded (LRU) cache with a per-entry TTL.
+    Entries from an older corpus version of a course are dropped as soon as
+    a lookup for that course sees a newer version.
+    """
+
+    def __init__(self, threshold: float = 0.95, ttl: float = 3600, max_entries: int = 1000):
+        self.threshold   = threshold
+        self.ttl         = ttl
+        self.max_entries = max_entries
+        self._entries    = OrderedDict()     # id -> _Entry, least recently used first
+        self._by_course  = {}                # course_id -> {"ids": [...], "matrix": ndarray | None}
+        self._next_id    = 0
+        self._lock       = threading.Lock()
+        self.hits = self.misses = self.evictions = self.invalidations = 0
+
+    # --- Internal helpers (lock held) ---
+    def _drop(self, entry_id):
+        entry  = self._entries.pop(entry_id)
+        bucket = self._by_course[entry.course_id]
+        bucket["ids"].remove(entry_id)
+        bucket["matrix"] = None
+        if not bucket["ids"]:
+            del self._by_course[entry.course_id]
+
+    def _drop_course(self, course_id):
+        for entry_id in list(self._by_course.get(course_id, {"ids": []})["ids"]):
+            self._drop(entry_id)
+
+    # --- Public API ---
+    def lookup(self, course_id: str, version: int, query_vector):
+        """Return the cached response for a similar query, or None."""
+        q = np.asarray(query_vector, dtype=np.float32)
+        q = q / (np.linalg.norm(q) or 1.0)
+        with self._lock:
+            bucket = self._by_course.get(course_id)
+            if bucket and self._entries[bucket["ids"][0]].version != version:
+                self._drop_course(course_id)  # corpus changed since these were cached
+                self.invalidations += 1
+                bucket = None
+            if not bucket:
+                self.misses += 1
+                return None
+
+            if bucket["matrix"] is None:
+                bucket["matrix"] = np.stack([self._entries[i].vector for i in bucket["ids"]])
+            sims = bucket["matrix"] @ q
+            best = int(np.argmax(sims))
+            entry_id = bucket["ids"][best]
+            entry = self._entries[entry_id]
+
+            if time.monotonic() - entry.created > self.ttl:
+                self._drop(entry_id)
+                self.evictions += 1
+                self.misses += 1
+                return None
+            if sims[best] < self.threshold:
+                self.misses += 1
+                return None
+
+            self._entries.move_to_end(entry_id)
+            self.hits += 1
+            return entry.response
+
+    def store(self, course_id: str, version: int, query_vector, response):
+        v = np.asarray(query_vector, dtype=np.float32)
+        v = v / (np.linalg.norm(v) or 1.0)
+        with self._lock:
+            bucket = self._by_course.get(course_id)
+            if bucket and self._entries[bucket["ids"][0]].version != version:
+                self._drop_course(course_id)
+            entry_id = self._next_id
+            self._next_id += 1
+            self._entries[entry_id] = _Entry(course_id, version, v, response)
+            bucket = self._by_course.setdefault(course_id, {"ids": [], "matrix": None})
+            bucket["ids"].append(entry_id)
+            bucket["matrix"] = None
+            while len(self._entries) > self.max_entries:
+                self._drop(next(iter(self._entries)))
+                self.evictions += 1
+
+    def invalidate(self, course_id: str | None = None):
+        """Forget one course's answers, or everything when *course_id* is None."""
+        with self._lock:
+            courses = [course_id] if course_id else list(self._by_course)
+            for c in courses:
+                self._drop_course(c)
+            self.invalidations += 1
+
+    def stats(self) -> dict:
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {"hits":          self.hits,
+                    "misses":        self.misses,
+                    "hit_ratio":     self.hits / lookups if lookups else 0.0,
+                    "evictions":     self.evictions,
+                    "invalidations": self.invalidations,
+                    "size":          len(self._entries),
+                    "threshold":     self.threshold}
@@ -0,0 +1,172 @@
+"""
+Token-budgeted context assembly for the Gemini prompt.
+
+Retrieved chunks overlap (the chunker shares `overlap` tokens between
+neighbouring windows) and often come from the same few pages, so plainly
+concatenating them repeats text. `assemble_context` instead:
+
+1. merges adjacent / overlapping chunks of the same file into one block,
+2. drops near-duplicate blocks (word-shingle containment),
+3. orders the rest by maximal marginal relevance (score vs. redundancy),
+4. fills a token budget, truncating the last block if needed,
+
+and reports how many prompt tokens that saved compared to the plain join.
+"""
+import sys
+import os
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import logging
+from embeddings.chunk_utils import get_encoder
+
+logger = logging.getLogger(__name__)
+
+SHINGLE       = 5           # words per shingle for similarity
+MIN_OVERLAP   = 40          # chars a chunk must share with its neighbour's tail to be merged
+MIN_TRUNCATED = 50          # don't add a truncated block shorter than this (tokens)
+
+class _Tokens:
+    """tiktoken when available, otherwise a ~4 chars/token estimate."""
+
+    def __init__(self):
+        try:
+            self.enc = get_encoder()
+        except Exception as e:                      # BPE file unavailable (offline)
+            logger.warning(f"Tokenizer unavailable, estimating context tokens: {e}")
+            self.enc = None
+
+    def count(self, text: str) -> int:
+        if self.enc is None:
+            return (len(text) + 3) // 4
+        return len(self.enc.encode(text, disallowed_special=()))
+
+    def truncate(self, text: str, n: int) -> str:
+        if self.enc is None:
+            return text[:n * 4]
+        return self.enc.decode(self.enc.encode(text, disallowed_special=())[:n])
+
+_tokens = None
+
+def _get_tokens() -> _Tokens:
+    global _tokens
+    if _tokens is None:
+        _tokens = _Tokens()
+    return _tokens
+
+def count_tokens(text: str) -> int:
+    """Prompt tokens of *text* (tiktoken, or the estimate when it is unavailable)."""
+    return _get_tokens().count(text)
+
+# --- Steps ---
+def _header(block: dict) -> str:
+    where = ""
+    if block.get("file"):
+        where = f", {block['file']}"
+        if block.get("page_start"):
+            pages = block["page_start"], block.get("page_end", block["page_start"])
+            where += f" p.{pages[0]}" if pages[0] == pages[1] else f" p.{pages[0]}-{pages[1]}"
+    return f"Chunk (Score: {block['score']:.4f}{where}):\n"
+
+def _join_overlap(a: str, b: str) -> str | None:
+    """`a + b` without the text *b* repeats from the end of *a*, or None if they don't overlap."""
+    probe = b[:MIN_OVERLAP]
+    if len(probe) < MIN_OVERLAP:
+        return None
+    pos = a.rfind(probe)
+    while pos != -1:
+        if b.startswith(a[pos:]):
+            return a + b[len(a) - pos:]
+        pos = a.rfind(probe, 0, pos)
+    return None
+
+def merge_adjacent(results: list[dict]) -> list[dict]:
+    """
+    Merge chunks of the same file that are neighbours (consecutive
+    `chunk_index`) or textually overlap. A merged block keeps the best score.
+    """
+    blocks, by_file = [], {}
+    ordered = sorted(enumerate(results),
+                     key=lambda r: (r[1].get("file") or "", r[1].get("chunk_index", r[0])))
+    for _, r in ordered:
+        block = {**r, "chunk": r["chunk"], "merged": 1}
+        prev  = by_file.get(r.get("file"))
+        if prev is not None and r.get("file"):
+            adjacent = ("chunk_index" in r and "chunk_index" in prev
+                        and r["chunk_index"] == prev["chunk_index"] + 1)
+            joined = _join_overlap(prev["chunk"], r["chunk"])
+            if joined is not None or adjacent:
+                prev["chunk"]       = joined if joined is not None else prev["chunk"] + "\n" + r["chunk"]
+                prev["score"]       = max(prev["score"], r["score"])
+                prev["chunk_index"] = r.get("chunk_index", prev.get("chunk_index"))
+                prev["page_end"]    = r.get("page_end", prev.get("page_end"))
+                prev["merged"]     += 1
+                continue
+        blocks.append(block)
+        by_file[r.get("file")] = block
+    return blocks
+
+def _shingles(text: str) -> set:
+    words = text.lower().split()
+    return {" ".join(words[i:i + SHINGLE]) for i in range(max(len(words) - SHINGLE + 1, 1))}
+
+def _overlap(a: set, b: set) -> float:
+    """Share of the smaller text's shingles found in the other (1.0 = contained)."""
+    return len(a & b) / min(len(a), len(b)) if a and b else 0.0
+
+def select_mmr(blocks: list[dict], mmr_lambda: float, dedup_threshold: float) -> list[dict]:
+    """Drop near-duplicates, then order by maximal marginal relevance."""
+    for b in blocks:
+        b["_shingles"] = _shingles(b["chunk"])
+    remaining = sorted(blocks, key=lambda b: -b["score"])
+    chosen = []
+    while remaining:
+        best, best_value = None, None
+        for b in remaining:
+            redundancy = max((_overlap(b["_shingles"], c["_shingles"]) for c in chosen), default=0.0)
+            b["_redundancy"] = redundancy
+            value = mmr_lambda * b["score"] - (1 - mmr_lambda) * redundancy
+            if best_value is None or value > best_value:
+                best, best_value = b, value
+        remaining.remove(best)
+        if best["_redundancy"] >= dedup_threshold:
+            continue                                # near-duplicate of something already chosen
+        chosen.append(best)
+    for b in blocks:
+        b.pop("_shingles", None)
+        b.pop("_redundancy", None)
+    return chosen
+
+# --- Entry point ---
+def assemble_context(results: list[dict], budget: int = 2500, mmr_lambda: float = 0.7,
+                     dedup_threshold: float = 0.8) -> tuple[str, dict]:
+    """
+    Build the prompt context from search *results* (best first) within
+    *budget* tokens. Returns `(context, report)`; *report* has `tokens`,
+    `naive_tokens` (plain concatenation), `tokens_saved`, `blocks`,
+    `merged` and `dropped` counts.
+    """
+    tok = _get_tokens()
+    naive_tokens = sum(tok.count(_header(r) + r["chunk"]) for r in results)
+
+    merged_blocks = merge_adjacent(results)
+    merged = len(results) - len(merged_blocks)
+    blocks = select_mmr(merged_blocks, mmr_lambda, dedup_threshold)
+
+    parts, used = [], 0
+    separator   = tok.count("\n---\n")
+    for b in blocks:
+        text = _header(b) + b["chunk"]
+        cost = tok.count(text) + (separator if parts else 0)
+        if used + cost > budget:
+            room = budget - used - (separator if parts else 0)
+            if room >= MIN_TRUNCATED:
+                parts.append(tok.truncate(text, room))
+                used += room + (separator if len(parts) > 1 else 0)
+            break
+        parts.append(text)
+        used += cost
+
+    report = {"tokens": used, "naive_tokens": naive_tokens,
+              "tokens_saved": max(naive_tokens - used, 0), "blocks": len(parts),
+              "merged": merged, "dropped": len(results) - merged - len(parts)}
+    return "\n---\n".join(parts), report
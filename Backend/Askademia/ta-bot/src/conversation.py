@@ -0,0 +1,265 @@
+"""
+Bounded conversational memory for follow-up questions.
+
+The TA agent keeps one session per (student, course); behind the supervisor
+the student is the query's `session_id`, not the router that forwarded it.
+`begin()` looks at a new question in the light of that session and returns
+a `Turn`:
+
+* a follow-up ("and what about week 5?", "why is that?") gets a standalone
+  retrieval query - the previous turn's query with the follow-up appended -
+  and the conversation so far for the prompt;
+* a follow-up that adds no content of its own ("can you explain that more
+  simply?") re-uses the previous turn's retrieved chunks instead of
+  searching again; the pipeline does the same for any question whose
+  embedding is within `reuse_threshold` of the previous query's.
+
+Both are heuristics, no extra Gemini calls. After the answer, `commit()`
+appends the turn. Recent turns are kept under `history_tokens`; older ones
+are compacted into a rolling summary (question plus the answer's first
+sentence) of at most `summary_tokens`. Only the last turn keeps its chunks
+and query vector. Sessions idle for `idle_ttl` seconds are dropped, and the
+least recently used ones are evicted beyond `max_sessions` or `max_bytes`.
+"""
+import sys
+import os
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import re
+import threading
+import time
+from collections import OrderedDict, deque
+import numpy as np
+
+from src.context_builder import count_tokens
+
+ANSWER_GIST_TOKENS = 40             # per summarised turn
+STANDALONE_WORDS   = 48             # words of the previous query a rewrite keeps
+
+FOLLOWUP_STARTS = ("and ", "also ", "what about", "how about", "but ", "so ", "then ",
+                   "same for", "what else", "anything else")
+REFERENTIAL = {"it", "its", "it's", "that", "that's", "this", "these", "those", "they", "them",
+               "their", "he", "she", "one", "ones", "same", "above", "previous"}
+# "this course", "this week": not a reference to the previous answer
+COURSE_NOUNS = {"course", "class", "semester", "term", "module", "unit", "week", "syllabus"}
+FILLER = {"a", "an", "the", "is", "are", "was", "were", "be", "do", "does", "did", "can", "could",
+          "would", "will", "you", "i", "me", "my", "we", "to", "of", "in", "on", "for", "with",
+          "and", "or", "but", "so", "then", "also", "what", "why", "how", "please", "more",
+          "again", "explain", "elaborate", "clarify", "mean", "means", "simpler", "simply",
+          "detail", "details", "example", "examples", "give", "tell", "about", "further", "not",
+          "work", "works", "happen", "happens", "matter", "matters", "?"}
+
+def _words(text: str) -> list[str]:
+    return re.findall(r"[a-z0-9']+", text.lower())
+
+def _references(words: list[str]) -> bool:
+    return any(w in REFERENTIAL and (i + 1 == len(words) or words[i + 1] not in COURSE_NOUNS)
+               for i, w in enumerate(words))
+
+def is_followup(question: str) -> bool:
+    """
+    Does *question* lean on the previous turn? It does if it starts with a
+    continuation ("and what about week 5?"), or if it is a bare "why" or a
+    pronoun with no content terms of its own ("why?", "why is that?", "how
+    does it work?"). "Why do we use recursion?" or "Is this exam open book?"
+    stand alone, and so does a short question such as "office hours?".
+    """
+    words = _words(question)
+    if not words:
+        return False
+    text = " ".join(words) + " "
+    if text.startswith(FOLLOWUP_STARTS):
+        return True
+    return not adds_content(question) and (words[0] == "why" or _references(words))
+
+def adds_content(question: str) -> bool:
+    """False for follow-ups made only of filler and references ("explain that again")."""
+    return any(w not in FILLER and w not in REFERENTIAL for w in _words(question))
+
+def _gist(answer: str) -> str:
+    first = re.split(r"(?<=[.!?])\s", answer.strip(), maxsplit=1)[0]
+    words = first.split()
+    return " ".join(words[:ANSWER_GIST_TOKENS]) + (" ..." if len(words) > ANSWER_GIST_TOKENS else "")
+
+class Turn:
+    """One question of a session; the pipeline fills in `results` / `vector`."""
+
+    __slots__ = ("key", "question", "standalone", "followup", "history", "previous",
+                 "threshold", "reuse", "results", "vector", "answer", "tokens")
+
+    def __init__(self, key: tuple, question: str, previous: "Turn | None" = None,
+                 threshold: float = 0.0):
+        self.key        = key
+        self.question   = question
+        self.previous   = previous
+        self.threshold  = threshold     # similarity at which the previous chunks are re-used
+        self.followup   = previous is not None and is_followup(question)
+        self.standalone = question
+        self.history    = ""
+        self.reuse      = None          # chunks to answer from without searching
+        self.results    = None          # chunks the answer was built from
+        self.vector     = None          # embedding of `standalone`
+        self.answer     = None
+        self.tokens     = 0
+
+    def reuse_for(self, vector) -> list[dict] | None:
+        """Previous chunks if *vector* asks about the same thing as the previous turn."""
+        prev = self.previous
+        if prev is None or prev.results is None or prev.vector is None or not self.threshold:
+            return None
+        v = np.asarray(vector, dtype=np.float32)
+        sim = float(prev.vector @ v / (np.linalg.norm(v) or 1.0))
+        return prev.results if sim >= self.threshold else None
+
+class Session:
+    __slots__ = ("turns", "summary", "updated", "bytes")
+
+    def __init__(self):
+        self.turns   = deque()          # recent turns, oldest first
+        self.summary = deque()          # compacted lines, oldest first
+        self.updated = time.monotonic()
+        self.bytes   = 0
+
+    def history(self) -> str:
+        parts = []
+        if self.summary:
+            parts.append("Earlier (summary):\n" + "\n".join(self.summary))
+        if self.turns:
+            parts.append("\n".join(f"Student: {t.question}\nTA: {t.answer}" for t in self.turns))
+        return "\n\n".join(parts)
+
+    def size(self) -> int:
+        """Approximate bytes held (text, last turn's chunks and vector)."""
+        n = sum(len(t.question) + len(t.answer or "") for t in self.turns)
+        n += sum(len(line) for line in self.summary)
+        last = self.turns[-1] if self.turns else None
+        if last is not None and last.results:
+            n += sum(len(r.get("chunk", "")) + 200 for r in last.results)
+        if last is not None and last.vector is not None:
+            n += last.vector.nbytes
+        return n
+
+class ConversationMemory:
+    """Thread-safe per-sender sessions with token, idle-time and memory bounds."""
+
+    def __init__(self, history_tokens: int = 600, summary_tokens: int = 200,
+                 idle_ttl: float = 1800, max_sessions: int = 5000,
+                 max_bytes: int = 64 << 20, reuse_threshold: float = 0.9):
+        self.history_tokens = history_tokens
+        self.summary_tokens = summary_tokens
+        self.idle_ttl       = idle_ttl
+        self.max_sessions   = max_sessions
+        self.max_bytes      = max_bytes
+        self.reuse_threshold = reuse_threshold
+        self._sessions = OrderedDict()  # (sender, course_id) -> Session, least recently used first
+        self._bytes    = 0
+        self._lock     = threading.Lock()
+        self.followups = self.reused = self.expired = self.evicted = 0
+
+    # --- Internal helpers (lock held) ---
+    def _drop(self, key):
+        self._bytes -= self._sessions.pop(key).bytes
+
+    def _live(self, key) -> Session | None:
+        session = self._sessions.get(key)
+        if session is not None and time.monotonic() - session.updated > self.idle_ttl:
+            self._drop(key)
+            self.expired += 1
+            return None
+        return session
+
+    def _compact(self, session: Session):
+        """Move the oldest turns into the summary until the recent ones fit the budget."""
+        used = sum(t.tokens for t in session.turns)
+        while len(session.turns) > 1 and used > self.history_tokens:
+            old   = session.turns.popleft()
+            used -= old.tokens
+            session.summary.append(f"- Q: {old.question} A: {_gist(old.answer or '')}")
+        while session.summary and count_tokens("\n".join(session.summary)) > self.summary_tokens:
+            session.summary.popleft()
+        for t in list(session.turns)[:-1]:      # only the last turn's chunks are re-used
+            t.results, t.vector, t.previous = None, None, None
+
+    # --- Public API ---
+    def begin(self, sender: str, course_id: str, question: str) -> Turn:
+        key = (sender, course_id)
+        with self._lock:
+            session  = self._live(key)
+            previous = session.turns[-1] if session and session.turns else None
+            turn     = Turn(key, question, previous, self.reuse_threshold)
+            if turn.followup:
+                self.followups += 1
+                base = previous.standalone.split()[-STANDALONE_WORDS:]
+                turn.history = session.history()
+                if adds_content(question):
+                    turn.standalone = " ".join(base + [question])
+                else:
+                    turn.standalone = previous.standalone
+                    turn.reuse      = previous.results
+        return turn
+
+    def commit(self, turn: Turn, answer: str):
+        """Record the answered *turn* in its session."""
+        turn.answer   = answer
+        turn.tokens   = count_tokens(f"Student: {turn.question}\nTA: {answer}")
+        if turn.tokens > self.history_tokens:       # one long answer must not blow the budget
+            turn.answer = answer[:self.history_tokens * 4] + " ..."
+            turn.tokens = self.history_tokens
+        turn.previous = None
+        if turn.vector is not None:
+            v = np.asarray(turn.vector, dtype=np.float32)
+            turn.vector = v / (np.linalg.norm(v) or 1.0)
+        if turn.results is not None:        # keep the chunks, not their embeddings
+            turn.results = [{k: v for k, v in r.items() if k != "embedding"} for r in turn.results]
+        with self._lock:
+            session = self._live(turn.key)
+            if session is None:
+                session = self._sessions[turn.key] = Session()
+            self._sessions.move_to_end(turn.key)
+            self.reused += turn.reuse is not None
+            session.turns.append(turn)
+            session.updated = time.monotonic()
+            self._compact(session)
+            self._bytes  -= session.bytes
+            session.bytes = session.size()
+            self._bytes  += session.bytes
+            while self._sessions and (len(self._sessions) > self.max_sessions
+                                      or self._bytes > self.max_bytes):
+                self._drop(next(iter(self._sessions)))
+                self.evicted += 1
+
+    def expire(self) -> int:
+        """Drop idle sessions; returns how many."""
+        now = time.monotonic()
+        with self._lock:
+            idle = [k for k, s in self._sessions.items() if now - s.updated > self.idle_ttl]
+            for k in idle:
+                self._drop(k)
+            self.expired += len(idle)
+        return len(idle)
+
+    def forget(self, sender: str, course_id: str | None = None):
+        with self._lock:
+            for key in [k for k in self._sessions if k[0] == sender and course_id in (None, k[1])]:
+                self._drop(key)
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {"sessions":  len(self._sessions),
+                    "bytes":     self._bytes,
+                    "followups": self.followups,
+                    "reused":    self.reused,
+                    "expired":   self.expired,
+                    "evicted":   self.evicted}
+
+if __name__ == "__main__":
+    # python src/conversation.py - checks of the follow-up heuristics
+    for q in ("why?", "why is that?", "why not?", "how does it work?", "what does it mean?",
+              "can you explain that more simply?", "and week 5?", "what about the final?"):
+        assert is_followup(q), q
+    for q in ("Why do we use recursion in divide and conquer algorithms?",
+              "What is it that makes quicksort fast?", "Is this exam open book?",
+              "What is this course about?", "office hours?", "When is the midterm?"):
+        assert not is_followup(q), q
+    assert not adds_content("can you explain that again?") and adds_content("and week 5?")
+    print("✔ follow-up checks passed")
@@ -1,14 +1,17 @@
+import sys
 import os
-import google.generativeai as genai
+# Add project root to sys.path to allow sibling imports
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import time
 from dotenv import load_dotenv
+from utils.logging_conf import span, count, observe, annotate, stage_error, LATENCY_BUCKETS
+from utils import gemini_client
+from utils.gemini_client import RateLimited, DeadlineExceeded
 
 load_dotenv()
 
-API_KEY = os.getenv("GEMINI_API_KEY")
-if not API_KEY:
-    raise ValueError("GEMINI_API_KEY must be set in the environment variables or .env file")
-
-genai.configure(api_key=API_KEY)
+MODEL_NAME = "gemini-1.5-flash"
 
 # Configuration for the generation
 generation_config = {
@@ -26,44 +29,140 @@ safety_settings = [
     {"category": "HARM_CATEGORY_DANGEROUS_CONTENT", "threshold": "BLOCK_MEDIUM_AND_ABOVE"},
 ]
 
-# Initialize the model
-# Use a model suitable for chat, like gemini-1.5-flash or gemini-pro
-model = genai.GenerativeModel(model_name="gemini-1.5-flash",
-                              generation_config=generation_config,
-                              safety_settings=safety_settings)
+def warm_up():
+    """Build the shared client and open its connection with a metadata lookup (no tokens)."""
+    gemini_client.warm_up(MODEL_NAME)
 
-def generate_response(system_prompt: str, user_query: str, context: str) -> str:
-    """
-    Generates a response using the Gemini model based on system prompt, user query, and context.
-    """
-    try:
-        # Constructing the prompt for the model
-        # You might refine this structure based on Gemini's best practices
-        full_prompt = f"""{system_prompt}
+# User-facing messages, also checked by the callers to detect failures
+BLOCKED_MESSAGE = "I could not generate a response based on the provided information."
+ERROR_MESSAGE = "Sorry, I encountered an error trying to generate a response."
+RATE_LIMITED_MESSAGE = "Sorry, the TA is answering a lot of questions right now. Please try again in a minute."
+TIMEOUT_MESSAGE = "Sorry, generating a response took too long. Please try again."
+
+# Finish reasons that mean the answer was cut off by a safety / policy filter
+BLOCK_REASONS = {"SAFETY", "PROHIBITED_CONTENT", "BLOCKLIST", "SPII", "RECITATION"}
+
+class GenerationError(Exception):
+    """Raised by `generate_response_stream` when Gemini blocks or fails mid-stream."""
+
+def build_prompt(system_prompt: str, user_query: str, context: str, history: str = "") -> str:
+    # Constructing the prompt for the model
+    # You might refine this structure based on Gemini's best practices
+    # (*history*: earlier turns of the student's conversation, see src/conversation.py)
+    conversation = f"""Conversation so far:
+---
+{history}
+---
+
+""" if history else ""
+    return f"""{system_prompt}
 
 Context from course material:
 ---
 {context}
 ---
 
-Student Query: {user_query}
+{conversation}Student Query: {user_query}
 
 Response:"""
 
-        response = model.generate_content(full_prompt)
+def _blocked(response) -> bool:
+    feedback = getattr(response, "prompt_feedback", None)
+    if feedback is not None and getattr(feedback, "block_reason", None):
+        return True
+    for cand in getattr(response, "candidates", None) or []:
+        reason = getattr(cand, "finish_reason", None)
+        if reason is not None and str(getattr(reason, "name", reason)).split(".")[-1] in BLOCK_REASONS:
+            return True
+    return False
+
+def _failure_message(e: Exception) -> str:
+    if isinstance(e, RateLimited):
+        return RATE_LIMITED_MESSAGE
+    if isinstance(e, DeadlineExceeded):
+        return TIMEOUT_MESSAGE
+    return ERROR_MESSAGE
+
+def _record_usage(response):
+    """Prompt/output token counts reported by Gemini (if present)."""
+    usage = getattr(response, "usage_metadata", None)
+    if not usage:
+        return
+    prompt_tokens = getattr(usage, "prompt_token_count", 0) or 0
+    output_tokens = getattr(usage, "candidates_token_count", 0) or 0
+    observe("askademia_prompt_tokens", prompt_tokens)
+    observe("askademia_output_tokens", output_tokens)
+    annotate(prompt_tokens=prompt_tokens, output_tokens=output_tokens)
+
+def generate_response(system_prompt: str, user_query: str, context: str, history: str = "") -> str:
+    """
+    Generates a response using the Gemini model based on system prompt, user query, and context.
+    """
+    try:
+        full_prompt = build_prompt(system_prompt, user_query, context, history)
+
+        with span("gemini_generate"):
+            response = gemini_client.generate(full_prompt, MODEL_NAME, generation_config, safety_settings)
+        _record_usage(response)
         # Safely access the text part, handling potential issues
-        if response.parts:
+        if response.text and not _blocked(response):
             return response.text
         else:
             # Handle cases where the response might be blocked or empty
             # You might want to inspect response.prompt_feedback here
             print("Warning: Gemini response was empty or blocked.")
-            return "I could not generate a response based on the provided information."
+            count("askademia_generation_blocked_total")
+            return BLOCKED_MESSAGE
 
     except Exception as e:
         # Basic error handling, consider adding logging
         print(f"Error during Gemini API call: {e}")
-        return "Sorry, I encountered an error trying to generate a response."
+        stage_error("generate")
+        return _failure_message(e)
+
+def generate_response_stream(system_prompt: str, user_query: str, context: str, history: str = ""):
+    """
+    Streaming variant of `generate_response`: yields the answer text as Gemini
+    produces it. A safety block or API error - before or after some text has
+    been yielded - raises `GenerationError` carrying the user-facing message.
+    """
+    produced = False
+    start = time.perf_counter()
+    chunk = stream = None
+    try:
+        full_prompt = build_prompt(system_prompt, user_query, context, history)
+        stream = gemini_client.generate_stream(full_prompt, MODEL_NAME,
+                                               generation_config, safety_settings)
+        for chunk in stream:
+            if _blocked(chunk):
+                # the prompt or this part of the answer was blocked
+                print("Warning: Gemini stream was blocked.")
+                count("askademia_generation_blocked_total")
+                raise GenerationError(BLOCKED_MESSAGE)
+            text = chunk.text
+            if text:
+                if not produced:
+                    observe("askademia_stream_first_token_seconds", time.perf_counter() - start,
+                            buckets=LATENCY_BUCKETS)
+                produced = True
+                yield text
+    except GenerationError:
+        raise
+    except Exception as e:
+        print(f"Error during Gemini API call: {e}")
+        stage_error("generate")
+        raise GenerationError(_failure_message(e)) from e
+    finally:
+        if stream is not None:
+            stream.close()                  # releases the generate slot, closes the SDK stream
+        observe("askademia_stage_seconds", time.perf_counter() - start,
+                buckets=LATENCY_BUCKETS, stage="gemini_stream")
+
+    _record_usage(chunk)                    # last streamed chunk carries the totals
+    if not produced:
+        print("Warning: Gemini response was empty or blocked.")
+        count("askademia_generation_blocked_total")
+        raise GenerationError(BLOCKED_MESSAGE)
 
 # Example Usage (optional, for testing)
 if __name__ == '__main__':
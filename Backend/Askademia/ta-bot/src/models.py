@@ -2,9 +2,34 @@ from uagents import Model
 
 class StudentQuery(Model):
     query: str
+    stream: bool = False        # reply with TAResponseChunk messages instead of one TAResponse
+    course_id: str | None = None  # search only this course's material (default: config.DEFAULT_COURSE_ID, else all)
+    request_id: str | None = None  # echoed on every reply to this query
+    session_id: str | None = None  # conversation key; set by the router to the student's address
 
 class TAResponse(Model):
     answer: str
+    request_id: str | None = None
+
+class TAResponseChunk(Model):
+    seq: int                    # 0, 1, 2, ... in send order
+    text: str                   # next piece of the answer (empty on the final marker)
+    final: bool = False         # True on the last message of the stream
+    request_id: str | None = None
 
 class ErrorResponse(Model):
     error: str
+    request_id: str | None = None
+
+class BatchStudentQuery(Model):
+    queries: list[str]          # answered in parallel, results in the same order
+    course_id: str | None = None  # applies to every query (default: config.DEFAULT_COURSE_ID, else all)
+    request_id: str | None = None
+
+class BatchAnswer(Model):
+    answer: str | None = None   # set when the question was answered
+    error: str | None = None    # set when this question failed (the others are unaffected)
+
+class BatchTAResponse(Model):
+    results: list[BatchAnswer]  # one per query of the BatchStudentQuery, same order
+    request_id: str | None = None
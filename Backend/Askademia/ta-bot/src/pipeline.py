@@ -0,0 +1,386 @@
+"""
+Question-answering pipeline shared by the agent message handlers.
+
+The embed / retrieve / generate stages are blocking (pymongo, Gemini SDK), so
+they run on a bounded thread pool instead of the agent's event loop. At most
+`TA_MAX_IN_FLIGHT` questions are processed at once; the rest wait (up to
+`TA_QUEUE_TIMEOUT` seconds) for a slot. Identical questions that arrive while
+one is already being answered share that single execution.
+
+`answer_batch` answers a list of questions for one course: a single batched
+embed call, then retrieval and generation for up to `TA_BATCH_CONCURRENCY`
+questions at a time.
+
+Questions for a course the document catalog knows to be empty are answered
+with `NO_MATERIAL_MESSAGE` before any embedding or search (`CATALOG_ROUTING`).
+
+Before embedding, the local BM25 index (db/lexical_index.py) looks at the
+question: a confident match on a short factual question is answered with the
+matching line (no Gemini call), other confident matches skip the embedding
+and vector search, and weaker hits are fused with the vector results.
+
+`answer_query` / `stream_answer` take an optional conversation `Turn`
+(src/conversation.py): follow-ups are retrieved with their standalone query,
+answered with the conversation in the prompt and kept out of the answer
+cache and coalescing; the turn's chunks and query vector are filled in.
+"""
+import sys
+import os
+# Add project root to sys.path to allow sibling imports
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import asyncio
+import contextvars
+import functools
+import logging
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from src.rag_handler import retrieve
+from src.gemini_handler import generate_response, generate_response_stream, GenerationError, ERROR_MESSAGE
+from src.answer_cache import SemanticAnswerCache
+from src.conversation import Turn
+from embeddings.embedder import embed, embed_batch
+from db.lexical_index import lookup as lexical_lookup
+from db.corpus_version import get_corpus_version
+from db.catalog import has_material
+from prompts.ta_system_prompts import TA_SYSTEM_PROMPT
+from src.models import TAResponse, TAResponseChunk, ErrorResponse
+from utils.logging_conf import span, count, stage_error, METRICS
+import config
+
+logger = logging.getLogger(config.TA_AGENT_NAME)
+
+BUSY_MESSAGE = "The TA is busy right now, please try again in a moment."
+NO_MATERIAL_MESSAGE = "No course material has been uploaded for course '{course_id}' yet."
+
+EXECUTOR = ThreadPoolExecutor(max_workers=config.TA_WORKER_THREADS, thread_name_prefix="ta-rag")
+_slots   = asyncio.Semaphore(config.TA_MAX_IN_FLIGHT)
+_pending = {}                                   # (course_id, normalised query) -> asyncio.Task
+_waiters = {}                                   # same key -> callers awaiting that task
+stats    = {"queries": 0, "coalesced": 0, "rejected": 0, "batches": 0,
+            "lexical_answers": 0, "lexical_only": 0, "lexical_fused": 0}
+
+# Semantic answer cache (repeat questions skip retrieval + generation)
+answer_cache = SemanticAnswerCache(
+    threshold=config.ANSWER_CACHE_THRESHOLD,
+    ttl=config.ANSWER_CACHE_TTL,
+    max_entries=config.ANSWER_CACHE_MAX_ENTRIES
+)
+
+async def run_blocking(fn, *args, **kwargs):
+    """Run a blocking call on the shared worker pool (keeping the current trace)."""
+    loop = asyncio.get_running_loop()
+    ctx = contextvars.copy_context()
+    return await loop.run_in_executor(EXECUTOR, ctx.run, functools.partial(fn, *args, **kwargs))
+
+async def _acquire_slot() -> bool:
+    start = time.perf_counter()
+    try:
+        await asyncio.wait_for(_slots.acquire(), timeout=config.TA_QUEUE_TIMEOUT)
+        return True
+    except asyncio.TimeoutError:
+        stats["rejected"] += 1
+        count("askademia_rejected_total")
+        logger.warning("In-flight limit reached, rejecting query")
+        return False
+    finally:
+        METRICS.observe("askademia_stage_seconds", time.perf_counter() - start, stage="queue_wait")
+
+def _coalesce_key(query: str, course_id: str) -> tuple:
+    return course_id, " ".join(query.lower().split())
+
+async def _no_material(course_id: str | None) -> ErrorResponse | None:
+    """An error if the catalog lists *course_id* without chunks (a failed lookup lets it through)."""
+    if not config.CATALOG_ROUTING or course_id is None:     # no course: the whole collection
+        return None
+    try:
+        with span("catalog"):
+            if await run_blocking(has_material, course_id):
+                return None
+    except Exception as e:
+        logger.warning(f"Document catalog lookup failed: {e}")
+        return None
+    count("askademia_no_material_total")
+    logger.info(f"No material for course '{course_id}', skipping retrieval")
+    return ErrorResponse(error=NO_MATERIAL_MESSAGE.format(course_id=course_id))
+
+def _history(turn: Turn | None) -> str:
+    return turn.history if turn is not None and turn.followup else ""
+
+async def _lexical(query: str, course_id: str):
+    """The BM25 fast path's view of *query*, or None (disabled, or the lookup failed)."""
+    if not config.LEXICAL_ENABLED:
+        return None
+    try:
+        with span("lexical"):
+            hit = await run_blocking(lexical_lookup, query, course_id)
+    except Exception as e:
+        logger.warning(f"Lexical lookup failed: {e}")
+        return None
+    path = ("extractive" if hit.answer else "lexical_only" if hit.confident
+            else "fused" if hit.results else "vector")
+    count("askademia_lexical_total", path=path)
+    if path != "vector":
+        stats[{"extractive": "lexical_answers", "lexical_only": "lexical_only",
+               "fused": "lexical_fused"}[path]] += 1
+    return hit
+
+async def _prepare(query: str, course_id: str, query_embedding: list[float] | None = None,
+                   turn: Turn | None = None):
+    """
+    Embed (unless *query_embedding* is given), check the answer cache and
+    retrieve context. Returns `(early_response, context, cache_key)`:
+    *early_response* is set (cache hit or error) when there is nothing left
+    to generate; *cache_key* is None when the answer must not be cached.
+    """
+    if (error := await _no_material(course_id)) is not None:
+        return error, None, None
+
+    followup = turn is not None and turn.followup
+    reuse    = turn.reuse if followup else None
+    if followup:
+        query = turn.standalone             # retrieve with the rewritten query
+
+    # Exact-fact fast path: answer from the matching line, or use the lexical hits as context
+    lexical = None if followup else await _lexical(query, course_id)
+    if lexical is not None and lexical.answer is not None:
+        logger.info("Answered from the lexical index")
+        return TAResponse(answer=lexical.answer), None, None
+    given = reuse if reuse is not None else (lexical.results if lexical and lexical.confident else None)
+
+    # 0. Embed once; the vector is the cache key and the retrieval query
+    try:
+        if query_embedding is None and given is None:
+            with span("embed"):
+                query_embedding = await run_blocking(embed, query)
+        with span("corpus_version"):
+            version = await run_blocking(get_corpus_version, course_id) if config.ANSWER_CACHE_ENABLED else 0
+    except Exception as e:
+        logger.error(f"Query embedding failed: {e}")
+        stage_error("prepare")
+        return ErrorResponse(error="Error retrieving context from the database."), None, None
+
+    # a follow-up's answer depends on the conversation, not just the question
+    cache_key = None if followup or query_embedding is None else (course_id, version, query_embedding)
+    if config.ANSWER_CACHE_ENABLED and cache_key is not None:
+        with span("cache_lookup"):
+            cached = answer_cache.lookup(*cache_key)
+        count("askademia_answer_cache_total", result="miss" if cached is None else "hit")
+        if cached is not None:
+            logger.info("Answer cache hit")
+            return cached, None, None
+
+    if turn is not None:
+        if given is None and not followup:
+            reuse = given = turn.reuse_for(query_embedding)     # same question as the previous turn
+        turn.reuse  = reuse
+        turn.vector = query_embedding if query_embedding is not None or not followup else turn.previous.vector
+        if reuse is not None:
+            count("askademia_conversation_reused_total")
+
+    # 1. Retrieve Context (or format the previous turn's / the lexical chunks)
+    logger.info("Retrieving context...")
+    fuse_with = lexical.results if lexical is not None and given is None else None
+    with span("retrieve", reused=given is not None):
+        context, results = await run_blocking(retrieve, query, query_embedding=query_embedding,
+                                              course_id=course_id, results=given, lexical=fuse_with)
+    if turn is not None:
+        turn.results = results
+
+    # Handle retrieval errors
+    if context.startswith("Error") or context.startswith("No relevant context"):
+        logger.warning(f"Context retrieval issue: {context}")
+        return ErrorResponse(error=context), None, None
+
+    logger.info(f"Retrieved context successfully. Snippet: {context[:100]}...")
+    return None, context, cache_key
+
+async def _answer(query: str, course_id: str, query_embedding: list[float] | None = None,
+                  turn: Turn | None = None):
+    early, context, cache_key = await _prepare(query, course_id, query_embedding, turn)
+    if early is not None:
+        return early
+
+    # 2. Generate Response
+    logger.info("Generating response using Gemini...")
+    with span("generate"):
+        final_response_text = await run_blocking(
+            generate_response,
+            system_prompt=TA_SYSTEM_PROMPT,
+            user_query=query,
+            context=context,
+            history=_history(turn)
+        )
+
+    # Handle generation errors (generate_response returns specific strings on error)
+    if final_response_text.startswith("Sorry") or final_response_text.startswith("I could not"):
+        logger.error(f"Gemini generation failed: {final_response_text}")
+        return ErrorResponse(error=final_response_text)
+
+    response = TAResponse(answer=final_response_text)
+    if config.ANSWER_CACHE_ENABLED and cache_key is not None:
+        answer_cache.store(*cache_key, response)
+    return response
+
+async def _answer_with_slot(query: str, course_id: str, turn: Turn | None = None):
+    if not await _acquire_slot():
+        return ErrorResponse(error=BUSY_MESSAGE)
+    try:
+        return await _answer(query, course_id, turn=turn)
+    finally:
+        _slots.release()
+
+async def answer_query(query: str, course_id: str | None = config.DEFAULT_COURSE_ID,
+                       turn: Turn | None = None):
+    """
+    Answer one student question; returns a `TAResponse` or `ErrorResponse`.
+    Concurrent calls for the same (course, normalised query) share one run.
+    If the last caller waiting on a run is cancelled (client gone, deadline),
+    the run is cancelled too, so its remaining stages are skipped.
+    A follow-up *turn* ("why?") means something else per student, so it is
+    never shared; a caller that joins another's run gets no chunks on *turn*.
+    """
+    stats["queries"] += 1
+    if turn is not None and turn.followup:
+        return await _answer_with_slot(query, course_id, turn)
+    key = _coalesce_key(query, course_id)
+    task = _pending.get(key)
+    if task is not None:
+        stats["coalesced"] += 1
+        count("askademia_coalesced_total")
+        logger.info("Identical query already in flight, sharing its result")
+    else:
+        task = asyncio.ensure_future(_answer_with_slot(query, course_id, turn))
+        _pending[key] = task
+        task.add_done_callback(lambda _: _pending.pop(key, None))
+    # shield: one requester going away must not cancel the others' answer
+    _waiters[key] = _waiters.get(key, 0) + 1
+    try:
+        return await asyncio.shield(task)
+    except asyncio.CancelledError:
+        if _waiters[key] == 1:
+            task.cancel()
+        raise
+    finally:
+        _waiters[key] -= 1
+        if not _waiters[key]:
+            del _waiters[key]
+
+async def answer_batch(queries: list[str], course_id: str | None = config.DEFAULT_COURSE_ID) -> list:
+    """
+    Answer several questions for one course; returns a `TAResponse` or
+    `ErrorResponse` per query, in order. One failing question does not affect
+    the others. Duplicates (after normalisation) are answered once, all
+    queries are embedded in one batched call, and the batch holds a single
+    in-flight slot so it cannot crowd out individual students.
+    """
+    stats["queries"] += len(queries)
+    stats["batches"] += 1
+    if len(queries) > config.TA_BATCH_MAX_QUERIES:
+        error = ErrorResponse(error=f"A batch can hold at most {config.TA_BATCH_MAX_QUERIES} questions.")
+        return [error] * len(queries)
+    if not queries:
+        return []
+    if not await _acquire_slot():
+        return [ErrorResponse(error=BUSY_MESSAGE)] * len(queries)
+
+    try:
+        keys   = [_coalesce_key(q, course_id) for q in queries]
+        unique = {}                                 # coalesce key -> first query with it
+        for k, q in zip(keys, queries):
+            unique.setdefault(k, q)
+        texts  = list(unique.values())
+        count("askademia_batch_queries_total", len(queries))
+        if (error := await _no_material(course_id)) is not None:
+            return [error] * len(queries)
+        try:
+            with span("embed", batch=len(texts)):
+                vectors = await run_blocking(embed_batch, texts, kind="query_embed")
+        except Exception as e:
+            logger.error(f"Batch query embedding failed: {e}")
+            stage_error("prepare")
+            return [ErrorResponse(error="Error retrieving context from the database.")] * len(queries)
+
+        limit = asyncio.Semaphore(config.TA_BATCH_CONCURRENCY)
+
+        async def one(query: str, vector: list[float]):
+            async with limit:
+                try:
+                    return await _answer(query, course_id, vector)
+                except Exception as e:
+                    logger.error(f"Batch question failed: {e}")
+                    stage_error("batch_item")
+                    return ErrorResponse(error=ERROR_MESSAGE)
+
+        answers = dict(zip(unique, await asyncio.gather(*(one(q, v) for q, v in zip(texts, vectors)))))
+        return [answers[k] for k in keys]
+    finally:
+        _slots.release()
+
+async def stream_answer(query: str, course_id: str | None = config.DEFAULT_COURSE_ID,
+                        turn: Turn | None = None):
+    """
+    Async generator over the answer as `TAResponseChunk` messages, ending with
+    a `final=True` marker. Failures (including a safety block after some text
+    was already sent) end the stream with an `ErrorResponse` instead.
+    Streams are not coalesced; each holds an in-flight slot until it ends.
+    Closing the generator early stops the Gemini stream as well.
+    """
+    stats["queries"] += 1
+    if not await _acquire_slot():
+        yield ErrorResponse(error=BUSY_MESSAGE)
+        return
+
+    try:
+        early, context, cache_key = await _prepare(query, course_id, turn=turn)
+        if isinstance(early, ErrorResponse):
+            yield early
+            return
+        if early is not None:               # cache hit: whole answer in one piece
+            yield TAResponseChunk(seq=0, text=early.answer)
+            yield TAResponseChunk(seq=1, text="", final=True)
+            return
+
+        # 2. Generate Response, forwarding pieces from the worker thread
+        logger.info("Streaming response from Gemini...")
+        loop  = asyncio.get_running_loop()
+        queue = asyncio.Queue()
+        done  = object()
+        stop  = threading.Event()           # set when the consumer goes away
+
+        def produce():
+            pieces = generate_response_stream(TA_SYSTEM_PROMPT, query, context, _history(turn))
+            try:
+                for text in pieces:
+                    if stop.is_set():
+                        return
+                    loop.call_soon_threadsafe(queue.put_nowait, text)
+                loop.call_soon_threadsafe(queue.put_nowait, done)
+            except Exception as e:
+                err = e if isinstance(e, GenerationError) else GenerationError(ERROR_MESSAGE)
+                loop.call_soon_threadsafe(queue.put_nowait, err)
+            finally:
+                pieces.close()              # ends the Gemini stream, frees its slot
+
+        producer = loop.run_in_executor(EXECUTOR, contextvars.copy_context().run, produce)
+        seq, parts = 0, []
+        try:
+            while (item := await queue.get()) is not done:
+                if isinstance(item, GenerationError):
+                    logger.error(f"Gemini stream failed: {item}")
+                    yield ErrorResponse(error=str(item))
+                    return
+                parts.append(item)
+                yield TAResponseChunk(seq=seq, text=item)
+                seq += 1
+        finally:
+            stop.set()
+        await producer
+        yield TAResponseChunk(seq=seq, text="", final=True)
+
+        if config.ANSWER_CACHE_ENABLED and cache_key is not None:
+            answer_cache.store(*cache_key, TAResponse(answer="".join(parts)))
+    finally:
+        _slots.release()
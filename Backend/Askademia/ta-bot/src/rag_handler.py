@@ -3,71 +3,253 @@ import os
 # Add project root to sys.path to allow sibling imports
 sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 
+import json
+import threading
+import numpy as np
 from db.mongo_client import get_db
+from db.vector_codec import decode_vector, truncate_vector
 from embeddings.embedder import embed
+from src.context_builder import assemble_context
+from db.lexical_index import fuse
+from utils.logging_conf import span, count, observe, annotate, stage_error
+import config
 
 # Constants
 DB_NAME = "Classroom-qna"  # Should match index_setup.py
 COLL_NAME = "syllabus_chunks" # Should match index_setup.py and loader.py
 INDEX_NAME = "syllabus_emb"   # Should match index_setup.py
+SMALL_INDEX_NAME = "syllabus_emb_small"  # Should match index_setup.py (two-stage retrieval)
 NUM_CANDIDATES = 100         # Atlas Search parameter (higher means more initial docs considered)
-LIMIT = 5                    # Number of relevant chunks to return
+LIMIT = 5                    # Number of relevant chunks to return (context is then capped by CONTEXT_TOKEN_BUDGET)
 
-def retrieve_context(user_query: str) -> str:
-    """
-    Embeds the user query and performs a vector search in MongoDB 
-    to retrieve relevant document chunks.
-    Returns a formatted string containing the context.
-    """
+# --- Per-course tuning ---
+# A course's search only considers its own chunks, so small courses can use
+# fewer candidates and large ones more, without affecting each other. The
+# file is re-read when it changes (scripts/eval_retrieval.py --write), so
+# new settings apply without a restart.
+_course_settings = ({}, None)   # (settings, mtime of the file they were read from)
+
+def course_settings() -> dict:
+    """{"COURSE_ID": {"num_candidates": int, "limit": int}} from COURSE_SEARCH_SETTINGS_PATH."""
+    global _course_settings
+    settings, loaded = _course_settings
     try:
-        db = get_db() # Get database object
-        coll = db[COLL_NAME]
-
-        # 1. Embed the user query
-        query_embedding = embed(user_query)
-
-        # 2. Perform Vector Search
-        # Note: Ensure your Atlas Search index (syllabus_emb) is built and active
-        search_stage = {
-            "$vectorSearch": {
-                "index": INDEX_NAME,
-                "path": "embedding", # Field containing the vectors
-                "queryVector": query_embedding,
-                "numCandidates": NUM_CANDIDATES,
-                "limit": LIMIT
-            }
+        mtime = os.stat(config.COURSE_SEARCH_SETTINGS_PATH).st_mtime_ns
+    except FileNotFoundError:
+        mtime = None
+    if mtime != loaded:
+        try:
+            settings = {}
+            if mtime is not None:
+                with open(config.COURSE_SEARCH_SETTINGS_PATH, encoding="utf-8") as f:
+                    settings = json.load(f)
+        except (OSError, ValueError) as e:
+            # a half-written or broken file keeps the previous settings
+            print(f"Could not load {config.COURSE_SEARCH_SETTINGS_PATH}: {e}")
+            settings = _course_settings[0]
+        _course_settings = (settings, mtime)
+    return settings
+
+def search_params(course_id: str | None) -> tuple[int, int]:
+    """`(limit, num_candidates)` for a course, falling back to LIMIT / NUM_CANDIDATES."""
+    tuned = course_settings().get(course_id, {}) if course_id else {}
+    return tuned.get("limit", LIMIT), tuned.get("num_candidates", NUM_CANDIDATES)
+
+# --- Search Backends ---
+# Each backend takes a query vector and returns [{"chunk": str, "score": float, ...}, ...]
+# ordered best first, restricted to *course_id* / *file* when given.
+
+def search_filter(course_id: str | None = None, file: str | None = None) -> dict:
+    """`$vectorSearch` pre-filter on the index's filter fields (see db/index_setup.py)."""
+    flt = {}
+    if course_id:
+        flt["course_id"] = course_id
+    if file:
+        flt["file"] = file
+    return flt
+
+def atlas_search(query_embedding: list[float], limit: int = LIMIT,
+                 num_candidates: int = NUM_CANDIDATES,
+                 course_id: str | None = None, file: str | None = None) -> list[dict]:
+    """Top-k chunks via MongoDB Atlas `$vectorSearch`."""
+    coll = get_db()[COLL_NAME]
+
+    # Note: Ensure your Atlas Search index (syllabus_emb) is built and active
+    search_stage = {
+        "$vectorSearch": {
+            "index": INDEX_NAME,
+            "path": "embedding", # Field containing the vectors
+            "queryVector": query_embedding,
+            "numCandidates": num_candidates,
+            "limit": limit
         }
+    }
+    flt = search_filter(course_id, file)
+    if flt:
+        search_stage["$vectorSearch"]["filter"] = flt   # applied before candidate selection
 
-        # Optional: Add a projection stage to only return necessary fields
-        projection_stage = {
-            "$project": {
-                "_id": 0,           # Exclude the default _id field
-                "chunk": 1,         # Include the text chunk
-                "score": {"$meta": "vectorSearchScore"} # Include the search score
-            }
+    # Optional: Add a projection stage to only return necessary fields
+    projection_stage = {
+        "$project": {
+            "_id": 0,           # Exclude the default _id field
+            "chunk": 1,         # Include the text chunk
+            "file": 1,
+            "chunk_index": 1,
+            "page_start": 1,
+            "page_end": 1,
+            "score": {"$meta": "vectorSearchScore"} # Include the search score
         }
+    }
+
+    return list(coll.aggregate([search_stage, projection_stage]))
+
+def two_stage_search(query_embedding: list[float], limit: int = LIMIT,
+                     num_candidates: int = NUM_CANDIDATES,
+                     course_id: str | None = None, file: str | None = None) -> list[dict]:
+    """
+    `limit * TWO_STAGE_OVERSAMPLE` candidates from the reduced-dimension
+    index (`embedding_small`), re-ranked exactly with their full stored
+    vectors; returns the top *limit* with full-vector scores.
+    """
+    if not config.SMALL_EMBEDDING_DIM:
+        raise ValueError("RAG_BACKEND=two_stage needs SMALL_EMBEDDING_DIM (and the small index)")
+    coll  = get_db()[COLL_NAME]
+    query = truncate_vector(query_embedding, len(query_embedding))   # unit length
+    wide  = limit * config.TWO_STAGE_OVERSAMPLE
+
+    search_stage = {
+        "$vectorSearch": {
+            "index": SMALL_INDEX_NAME,
+            "path": "embedding_small",
+            "queryVector": truncate_vector(query, config.SMALL_EMBEDDING_DIM).tolist(),
+            "numCandidates": max(num_candidates, wide),
+            "limit": wide
+        }
+    }
+    flt = search_filter(course_id, file)
+    if flt:
+        search_stage["$vectorSearch"]["filter"] = flt
+    projection_stage = {"$project": {"_id": 0, "chunk": 1, "file": 1, "chunk_index": 1,
+                                     "page_start": 1, "page_end": 1, "embedding": 1}}
+    with span("candidates"):
+        docs = list(coll.aggregate([search_stage, projection_stage]))
+    if not docs:
+        return []
+
+    with span("rerank", candidates=len(docs)):
+        full = np.stack([decode_vector(d.pop("embedding")) for d in docs])
+        sims = full @ query / np.maximum(np.linalg.norm(full, axis=1), 1e-12)
+        top  = np.argsort(-sims)[:limit]
+    # Atlas reports cosine as (1 + cos) / 2, keep scores comparable
+    return [{**docs[i], "score": float((1 + sims[i]) / 2)} for i in top]
+
+_local_index = None
+_local_index_lock = threading.Lock()
 
-        pipeline = [search_stage, projection_stage]
-        
-        results = list(coll.aggregate(pipeline))
+def get_local_index():
+    """Memory-map the local snapshot on first use (shared by all callers)."""
+    global _local_index
+    if _local_index is None:
+        with _local_index_lock:
+            if _local_index is None:
+                from db.local_index import LocalIndex
+                _local_index = LocalIndex.load(config.LOCAL_INDEX_DIR, nprobe=config.LOCAL_INDEX_NPROBE)
+    return _local_index
+
+def local_search(query_embedding: list[float], limit: int = LIMIT,
+                 num_candidates: int = NUM_CANDIDATES,
+                 course_id: str | None = None, file: str | None = None) -> list[dict]:
+    """Top-k chunks from the in-process snapshot (num_candidates is Atlas-only)."""
+    return get_local_index().search(query_embedding, limit=limit, course_id=course_id, file=file)
+
+SEARCH_BACKENDS = {
+    "atlas": atlas_search,
+    "local": local_search,
+    "two_stage": two_stage_search,
+}
+
+def search_chunks(query_embedding: list[float], limit: int | None = None,
+                  num_candidates: int | None = None,
+                  course_id: str | None = None, file: str | None = None) -> list[dict]:
+    """
+    Dispatch to the backend selected by `config.RAG_BACKEND`. *limit* and
+    *num_candidates* default to the course's tuned values.
+    """
+    tuned_limit, tuned_candidates = search_params(course_id)
+    backend = SEARCH_BACKENDS[config.RAG_BACKEND]
+    return backend(query_embedding, limit=limit or tuned_limit,
+                   num_candidates=num_candidates or tuned_candidates,
+                   course_id=course_id, file=file)
+
+def format_context(results: list[dict]) -> str:
+    """Plain concatenation of every chunk (the baseline `build_context` improves on)."""
+    # Use newline character directly
+    return "\n---\n".join([f"Chunk (Score: {res['score']:.4f}):\n{res['chunk']}" for res in results])
+
+def build_context(results: list[dict]) -> str:
+    """Merged, de-duplicated, token-budgeted context (see src/context_builder.py)."""
+    context, report = assemble_context(results, budget=config.CONTEXT_TOKEN_BUDGET,
+                                       mmr_lambda=config.CONTEXT_MMR_LAMBDA,
+                                       dedup_threshold=config.CONTEXT_DEDUP_THRESHOLD)
+    observe("askademia_retrieved_chunks", len(results))
+    observe("askademia_context_tokens", report["tokens"])
+    count("askademia_context_tokens_saved_total", report["tokens_saved"])
+    annotate(retrieved_chunks=len(results), context_tokens=report["tokens"],
+             context_tokens_saved=report["tokens_saved"])
+    return context
+
+def retrieve(user_query: str, query_embedding: list[float] | None = None,
+             course_id: str | None = None, results: list[dict] | None = None,
+             lexical: list[dict] | None = None) -> tuple[str, list[dict]]:
+    """
+    `retrieve_context` that also returns the search results it formatted.
+    Given *results* (e.g. a previous turn's chunks) are formatted without
+    searching again; *lexical* hits (db/lexical_index.py) are fused with the
+    vector results.
+    """
+    try:
+        if results is None:
+            # 1. Embed the user query
+            if query_embedding is None:
+                with span("embed"):
+                    query_embedding = embed(user_query)
+
+            # 2. Perform Vector Search
+            with span("vector_search", backend=config.RAG_BACKEND, course_id=course_id):
+                results = search_chunks(query_embedding, course_id=course_id)
+            if lexical:
+                results = fuse(results, lexical, limit=search_params(course_id)[0])
 
         # 3. Format the results into a context string
         if not results:
-            return "No relevant context found in the course material."
+            observe("askademia_retrieved_chunks", 0)
+            return "No relevant context found in the course material.", []
 
-        # Use newline character directly
-        context_str = "\n---\n".join([f"Chunk (Score: {res['score']:.4f}):\n{res['chunk']}" for res in results])
-        return context_str
+        with span("format_context"):
+            context = build_context(results)
+        return context, results
 
     except Exception as e:
         # Basic error handling, consider adding logging
         print(f"Error during context retrieval: {e}")
-        return "Error retrieving context from the database."
+        stage_error("retrieve")
+        return "Error retrieving context from the database.", []
+
+def retrieve_context(user_query: str, query_embedding: list[float] | None = None,
+                     course_id: str | None = None) -> str:
+    """
+    Embeds the user query (unless *query_embedding* is already known) and
+    performs a vector search (Atlas or the local snapshot, see
+    `config.RAG_BACKEND`) to retrieve relevant document chunks, only from
+    *course_id*'s material when given.
+    Returns a formatted string containing the context.
+    """
+    return retrieve(user_query, query_embedding, course_id)[0]
 
 # Example Usage (optional, for testing)
 if __name__ == '__main__':
-    test_query = "Summarize the main points of Lecture 3." 
+    test_query = "Summarize the main points of Lecture 3."
     print(f"Retrieving context for query: '{test_query}'")
     context = retrieve_context(test_query)
     # Use newline character directly
-    print(f"\nRetrieved Context:\n{context}") 
\ No newline at end of file
+    print(f"\nRetrieved Context:\n{context}")
@@ -0,0 +1,103 @@
+"""
+Worker layout and query routing for the multi-worker TA deployment.
+
+`worker_specs(n)` derives each worker's name, seed, port and address from
+config.py, so the supervisor (which launches them) and its router agent
+(which forwards to them) agree without any registry. `Router.pick()`
+chooses a live worker for a course:
+
+    "affinity"     rendezvous hashing on the course id: a course always goes
+                   to the same worker (its caches stay warm), and when that
+                   worker is down only its courses move
+    "round_robin"  next live worker, ignoring the course
+
+Workers resolve the router (and the router its workers) through
+`LocalFirstResolver`, so local traffic never waits on an Almanac lookup;
+`LOCAL_AGENT_ENDPOINTS` adds further fixed routes (e.g. local test students).
+"""
+import sys
+import os
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import hashlib
+import itertools
+from uagents.crypto import Identity
+from uagents.resolver import Resolver, RulesBasedResolver, GlobalResolver
+from uagents_core.registration import AgentRegistrationPolicy
+import config
+
+ROUTING_MODES = ("affinity", "round_robin")
+
+class WorkerSpec:
+    """Where worker *index* runs; all of it follows from config.py."""
+
+    def __init__(self, index: int):
+        self.index        = index
+        self.name         = f"{config.TA_AGENT_NAME}_w{index}"
+        self.seed         = f"{config.TA_AGENT_SEED}/worker-{index}"
+        self.port         = config.TA_WORKER_BASE_PORT + index
+        self.endpoint     = f"http://127.0.0.1:{self.port}/submit"
+        self.metrics_port = config.METRICS_PORT + 1 + index if config.METRICS_PORT else 0
+        self.address      = Identity.from_seed(self.seed, 0).address
+
+    def env(self) -> dict[str, str]:
+        """Environment overrides that turn src/ta_agent.py into this worker."""
+        return {"TA_AGENT_NAME": self.name, "TA_AGENT_SEED": self.seed,
+                "TA_AGENT_PORT": str(self.port), "TA_AGENT_ENDPOINT": self.endpoint,
+                "METRICS_PORT": str(self.metrics_port)}
+
+    def __repr__(self):
+        return f"WorkerSpec({self.index}, port={self.port})"
+
+def worker_count() -> int:
+    return config.TA_WORKERS or os.cpu_count() or 1
+
+def worker_specs(n: int | None = None) -> list[WorkerSpec]:
+    return [WorkerSpec(i) for i in range(n or worker_count())]
+
+def local_endpoints() -> dict[str, str]:
+    """`LOCAL_AGENT_ENDPOINTS` as {address: endpoint}."""
+    pairs = (item.split("=", 1) for item in config.LOCAL_AGENT_ENDPOINTS.split(",") if "=" in item)
+    return {address.strip(): endpoint.strip() for address, endpoint in pairs}
+
+def _weight(course_id: str, address: str) -> int:
+    return int.from_bytes(hashlib.blake2b(f"{course_id}\0{address}".encode("utf-8"),
+                                          digest_size=8).digest(), "big")
+
+class Router:
+    """Picks a live worker per query; `healthy` is maintained by the supervisor."""
+
+    def __init__(self, workers: list[WorkerSpec], mode: str = "affinity"):
+        if mode not in ROUTING_MODES:
+            raise ValueError(f"Unknown routing mode '{mode}', expected one of {ROUTING_MODES}")
+        self.workers = workers
+        self.mode    = mode
+        self.healthy = {w.index for w in workers}
+        self._next   = itertools.count()
+
+    def pick(self, course_id: str) -> WorkerSpec | None:
+        live = [w for w in self.workers if w.index in self.healthy]
+        if not live:
+            return None
+        if self.mode == "round_robin":
+            return live[next(self._next) % len(live)]
+        return max(live, key=lambda w: _weight(course_id, w.address))
+
+class LocalFirstResolver(Resolver):
+    """Fixed address -> endpoint rules first, the normal Almanac/name resolution otherwise."""
+
+    def __init__(self, rules: dict[str, str]):
+        self._local  = RulesBasedResolver(rules)
+        self._global = GlobalResolver()
+
+    async def resolve(self, destination: str) -> tuple[str | None, list[str]]:
+        address, endpoints = await self._local.resolve(destination)
+        if endpoints:
+            return address, endpoints
+        return await self._global.resolve(destination)
+
+class NoRegistration(AgentRegistrationPolicy):
+    """Workers are only reached through the router, so they skip Almanac registration."""
+
+    async def register(self, agent_identifier, identity, protocols, endpoints, metadata=None):
+        pass
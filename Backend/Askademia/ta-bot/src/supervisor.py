@@ -0,0 +1,267 @@
+"""
+Run the TA agent as several worker processes behind one router agent.
+
+    python src/supervisor.py [--workers 4] [--routing affinity|round_robin] [-- --fake ...]
+
+The router takes the TA agent's usual name, seed and port from config.py, so
+students keep sending to the same address. Each `StudentQuery` /
+`BatchStudentQuery` is forwarded to a worker chosen by `src/routing.py`
+(course affinity by default), and the worker's replies are relayed back to
+the student. Replies are matched to students by uagents session, which a
+reply carries over from the message it answers.
+
+Every `TA_HEALTH_INTERVAL` seconds each worker is checked: the process must
+be alive and its endpoint must answer the uagents readiness probe. A worker
+that exited or failed `TA_HEALTH_FAILURES` probes in a row leaves the
+rotation. Its unanswered students get an error, and it is restarted with
+exponential backoff. Worker i listens on `TA_WORKER_BASE_PORT + i` and
+serves metrics on `METRICS_PORT + 1 + i`. Arguments after `--` are passed to
+every worker.
+"""
+import sys
+import os
+# Add project root to sys.path to allow sibling imports
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import time
+import atexit
+import asyncio
+import logging
+import signal
+import argparse
+import subprocess
+import aiohttp
+from uagents import Agent, Context
+
+from src.models import (StudentQuery, TAResponse, TAResponseChunk, ErrorResponse,
+                        BatchStudentQuery, BatchTAResponse)
+from src.routing import (Router, WorkerSpec, worker_specs, LocalFirstResolver,
+                         local_endpoints, ROUTING_MODES)
+from utils.logging_conf import setup_logging, start_metrics_server, count
+import config
+
+AGENT_SCRIPT = os.path.join(os.path.dirname(os.path.abspath(__file__)), "ta_agent.py")
+
+RESTART_BACKOFF_MAX = 60            # seconds between restarts of a crash-looping worker
+STABLE_AFTER        = 300           # uptime (s) after which a crash restarts immediately again
+PROBE_TIMEOUT       = 2.0
+
+NO_WORKER_MESSAGE = "The TA is restarting right now, please try again in a moment."
+RESTARTED_MESSAGE = "The TA worker answering your question restarted, please ask again."
+
+logger = logging.getLogger("askademia.supervisor")
+
+class WorkerProcess:
+    """One `ta_agent.py` child process and its health / restart state."""
+
+    def __init__(self, spec: WorkerSpec, env: dict[str, str], args: list[str]):
+        self.spec       = spec
+        self.env        = env
+        self.args       = args
+        self.proc       = None
+        self.started    = 0.0
+        self.ready      = False     # answered a readiness probe since it started
+        self.failures   = 0         # failed probes in a row
+        self.restarts   = 0         # recent restarts, drives the backoff
+        self.next_start = 0.0
+
+    def start(self):
+        self.proc     = subprocess.Popen([sys.executable, AGENT_SCRIPT, *self.args],
+                                         env={**os.environ, **self.env, **self.spec.env()})
+        self.started  = time.monotonic()
+        self.ready    = False
+        self.failures = 0
+        logger.info(f"Started worker {self.spec.index} (pid {self.proc.pid}, port {self.spec.port})")
+
+    def alive(self) -> bool:
+        return self.proc is not None and self.proc.poll() is None
+
+    def terminate(self):
+        if self.alive():
+            self.proc.terminate()
+
+    def stop(self, timeout: float = 10.0):
+        self.terminate()
+        if self.proc is not None:
+            try:
+                self.proc.wait(timeout)
+            except subprocess.TimeoutExpired:
+                self.proc.kill()
+
+    def schedule_restart(self):
+        if time.monotonic() - self.started > STABLE_AFTER:
+            self.restarts = 0
+        delay = min(RESTART_BACKOFF_MAX, 2 ** self.restarts - 1)
+        self.restarts  += 1
+        self.proc       = None
+        self.next_start = time.monotonic() + delay
+        logger.warning(f"Restarting worker {self.spec.index} in {delay}s")
+
+    async def probe(self, session: aiohttp.ClientSession) -> bool:
+        """uagents readiness probe: HEAD /submit naming the agent's address."""
+        try:
+            async with session.head(self.spec.endpoint, headers={"x-uagents-address": self.spec.address},
+                                    timeout=aiohttp.ClientTimeout(total=PROBE_TIMEOUT)) as resp:
+                return resp.headers.get("x-uagents-status") == "ready"
+        except (aiohttp.ClientError, TimeoutError):
+            return False
+
+class Relay:
+    """Student waiting on replies within one uagents session."""
+
+    def __init__(self, student: str):
+        self.student = student
+        self.workers = []           # (worker index, request_id) per unanswered query
+        self.updated = time.monotonic()
+        self.lock    = asyncio.Lock()   # FIFO: relayed chunks keep their order
+
+class Supervisor:
+    def __init__(self, n_workers: int, routing: str, worker_args: list[str], router_address: str):
+        self.specs   = worker_specs(n_workers)
+        self.router  = Router(self.specs, routing)
+        self.router.healthy.clear()            # nobody is in rotation until it is ready
+        env = {"TA_ROUTER_ADDRESS": router_address, "TA_ROUTER_ENDPOINT": config.TA_AGENT_ENDPOINT}
+        self.workers = [WorkerProcess(s, env, worker_args) for s in self.specs]
+        self.by_address = {s.address: s.index for s in self.specs}
+        self.pending = {}                      # uagents session -> Relay
+
+    # --- Relaying ---
+    async def forward(self, ctx: Context, sender: str, msg):
+        worker = self.router.pick(msg.course_id or config.DEFAULT_COURSE_ID)
+        if worker is None:
+            count("askademia_router_rejected_total")
+            await ctx.send(sender, ErrorResponse(error=NO_WORKER_MESSAGE, request_id=msg.request_id))
+            return
+        relay = self.pending.setdefault(ctx.session, Relay(sender))
+        relay.workers.append((worker.index, msg.request_id))
+        relay.updated = time.monotonic()
+        count("askademia_router_forwarded_total", worker=worker.index)
+        if isinstance(msg, StudentQuery):       # workers only see the router as sender
+            msg = msg.copy(update={"session_id": sender})
+        await ctx.send(worker.address, msg)
+
+    async def reply(self, ctx: Context, sender: str, msg):
+        index = self.by_address.get(sender)
+        relay = self.pending.get(ctx.session)
+        if index is None or relay is None:
+            logger.warning(f"Dropping {type(msg).__name__} from {sender}: no waiting student")
+            return
+        async with relay.lock:
+            await ctx.send(relay.student, msg)
+        relay.updated = time.monotonic()
+        final = not isinstance(msg, TAResponseChunk) or msg.final
+        if final and (index, msg.request_id) in relay.workers:
+            relay.workers.remove((index, msg.request_id))
+            if not relay.workers:
+                self.pending.pop(ctx.session, None)
+
+    # --- Health ---
+    async def _fail(self, ctx: Context, worker: WorkerProcess):
+        index = worker.spec.index
+        self.router.healthy.discard(index)
+        worker.stop()
+        worker.schedule_restart()
+        count("askademia_worker_restarts_total", worker=index)
+        for session, relay in list(self.pending.items()):
+            for i, request_id in relay.workers:
+                if i == index:
+                    await ctx.send(relay.student, ErrorResponse(error=RESTARTED_MESSAGE, request_id=request_id))
+            relay.workers = [w for w in relay.workers if w[0] != index]
+            if not relay.workers:
+                del self.pending[session]
+
+    async def check(self, ctx: Context):
+        now = time.monotonic()
+        async with aiohttp.ClientSession() as session:
+            for w in self.workers:
+                index = w.spec.index
+                if w.proc is None:
+                    if now >= w.next_start:
+                        w.start()
+                    continue
+                if not w.alive():
+                    logger.error(f"Worker {index} exited with code {w.proc.returncode}")
+                    await self._fail(ctx, w)
+                    continue
+                if await w.probe(session):
+                    if not w.ready:
+                        logger.info(f"Worker {index} is ready ({now - w.started:.1f}s after start)")
+                    w.ready, w.failures = True, 0
+                    self.router.healthy.add(index)
+                elif w.ready or now - w.started > config.TA_WORKER_START_GRACE:
+                    w.failures += 1
+                    self.router.healthy.discard(index)
+                    logger.warning(f"Worker {index} failed health check ({w.failures}/{config.TA_HEALTH_FAILURES})")
+                    if w.failures >= config.TA_HEALTH_FAILURES:
+                        await self._fail(ctx, w)
+
+        for session, relay in list(self.pending.items()):
+            if now - relay.updated > config.TA_RELAY_TIMEOUT:
+                del self.pending[session]
+
+    def start_all(self):
+        for w in self.workers:
+            w.start()
+
+    def stop_all(self):
+        for w in self.workers:
+            w.terminate()
+        for w in self.workers:
+            w.stop()
+
+def create_router(n_workers: int, routing: str, worker_args: list[str]) -> tuple[Agent, Supervisor]:
+    """The router agent (the TA's public identity) and the supervisor behind it."""
+    routes = local_endpoints()
+    routes.update({s.address: s.endpoint for s in worker_specs(n_workers)})
+    agent = Agent(
+        name=config.TA_AGENT_NAME,
+        seed=config.TA_AGENT_SEED,
+        port=config.TA_AGENT_PORT,
+        endpoint=config.TA_AGENT_ENDPOINT,
+        resolve=LocalFirstResolver(routes),
+        handle_messages_concurrently=True,
+    )
+    sup = Supervisor(n_workers, routing, worker_args, agent.address)
+
+    @agent.on_message(model=StudentQuery)
+    async def route_query(ctx: Context, sender: str, msg: StudentQuery):
+        await sup.forward(ctx, sender, msg)
+
+    @agent.on_message(model=BatchStudentQuery)
+    async def route_batch(ctx: Context, sender: str, msg: BatchStudentQuery):
+        await sup.forward(ctx, sender, msg)
+
+    for model in (TAResponse, TAResponseChunk, ErrorResponse, BatchTAResponse):
+        agent.on_message(model=model)(sup.reply)
+
+    @agent.on_interval(period=config.TA_HEALTH_INTERVAL)
+    async def health_check(ctx: Context):
+        await sup.check(ctx)
+
+    @agent.on_event("shutdown")
+    async def stop_workers(ctx: Context):
+        sup.stop_all()
+
+    return agent, sup
+
+if __name__ == "__main__":
+    ap = argparse.ArgumentParser(description="Run TA agent workers behind a routing agent.",
+                                 usage="%(prog)s [options] [-- worker options]")
+    ap.add_argument("--workers", type=int, default=0, help="worker processes (default: TA_WORKERS or CPU count)")
+    ap.add_argument("--routing", choices=ROUTING_MODES, default=config.TA_ROUTING)
+    argv = sys.argv[1:]
+    worker_args = argv[argv.index("--") + 1:] if "--" in argv else []
+    args = ap.parse_args(argv[:argv.index("--")] if "--" in argv else argv)
+
+    setup_logging(logging.INFO)
+    agent, sup = create_router(args.workers, args.routing, worker_args)
+    sup.start_all()                 # workers boot while the router starts up
+    atexit.register(sup.stop_all)
+    signal.signal(signal.SIGTERM, lambda *_: sys.exit(0))   # runs the atexit hook
+    if config.METRICS_PORT:
+        start_metrics_server(config.METRICS_PORT)
+
+    logger.info(f"Router address: {agent.address} (port {config.TA_AGENT_PORT})")
+    logger.info(f"{len(sup.workers)} workers on ports {sup.specs[0].port}-{sup.specs[-1].port}, "
+                f"routing: {args.routing}")
+    agent.run()
@@ -4,15 +4,24 @@ import os
 project_root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
 sys.path.append(project_root)
 
+import time
+_process_start = time.perf_counter()    # cold-start measurement
+
 import logging
+import argparse
 from uagents import Agent, Context, Protocol
 from uagents.setup import fund_agent_if_low
 
 # Import RAG components and models
-from src.rag_handler import retrieve_context
-from src.gemini_handler import generate_response
-from prompts.ta_system_prompts import TA_SYSTEM_PROMPT
-from src.models import StudentQuery, TAResponse, ErrorResponse
+from src.pipeline import answer_query, answer_batch, stream_answer, answer_cache, stats as pipeline_stats
+from src.models import (StudentQuery, TAResponse, TAResponseChunk, ErrorResponse,
+                        BatchStudentQuery, BatchTAResponse, BatchAnswer)
+from src.conversation import ConversationMemory
+from src.warmup import warm_up
+from src.routing import LocalFirstResolver, NoRegistration, local_endpoints
+from embeddings import embedder
+from utils.logging_conf import setup_logging, start_metrics_server, trace, span
+from utils import fakes
 
 # Import configuration
 import config
@@ -23,18 +32,42 @@ AGENT_SEED = config.TA_AGENT_SEED
 AGENT_PORT = config.TA_AGENT_PORT
 AGENT_ENDPOINT = config.TA_AGENT_ENDPOINT
 
-# Initialize Logger
-logging.basicConfig(level=logging.INFO)
+# Initialize Logger (and the sampled trace log, see utils/logging_conf.py)
+setup_logging(logging.INFO)
 logger = logging.getLogger(AGENT_NAME)
 
+# Fixed local routes (LOCAL_AGENT_ENDPOINTS). Started by src/supervisor.py as
+# one of several workers, replies go to the router at a known endpoint and the
+# worker is not registered on the Almanac.
+agent_options = {}
+local_routes  = local_endpoints()
+if config.TA_ROUTER_ADDRESS:
+    local_routes[config.TA_ROUTER_ADDRESS] = config.TA_ROUTER_ENDPOINT
+    agent_options["registration_policy"] = NoRegistration()
+if local_routes:
+    agent_options["resolve"] = LocalFirstResolver(local_routes)
+
 # Initialize Agent
 ta_agent = Agent(
     name=AGENT_NAME,
     seed=AGENT_SEED,
     port=AGENT_PORT, # Set the agent's port
-    endpoint=AGENT_ENDPOINT # Set the agent's endpoint
+    endpoint=AGENT_ENDPOINT, # Set the agent's endpoint
+    # the pipeline bounds concurrency itself; without this uagents awaits one message at a time
+    handle_messages_concurrently=True,
+    **agent_options
 )
 
+# Follow-up questions: per-student sessions (see src/conversation.py)
+memory = ConversationMemory(
+    history_tokens=config.CONVERSATION_HISTORY_TOKENS,
+    summary_tokens=config.CONVERSATION_SUMMARY_TOKENS,
+    idle_ttl=config.CONVERSATION_IDLE_TTL,
+    max_sessions=config.CONVERSATION_MAX_SESSIONS,
+    max_bytes=int(config.CONVERSATION_MAX_MB * (1 << 20)),
+    reuse_threshold=config.CONVERSATION_REUSE_THRESHOLD
+) if config.CONVERSATION_ENABLED else None
+
 # Fund agent on Testnet if needed (optional, for network interaction)
 # fund_agent_if_low(ta_agent.wallet.address())
 
@@ -44,45 +77,104 @@ ta_agent = Agent(
 # ta_protocol = Protocol("TAInteraction")
 
 # --- Message Handler ---
+def _session(sender: str, msg: StudentQuery) -> str:
+    """Whose conversation *msg* continues: the student behind the router, else the sender."""
+    if config.TA_ROUTER_ADDRESS and sender == config.TA_ROUTER_ADDRESS and msg.session_id:
+        return msg.session_id
+    return sender
+
+def _tag(reply, request_id: str | None):
+    """Copy of *reply* carrying the query's request_id (pipeline results may be shared)."""
+    return reply if request_id is None else reply.copy(update={"request_id": request_id})
+
 @ta_agent.on_message(model=StudentQuery)
 async def handle_student_query(ctx: Context, sender: str, msg: StudentQuery):
     logger.info(f"Received query from {sender}: '{msg.query}'")
 
-    # 1. Retrieve Context
-    logger.info("Retrieving context...")
-    context = retrieve_context(msg.query)
-    
-    # Handle retrieval errors
-    if context.startswith("Error") or context.startswith("No relevant context"):
-        logger.warning(f"Context retrieval issue: {context}")
-        await ctx.send(sender, ErrorResponse(error=context))
-        return
-    
-    logger.info(f"Retrieved context successfully. Snippet: {context[:100]}...")
-
-    # 2. Generate Response
-    logger.info("Generating response using Gemini...")
-    final_response_text = generate_response(
-        system_prompt=TA_SYSTEM_PROMPT,
-        user_query=msg.query,
-        context=context
-    )
-
-    # Handle generation errors (generate_response returns specific strings on error)
-    if final_response_text.startswith("Sorry") or final_response_text.startswith("I could not"):
-        logger.error(f"Gemini generation failed: {final_response_text}")
-        await ctx.send(sender, ErrorResponse(error=final_response_text))
-        return
-    
-    # 3. Send Response
-    logger.info(f"Sending response to {sender}")
-    await ctx.send(sender, TAResponse(answer=final_response_text))
+    course_id = msg.course_id or config.DEFAULT_COURSE_ID
+    turn = memory.begin(_session(sender, msg), course_id, msg.query) if memory is not None else None
+    with trace("student_query", sender=sender, stream=msg.stream, course_id=course_id,
+               followup=turn is not None and turn.followup):
+        # Embed / retrieve / generate run off the event loop (see src/pipeline.py),
+        # so other students' messages keep being handled meanwhile
+        if msg.stream:
+            parts, answered = [], False
+            async for part in stream_answer(msg.query, course_id, turn):
+                if isinstance(part, TAResponseChunk):
+                    parts.append(part.text)
+                    answered = part.final
+                with span("send"):
+                    await ctx.send(sender, _tag(part, msg.request_id))
+            if turn is not None and answered:
+                memory.commit(turn, "".join(parts))
+            logger.info(f"Finished streaming response to {sender}")
+            return
+
+        response = await answer_query(msg.query, course_id, turn)
+        if turn is not None and isinstance(response, TAResponse):
+            memory.commit(turn, response.answer)
+
+        if isinstance(response, ErrorResponse):
+            logger.warning(f"Sending error to {sender}: {response.error}")
+        else:
+            logger.info(f"Sending response to {sender}")
+        with span("send"):
+            await ctx.send(sender, _tag(response, msg.request_id))
+
+@ta_agent.on_message(model=BatchStudentQuery)
+async def handle_batch_query(ctx: Context, sender: str, msg: BatchStudentQuery):
+    logger.info(f"Received batch of {len(msg.queries)} queries from {sender}")
+
+    course_id = msg.course_id or config.DEFAULT_COURSE_ID
+    with trace("batch_query", sender=sender, size=len(msg.queries), course_id=course_id):
+        results = await answer_batch(msg.queries, course_id)
+        reply = BatchTAResponse(results=[
+            BatchAnswer(error=r.error) if isinstance(r, ErrorResponse) else BatchAnswer(answer=r.answer)
+            for r in results], request_id=msg.request_id)
+
+        failed = sum(1 for r in reply.results if r.error is not None)
+        logger.info(f"Sending batch response to {sender} ({len(results) - failed} answered, {failed} failed)")
+        with span("send"):
+            await ctx.send(sender, reply)
+
+@ta_agent.on_interval(period=300.0)
+async def log_cache_stats(ctx: Context):
+    logger.info(f"Pipeline stats: {pipeline_stats}")
+    # Hit/miss counters, used to tune ANSWER_CACHE_THRESHOLD
+    if config.ANSWER_CACHE_ENABLED:
+        logger.info(f"Answer cache stats: {answer_cache.stats()}")
+    embed_cache = embedder.get_cache()
+    if embed_cache is not None:
+        logger.info(f"Embedding cache stats: {embed_cache.stats()}")
+    if memory is not None:
+        logger.info(f"Conversation stats: {memory.stats()}")
+
+@ta_agent.on_interval(period=60.0)
+async def expire_conversations(ctx: Context):
+    if memory is not None and (n := memory.expire()):
+        logger.info(f"Forgot {n} idle conversations")
 
 # --- Run Logic (typically in a separate main.py) ---
 # This part would usually be in a main script
 if __name__ == "__main__":
+    ap = argparse.ArgumentParser(description="Askademia TA agent.")
+    fakes.add_arguments(ap)
+    args = ap.parse_args()
+    if fakes.install_from_args(args):
+        logger.info(f"Serving from local fakes ({args.corpus_size} chunks)")
+
     logger.info(f"TA Agent Name: {AGENT_NAME}")
     logger.info(f"TA Agent Address: {ta_agent.address}")
     logger.info(f"TA Agent Configured Endpoint: {AGENT_ENDPOINT}")
+    if config.METRICS_PORT:
+        start_metrics_server(config.METRICS_PORT)
+        logger.info(f"Metrics available at http://localhost:{config.METRICS_PORT}/metrics")
+
+    # Warm up before the server starts, so no message waits on client setup
+    imports_ms = (time.perf_counter() - _process_start) * 1000
+    timings = warm_up() if config.TA_WARMUP else {}
+    total_ms = (time.perf_counter() - _process_start) * 1000
+    logger.info(f"Cold start: {total_ms:.0f} ms (imports {imports_ms:.0f} ms, warm-up "
+                + ", ".join(f"{k} {v:.0f} ms" for k, v in timings.items()) + ")")
     logger.info(f"Starting TA Agent '{AGENT_NAME}' on port {AGENT_PORT}...")
     ta_agent.run() # This will block and run the agent
\ No newline at end of file
@@ -0,0 +1,43 @@
+"""
+Optional warm-up phase for the TA agent.
+
+Importing the pipeline no longer touches the network; clients are built on
+first use. `warm_up()` front-loads that cost (Mongo pool handshake, Gemini
+embed connection, chat model setup) so the first student does not pay it.
+"""
+import sys
+import os
+# Add project root to sys.path to allow sibling imports
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import logging
+import time
+
+from db import mongo_client, lexical_index
+from embeddings import embedder
+from src import gemini_handler
+
+logger = logging.getLogger(__name__)
+
+STAGES = {
+    "mongo":  mongo_client.warm_up,
+    "embed":  embedder.warm_up,
+    "gemini": gemini_handler.warm_up,
+    "lexical": lexical_index.get_index,
+}
+
+def warm_up(stages=tuple(STAGES)) -> dict[str, float]:
+    """
+    Run the given warm-up stages; returns {stage: milliseconds}.
+    A failing stage is logged and skipped, the agent still starts (the
+    client is then created on the first real request instead).
+    """
+    timings = {}
+    for name in stages:
+        start = time.perf_counter()
+        try:
+            STAGES[name]()
+        except Exception as e:
+            logger.warning(f"Warm-up stage '{name}' failed: {e}")
+        timings[name] = (time.perf_counter() - start) * 1000
+    return timings
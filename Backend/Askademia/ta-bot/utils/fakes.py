@@ -0,0 +1,387 @@
+"""
+Deterministic local stand-ins for the external services used by the RAG
+pipeline: the Gemini embedder, MongoDB (including Atlas `$vectorSearch`)
+and Gemini generation. Every fake can inject latency so benchmarks and load
+tests see realistic stage costs without network access.
+
+    from utils import fakes
+    fakes.install(corpus_size=10_000, embed_latency=0.05, gen_ttft=0.8)
+
+Entry points that can run on the fakes (app.py, src/ta_agent.py) take the
+same `--fake ...` options via `add_arguments()` / `install_from_args()`.
+
+`install()` swaps the shared clients behind `gemini_client.get_client()`
+and `mongo_client.get_client()`, so the real pipeline code - including the
+rate limiter and retry layer - runs unchanged on top of the fakes.
+"""
+import sys
+import os
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import time
+import zlib
+import threading
+from types import SimpleNamespace
+import numpy as np
+
+DIM = 768
+
+# Every synthetic chunk shares this ~800 token body, so a 1M chunk corpus
+# only costs the vector matrix in memory
+FILLER = " ".join(["course material lecture week topic assignment exam"] * 110)
+
+def _sleep(seconds: float, jitter: float = 0.0):
+    if seconds > 0:
+        time.sleep(seconds * (1 + jitter * (np.random.random() * 2 - 1)))
+
+def text_vector(text: str, dim: int = DIM) -> np.ndarray:
+    """Unit vector seeded by the text, identical for identical input."""
+    rng = np.random.default_rng(zlib.crc32(text.encode("utf-8")))
+    v = rng.standard_normal(dim).astype(np.float32)
+    return v / np.linalg.norm(v)
+
+# --- Embedding (google.genai Client) ---
+class FakeEmbedClient:
+    """Mimics `genai.Client().models.embed_content` for single and batch calls."""
+
+    def __init__(self, dim: int = DIM, latency: float = 0.0, jitter: float = 0.0):
+        self.dim     = dim
+        self.latency = latency
+        self.jitter  = jitter
+        self.calls   = 0
+        self.models  = self
+
+    def embed_content(self, model: str, contents, config=None):
+        self.calls += 1
+        _sleep(self.latency, self.jitter)
+        texts = [contents] if isinstance(contents, str) else list(contents)
+        return SimpleNamespace(embeddings=[SimpleNamespace(values=text_vector(t, self.dim).tolist())
+                                           for t in texts])
+
+# --- MongoDB ---
+class FakeCollection:
+    """
+    In-memory collection. Plain documents support the handful of pymongo
+    calls the project uses; vector documents live in a float32 matrix and are
+    searched exactly by `aggregate([{"$vectorSearch": ...}, {"$project": ...}])`.
+    """
+
+    ROWS_PER_FILE = 500
+
+    def __init__(self, name: str, latency: float = 0.0, jitter: float = 0.0):
+        self.name    = name
+        self.latency = latency
+        self.jitter  = jitter
+        self.docs    = []
+        self.vectors = None                   # [N, D] unit rows for synthetic chunks
+        self.courses = 1                      # synthetic row i belongs to course C{i % courses}
+        self._small  = {}                     # dim -> truncated, renormalised rows (embedding_small)
+        self._lock   = threading.Lock()
+        self._next_id = 0
+
+    @classmethod
+    def synthetic(cls, name: str, size: int, dim: int = DIM, courses: int = 1,
+                  seed: int = 0, **kw) -> "FakeCollection":
+        coll = cls(name, **kw)
+        rng  = np.random.default_rng(seed)
+        vecs = np.empty((size, dim), dtype=np.float32)
+        for start in range(0, size, 100_000):     # bounded temporaries for large corpora
+            block = rng.standard_normal((min(100_000, size - start), dim), dtype=np.float32)
+            vecs[start:start + len(block)] = block / np.linalg.norm(block, axis=1, keepdims=True)
+        coll.vectors = vecs
+        coll.courses = courses
+        return coll
+
+    def chunk_text(self, row: int) -> str:
+        return f"Synthetic chunk {row}. {FILLER}"
+
+    def row_meta(self, row: int) -> dict:
+        return {"course_id": f"C{row % self.courses}", "file": f"doc{row // self.ROWS_PER_FILE}.pdf",
+                "chunk_index": row % self.ROWS_PER_FILE}
+
+    def _row_mask(self, flt: dict) -> np.ndarray:
+        """Vectorised filter over synthetic rows (course_id / file equality)."""
+        rows = np.arange(len(self.vectors))
+        mask = np.ones(len(rows), dtype=bool)
+        for k, v in (flt or {}).items():
+            if k == "course_id":
+                mask &= (rows % self.courses) == int(v[1:]) if v.startswith("C") and v[1:].isdigit() else False
+            elif k == "file":
+                mask &= (rows // self.ROWS_PER_FILE) == int(v[3:-4]) if v[3:-4].isdigit() else False
+            else:
+                mask &= False
+        return mask
+
+    # -- vector search --
+    def small_vectors(self, dim: int) -> np.ndarray:
+        """`embedding_small` of the synthetic rows (first *dim* dimensions, renormalised)."""
+        if dim not in self._small:
+            head = self.vectors[:, :dim]
+            self._small[dim] = head / np.linalg.norm(head, axis=1, keepdims=True)
+        return self._small[dim]
+
+    def _vector_search(self, spec: dict, with_vectors: bool = False) -> list[dict]:
+        q = np.asarray(spec["queryVector"], dtype=np.float32)
+        q = q / (np.linalg.norm(q) or 1.0)
+        vectors = self.small_vectors(len(q)) if spec.get("path") == "embedding_small" else self.vectors
+        sims = vectors @ q
+        if spec.get("filter"):
+            sims = np.where(self._row_mask(spec["filter"]), sims, -np.inf)
+        k   = min(spec.get("limit", 10), len(sims))
+        top = np.argpartition(-sims, k - 1)[:k]
+        top = top[np.argsort(-sims[top])]
+        rows = []
+        for i in top:
+            if not np.isfinite(sims[i]):
+                continue
+            row = {"_id": int(i), "chunk": self.chunk_text(int(i)), **self.row_meta(int(i)),
+                   "score": float((1 + sims[i]) / 2)}
+            if with_vectors:
+                row["embedding"] = self.vectors[i].tolist()
+            rows.append(row)
+        return rows
+
+    def aggregate(self, pipeline: list[dict]):
+        _sleep(self.latency, self.jitter)
+        wanted = [k for st in pipeline[1:] for k, v in st.get("$project", {}).items() if v]
+        rows = self._vector_search(pipeline[0]["$vectorSearch"], "embedding" in wanted)
+        for stage in pipeline[1:]:
+            if "$project" in stage:
+                keep = {k for k, v in stage["$project"].items() if v and k != "_id"}
+                rows = [{k: r[k] for k in keep if k in r} for r in rows]
+            elif "$limit" in stage:
+                rows = rows[:stage["$limit"]]
+        return iter(rows)
+
+    # -- plain documents --
+    @staticmethod
+    def _matches(doc: dict, flt: dict) -> bool:
+        def ok(value, cond):
+            if isinstance(cond, dict) and "$in" in cond:
+                return value in cond["$in"]
+            return value == cond
+        return all(ok(doc.get(k), v) for k, v in (flt or {}).items())
+
+    def insert_many(self, docs, ordered=True):
+        _sleep(self.latency, self.jitter)
+        with self._lock:
+            for d in docs:                    # pymongo sets _id on the caller's dicts too
+                if "_id" not in d:
+                    d["_id"] = self._next_id
+                    self._next_id += 1
+                self.docs.append(dict(d))
+        return SimpleNamespace(inserted_ids=[d["_id"] for d in docs])
+
+    def insert_one(self, doc):
+        return self.insert_many([doc])
+
+    def find(self, flt=None, projection=None, **kw):
+        docs = [d for d in self.docs if self._matches(d, flt)]
+        if self.vectors is not None:          # synthetic rows, vectors only when projected
+            with_vectors = bool((projection or {}).get("embedding"))
+            for i in np.flatnonzero(self._row_mask(flt)):
+                row = {"_id": int(i), "chunk": self.chunk_text(int(i)), **self.row_meta(int(i))}
+                if with_vectors:
+                    row["embedding"] = self.vectors[i].tolist()
+                docs.append(row)
+        return iter(docs)
+
+    def find_one(self, flt=None, projection=None, **kw):
+        return next((d for d in self.docs if self._matches(d, flt)), None)
+
+    def find_one_and_update(self, flt, update, upsert=False, return_document=None, **kw):
+        with self._lock:
+            doc = self.find_one(flt)
+            if doc is None:
+                if not upsert:
+                    return None
+                doc = dict(flt)
+                self.docs.append(doc)
+            for k, v in update.get("$inc", {}).items():
+                doc[k] = doc.get(k, 0) + v
+            doc.update(update.get("$set", {}))
+            for k in update.get("$unset", {}):
+                doc.pop(k, None)
+            return dict(doc)
+
+    def update_one(self, flt, update, upsert=False):
+        self.find_one_and_update(flt, update, upsert=upsert)
+
+    def bulk_write(self, requests, ordered=True):
+        _sleep(self.latency, self.jitter)
+        for r in requests:                    # pymongo UpdateOne / DeleteOne
+            doc = getattr(r, "_doc", None)
+            if doc is not None:
+                self.update_one(r._filter, doc, upsert=bool(r._upsert))
+            else:
+                self.delete_many(r._filter)
+
+    def delete_many(self, flt):
+        with self._lock:
+            before    = len(self.docs)
+            self.docs = [d for d in self.docs if not self._matches(d, flt)]
+        return SimpleNamespace(deleted_count=before - len(self.docs))
+
+    def count_documents(self, flt=None):
+        n = sum(1 for d in self.docs if self._matches(d, flt))
+        if self.vectors is not None:
+            n += int(self._row_mask(flt).sum())
+        return n
+
+    def distinct(self, key, flt=None):
+        vals = {d.get(key) for d in self.docs if self._matches(d, flt)}
+        if self.vectors is not None:
+            vals |= {self.row_meta(int(i))[key] for i in np.flatnonzero(self._row_mask(flt))
+                     if key in ("course_id", "file")}
+        return sorted(v for v in vals if v is not None)
+
+class SyntheticRecords:
+    """Lazy `[{"chunk", "course_id", "file"}]` view of a synthetic collection's rows."""
+
+    def __init__(self, coll: FakeCollection):
+        self.coll = coll
+
+    def __len__(self):
+        return len(self.coll.vectors)
+
+    def __getitem__(self, row):
+        row = int(row)
+        return {"chunk": self.coll.chunk_text(row), **self.coll.row_meta(row)}
+
+class FakeDatabase:
+    def __init__(self, name: str, latency: float = 0.0, jitter: float = 0.0):
+        self.name        = name
+        self.latency     = latency
+        self.jitter      = jitter
+        self.collections = {}
+
+    def __getitem__(self, name: str) -> FakeCollection:
+        if name not in self.collections:
+            self.collections[name] = FakeCollection(name, self.latency, self.jitter)
+        return self.collections[name]
+
+    def list_collection_names(self):
+        return list(self.collections)
+
+class FakeMongoClient:
+    def __init__(self, latency: float = 0.0, jitter: float = 0.0):
+        self.latency   = latency
+        self.jitter    = jitter
+        self.databases = {}
+        self.admin     = SimpleNamespace(command=lambda *a, **kw: {"ok": 1.0})
+
+    def __getitem__(self, name: str) -> FakeDatabase:
+        if name not in self.databases:
+            self.databases[name] = FakeDatabase(name, self.latency, self.jitter)
+        return self.databases[name]
+
+# --- Generation (google.genai Client) ---
+class FakeGenerativeModel:
+    """
+    Mimics `models.generate_content` / `generate_content_stream`, with *ttft*
+    seconds before the first token and *token_latency* per further token of a
+    fixed answer.
+    """
+
+    def __init__(self, ttft: float = 0.0, token_latency: float = 0.0,
+                 output_tokens: int = 200, jitter: float = 0.0):
+        self.ttft          = ttft
+        self.token_latency = token_latency
+        self.output_tokens = output_tokens
+        self.jitter        = jitter
+        self.calls         = 0
+
+    def _tokens(self, prompt: str) -> list[str]:
+        seed = zlib.crc32(prompt.encode("utf-8")) % 1000
+        return [f"tok{(seed + i) % 1000} " for i in range(self.output_tokens)]
+
+    def _chunk(self, text: str, prompt: str, done: int, last: bool):
+        usage = SimpleNamespace(prompt_token_count=len(prompt) // 4, candidates_token_count=done,
+                                total_token_count=len(prompt) // 4 + done)
+        return SimpleNamespace(text=text, prompt_feedback=None, usage_metadata=usage,
+                               candidates=[SimpleNamespace(finish_reason="STOP" if last else None)])
+
+    def generate_content(self, model: str, contents: str, config=None):
+        self.calls += 1
+        tokens = self._tokens(contents)
+        _sleep(self.ttft + self.token_latency * len(tokens), self.jitter)
+        return self._chunk("".join(tokens), contents, len(tokens), last=True)
+
+    def generate_content_stream(self, model: str, contents: str, config=None, per_chunk: int = 20):
+        self.calls += 1
+        tokens = self._tokens(contents)
+        _sleep(self.ttft, self.jitter)
+        for i in range(0, len(tokens), per_chunk):
+            if i:
+                _sleep(self.token_latency * per_chunk, self.jitter)
+            end = min(i + per_chunk, len(tokens))
+            yield self._chunk("".join(tokens[i:end]), contents, end, last=end == len(tokens))
+
+class FakeGenaiClient:
+    """`genai.Client` stand-in: `client.models` routes to the embed and generation fakes."""
+
+    def __init__(self, embedder: FakeEmbedClient, model: FakeGenerativeModel):
+        self.embedder = embedder
+        self.model    = model
+        self.models   = self
+
+    def embed_content(self, model: str, contents, config=None):
+        return self.embedder.embed_content(model, contents, config)
+
+    def generate_content(self, model: str, contents: str, config=None):
+        return self.model.generate_content(model, contents, config)
+
+    def generate_content_stream(self, model: str, contents: str, config=None):
+        return self.model.generate_content_stream(model, contents, config)
+
+    def get(self, model: str):
+        return SimpleNamespace(name=model)
+
+# --- Installation ---
+def install(corpus_size: int = 10_000, dim: int = DIM, courses: int = 1,
+            embed_latency: float = 0.0, search_latency: float = 0.0,
+            gen_ttft: float = 0.0, gen_token_latency: float = 0.0,
+            output_tokens: int = 200, jitter: float = 0.0) -> SimpleNamespace:
+    """
+    Replace the shared Gemini/Mongo clients with fakes backed by a synthetic
+    corpus of *corpus_size* chunks. Returns the installed fakes.
+    """
+    from db import mongo_client
+    from utils import gemini_client
+
+    mongo = FakeMongoClient(latency=search_latency, jitter=jitter)
+    db    = mongo[mongo_client.DB_NAME]
+    db.collections["syllabus_chunks"] = FakeCollection.synthetic(
+        "syllabus_chunks", corpus_size, dim=dim, courses=courses,
+        latency=search_latency, jitter=jitter)
+
+    fakes = SimpleNamespace(
+        mongo    = mongo,
+        embedder = FakeEmbedClient(dim=dim, latency=embed_latency, jitter=jitter),
+        model    = FakeGenerativeModel(ttft=gen_ttft, token_latency=gen_token_latency,
+                                       output_tokens=output_tokens, jitter=jitter),
+    )
+    fakes.genai = FakeGenaiClient(fakes.embedder, fakes.model)
+    mongo_client._client  = fakes.mongo
+    gemini_client._client = fakes.genai
+    return fakes
+
+def add_arguments(ap):
+    """`--fake` and the fake latency options, for an entry point's argparse parser."""
+    ap.add_argument("--fake", action="store_true", help="serve from local fakes (utils/fakes.py)")
+    ap.add_argument("--corpus-size", type=int, default=10_000, help="fake corpus chunks")
+    ap.add_argument("--embed-ms", type=float, default=50, help="fake embed latency")
+    ap.add_argument("--search-ms", type=float, default=30, help="fake $vectorSearch latency")
+    ap.add_argument("--ttft-ms", type=float, default=800, help="fake time to first token")
+    ap.add_argument("--token-ms", type=float, default=10, help="fake latency per output token")
+
+def install_from_args(args) -> SimpleNamespace | None:
+    """Install the fakes if `--fake` was given; queries then default to course C0."""
+    if not args.fake:
+        return None
+    import config
+    installed = install(corpus_size=args.corpus_size, embed_latency=args.embed_ms / 1000,
+                        search_latency=args.search_ms / 1000, gen_ttft=args.ttft_ms / 1000,
+                        gen_token_latency=args.token_ms / 1000, jitter=0.2)
+    config.DEFAULT_COURSE_ID = "C0"                 # the synthetic corpus' only course
+    return installed
@@ -0,0 +1,294 @@
+"""
+Shared Gemini access for embedding and generation.
+
+One `google.genai` Client per process (pooled HTTPS connections) behind:
+
+* token buckets for requests/min and tokens/min per model family
+  (`embed`, `generate`), matching the API's quotas,
+* a concurrency cap per call type (`query_embed`, `ingest_embed`,
+  `generate`); ingestion embeds also leave `GEMINI_INGEST_RESERVE` of the
+  embed budget untouched so a bulk load cannot starve live questions,
+* jittered exponential backoff on 429 / 5xx / transient network errors,
+  honouring Retry-After,
+* a deadline per call, also passed to the SDK as the request timeout.
+
+    from utils import gemini_client
+    vectors  = gemini_client.embed(["text", ...], kind="query_embed")
+    response = gemini_client.generate(prompt, generation_config, safety_settings)
+
+Point `GEMINI_BASE_URL` at `utils/gemini_standin.py` to exercise the
+throttling paths locally.
+"""
+import sys
+import os
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import time
+import random
+import logging
+import threading
+from dotenv import load_dotenv
+from utils.logging_conf import count, METRICS, LATENCY_BUCKETS
+import config
+
+load_dotenv()
+
+logger = logging.getLogger(__name__)
+
+RETRYABLE_CODES = (408, 429, 500, 502, 503, 504)
+
+class GeminiCallError(Exception):
+    """A Gemini call failed for good (retries exhausted or not retryable)."""
+
+class RateLimited(GeminiCallError):
+    """Still throttled (429) when the retries or the deadline ran out."""
+
+class DeadlineExceeded(GeminiCallError, TimeoutError):
+    """The call could not complete (or even start) before its deadline."""
+
+# --- Rate limiting ---
+class TokenBucket:
+    """Refills `per_minute` units per minute; 0 means unlimited."""
+
+    def __init__(self, per_minute: float):
+        self.capacity = float(per_minute)
+        self.rate     = per_minute / 60.0
+        self.level    = float(per_minute)
+        self.updated  = time.monotonic()
+        self._cond    = threading.Condition()
+
+    def _refill(self):
+        now = time.monotonic()
+        self.level   = min(self.capacity, self.level + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def acquire(self, amount: float, deadline: float, reserve: float = 0.0):
+        """
+        Take *amount* units, waiting for the refill if needed. The bucket must
+        keep *reserve* (fraction of capacity) afterwards. Raises
+        `DeadlineExceeded` if that cannot happen before *deadline*.
+        """
+        if not self.capacity:
+            return
+        amount = min(amount, self.capacity * (1 - reserve))
+        floor  = reserve * self.capacity
+        with self._cond:
+            while True:
+                self._refill()
+                if self.level - amount >= floor:
+                    self.level -= amount
+                    return
+                wait = (amount + floor - self.level) / self.rate
+                left = deadline - time.monotonic()
+                if wait > left:
+                    raise DeadlineExceeded("rate limit would delay the call past its deadline")
+                self._cond.wait(wait)
+
+    def debit(self, amount: float):
+        """Correct an estimate after the fact (may leave the bucket in debt)."""
+        if self.capacity:
+            with self._cond:
+                self._refill()
+                self.level -= amount
+
+class CallType:
+    """Concurrency cap, budget share and deadline for one kind of call."""
+
+    def __init__(self, family: str, concurrency: int, deadline: float, reserve: float = 0.0):
+        self.family   = family               # which RPM/TPM buckets it draws from
+        self.slots    = threading.BoundedSemaphore(max(concurrency, 1))
+        self.deadline = deadline
+        self.reserve  = reserve
+
+_buckets = {
+    "embed":    (TokenBucket(config.GEMINI_EMBED_RPM), TokenBucket(config.GEMINI_EMBED_TPM)),
+    "generate": (TokenBucket(config.GEMINI_GENERATE_RPM), TokenBucket(config.GEMINI_GENERATE_TPM)),
+}
+
+CALL_TYPES = {
+    "query_embed":  CallType("embed", config.GEMINI_QUERY_EMBED_CONCURRENCY, config.GEMINI_EMBED_DEADLINE),
+    "ingest_embed": CallType("embed", config.GEMINI_INGEST_EMBED_CONCURRENCY, config.GEMINI_INGEST_DEADLINE,
+                             reserve=config.GEMINI_INGEST_RESERVE),
+    "generate":     CallType("generate", config.GEMINI_GENERATE_CONCURRENCY, config.GEMINI_GENERATE_DEADLINE),
+}
+
+# --- Client ---
+_client = None                          # one client per process, built on first use
+_lock   = threading.Lock()
+
+def get_client():
+    """Shared `genai.Client`; the SDK (~1 s to import) is loaded on first use."""
+    global _client
+    if _client is None:
+        with _lock:
+            if _client is None:
+                from google import genai        # pip install --upgrade google-genai
+                from google.genai import types
+                api_key = os.getenv("GEMINI_KEY") or os.getenv("GEMINI_API_KEY")
+                if not api_key:
+                    raise ValueError("GEMINI_KEY or GEMINI_API_KEY must be set")
+                # retries are done here (with the rate limiter), not by the SDK
+                http_options = types.HttpOptions(base_url=config.GEMINI_BASE_URL or None)
+                _client = genai.Client(api_key=api_key, http_options=http_options)
+    return _client
+
+def estimate_tokens(texts) -> int:
+    """Rough token count (~4 chars/token) used to charge the TPM bucket up front."""
+    return sum(len(t) for t in texts) // 4 + 1
+
+def status_code(exc: Exception) -> int | None:
+    code = getattr(exc, "code", None)
+    if not isinstance(code, int):
+        code = getattr(getattr(exc, "response", None), "status_code", None)
+    return code if isinstance(code, int) else None
+
+def _retry_after(exc: Exception) -> float | None:
+    headers = getattr(getattr(exc, "response", None), "headers", None) or {}
+    try:
+        return float(headers.get("retry-after"))
+    except (TypeError, ValueError):
+        return None
+
+def is_retryable(exc: Exception) -> bool:
+    code = status_code(exc)
+    if code is not None:
+        return code in RETRYABLE_CODES
+    try:
+        import httpx
+        if isinstance(exc, httpx.TransportError):
+            return True
+    except ImportError:
+        pass
+    return isinstance(exc, (ConnectionError, TimeoutError))
+
+def backoff(attempt: int) -> float:
+    """Full-jitter exponential backoff."""
+    return random.uniform(0, min(config.GEMINI_BACKOFF_MAX, config.GEMINI_BACKOFF_BASE * 2 ** attempt))
+
+def _timeout_ms(deadline: float) -> int:
+    return max(int((deadline - time.monotonic()) * 1000), 1)
+
+def call(kind: str, fn, tokens: int = 1, deadline: float | None = None, hold: bool = False):
+    """
+    Run `fn(timeout_ms)` as a *kind* call: rate-limited, concurrency-capped and
+    retried with backoff until it succeeds or *deadline* (monotonic seconds;
+    default: now + the call type's deadline) passes. With *hold*, a successful
+    call keeps its concurrency slot and the caller releases it (streams).
+    """
+    ct = CALL_TYPES[kind]
+    requests, token_bucket = _buckets[ct.family]
+    deadline = deadline or time.monotonic() + ct.deadline
+    attempt  = 0
+    while True:
+        waited = time.monotonic()
+        requests.acquire(1, deadline, ct.reserve)
+        token_bucket.acquire(tokens, deadline, ct.reserve)
+        if not ct.slots.acquire(timeout=max(deadline - time.monotonic(), 0)):
+            raise DeadlineExceeded(f"no free {kind} slot before the deadline")
+        METRICS.observe("askademia_gemini_wait_seconds", time.monotonic() - waited,
+                        buckets=LATENCY_BUCKETS, kind=kind)
+        keep = False
+        try:
+            result = fn(_timeout_ms(deadline))
+            keep   = hold
+            return result
+        except Exception as e:
+            code = status_code(e)
+            if not is_retryable(e) or attempt >= config.GEMINI_MAX_RETRIES:
+                if code == 429:
+                    raise RateLimited(f"{kind}: still rate limited after {attempt} retries") from e
+                raise
+            delay = max(backoff(attempt), _retry_after(e) or 0)
+            if time.monotonic() + delay >= deadline:
+                if code == 429:
+                    raise RateLimited(f"{kind}: rate limited until the deadline") from e
+                raise DeadlineExceeded(f"{kind}: no time left to retry ({e})") from e
+            count("askademia_gemini_retries_total", kind=kind, code=code or "network")
+            logger.warning(f"Gemini {kind} call failed ({code or type(e).__name__}), "
+                           f"retry {attempt + 1} in {delay:.2f}s")
+        finally:
+            if not keep:
+                ct.slots.release()
+        time.sleep(delay)
+        attempt += 1
+
+# --- Embedding ---
+def embed(texts: list[str], model: str, kind: str = "query_embed") -> list[list[float]]:
+    """Vectors for *texts* (one `embed_content` call, API max 100 texts)."""
+    def run(timeout_ms):
+        from google.genai import types
+        resp = get_client().models.embed_content(
+            model=model, contents=list(texts),
+            config=types.EmbedContentConfig(http_options=types.HttpOptions(timeout=timeout_ms)))
+        return [e.values for e in resp.embeddings]
+    return call(kind, run, tokens=estimate_tokens(texts))
+
+# --- Generation ---
+def _generate_config(generation_config: dict, safety_settings: list[dict], timeout_ms: int):
+    from google.genai import types
+    return types.GenerateContentConfig(
+        **generation_config,
+        safety_settings=[types.SafetySetting(**s) for s in safety_settings],
+        http_options=types.HttpOptions(timeout=timeout_ms))
+
+def _charge_usage(response, estimate: int):
+    usage = getattr(response, "usage_metadata", None)
+    total = getattr(usage, "total_token_count", None) if usage else None
+    if total:
+        _buckets["generate"][1].debit(total - estimate)
+
+def generate(prompt: str, model: str, generation_config: dict, safety_settings: list[dict]):
+    """One `generate_content` response."""
+    estimate = estimate_tokens([prompt])
+    def run(timeout_ms):
+        return get_client().models.generate_content(
+            model=model, contents=prompt,
+            config=_generate_config(generation_config, safety_settings, timeout_ms))
+    response = call("generate", run, tokens=estimate)
+    _charge_usage(response, estimate)
+    return response
+
+def _close(it):
+    close = getattr(it, "close", None)
+    if close is not None:
+        close()
+
+def generate_stream(prompt: str, model: str, generation_config: dict, safety_settings: list[dict]):
+    """
+    Iterator over `generate_content_stream` chunks. Opening the stream and
+    receiving the first chunk are retried; later failures propagate (text was
+    already handed out). The generate slot taken for the first chunk is held
+    until the stream ends, and the SDK stream is closed however it ends
+    (exhausted, failed, or the consumer stopped early).
+    """
+    ct       = CALL_TYPES["generate"]
+    estimate = estimate_tokens([prompt])
+
+    def first(timeout_ms):
+        stream = get_client().models.generate_content_stream(
+            model=model, contents=prompt,
+            config=_generate_config(generation_config, safety_settings, timeout_ms))
+        it = iter(stream)
+        try:
+            return it, next(it, None)
+        except BaseException:
+            _close(it)                          # a retry opens a new stream
+            raise
+
+    it, head = call("generate", first, tokens=estimate, hold=True)
+    last = head
+    try:
+        if head is not None:
+            yield head
+        for chunk in it:
+            last = chunk
+            yield chunk
+    finally:
+        _close(it)
+        ct.slots.release()
+        if last is not None:
+            _charge_usage(last, estimate)
+
+def warm_up(model: str):
+    """Build the client and open its connection with a model metadata lookup (no tokens)."""
+    get_client().models.get(model=model)
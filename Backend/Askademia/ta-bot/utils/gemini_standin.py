@@ -0,0 +1,169 @@
+"""
+Local HTTP stand-in for the Gemini REST API, for exercising the client's
+rate limiting, retries and deadlines without a key or quota.
+
+    python utils/gemini_standin.py --port 8089 --rpm 60 --error-rate 0.05 --latency 0.2
+    GEMINI_BASE_URL=http://127.0.0.1:8089 GEMINI_KEY=dummy python src/ta_agent.py
+
+Serves `:embedContent`, `:batchEmbedContents`, `:generateContent`,
+`:streamGenerateContent` (SSE) and `GET models/{model}`. Over *rpm*
+requests per minute it answers 429 RESOURCE_EXHAUSTED with Retry-After,
+*error_rate* of requests get a 503, and every request waits *latency*
+seconds. Embeddings are `fakes.text_vector` of the text, so they are
+deterministic.
+"""
+import sys
+import os
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import re
+import json
+import time
+import random
+import argparse
+import threading
+from collections import deque
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from utils.fakes import text_vector, DIM
+
+ROUTE = re.compile(r"^/[^/]+/models/(?P<model>[^:/?]+)(?::(?P<method>\w+))?")
+ANSWER_WORDS = 60
+
+class StandinState:
+    """Server-side quota window and counters shared by the handler threads."""
+
+    def __init__(self, rpm: int = 0, error_rate: float = 0.0, latency: float = 0.0, dim: int = DIM):
+        self.rpm        = rpm
+        self.error_rate = error_rate
+        self.latency    = latency
+        self.dim        = dim
+        self.window     = deque()               # request times in the last minute
+        self.lock       = threading.Lock()
+        self.counts     = {"ok": 0, "429": 0, "503": 0}
+
+    def admit(self) -> tuple[int, float]:
+        """(status, retry_after) for a new request."""
+        now = time.monotonic()
+        with self.lock:
+            while self.window and now - self.window[0] > 60:
+                self.window.popleft()
+            if self.rpm and len(self.window) >= self.rpm:
+                self.counts["429"] += 1
+                return 429, 60 - (now - self.window[0])
+            self.window.append(now)
+            if random.random() < self.error_rate:
+                self.counts["503"] += 1
+                return 503, 0.0
+            self.counts["ok"] += 1
+            return 200, 0.0
+
+def _texts(content: dict) -> str:
+    return " ".join(p.get("text", "") for p in content.get("parts", []))
+
+def _answer(prompt: str) -> list[str]:
+    seed = sum(prompt.encode("utf-8")) % 1000
+    return [f"word{(seed + i) % 1000} " for i in range(ANSWER_WORDS)]
+
+def _generation(text: str, prompt: str, done: int, last: bool) -> dict:
+    body = {"candidates": [{"content": {"role": "model", "parts": [{"text": text}]}}],
+            "usageMetadata": {"promptTokenCount": len(prompt) // 4, "candidatesTokenCount": done,
+                              "totalTokenCount": len(prompt) // 4 + done}}
+    if last:
+        body["candidates"][0]["finishReason"] = "STOP"
+    return body
+
+def make_handler(state: StandinState):
+    class Handler(BaseHTTPRequestHandler):
+        protocol_version = "HTTP/1.1"
+
+        def log_message(self, fmt, *args):      # keep the console quiet
+            pass
+
+        def _json(self, status: int, body: dict, headers: dict | None = None):
+            data = json.dumps(body).encode("utf-8")
+            self.send_response(status)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(data)))
+            for k, v in (headers or {}).items():
+                self.send_header(k, v)
+            self.end_headers()
+            self.wfile.write(data)
+
+        def _error(self, status: int, retry_after: float = 0.0):
+            names = {429: "RESOURCE_EXHAUSTED", 503: "UNAVAILABLE", 404: "NOT_FOUND"}
+            headers = {"Retry-After": f"{max(retry_after, 1):.0f}"} if status == 429 else None
+            self._json(status, {"error": {"code": status, "status": names.get(status, "UNKNOWN"),
+                                          "message": f"stand-in {names.get(status, status)}"}}, headers)
+
+        def do_GET(self):
+            m = ROUTE.match(self.path)
+            if not m:
+                return self._error(404)
+            self._json(200, {"name": f"models/{m['model']}", "inputTokenLimit": 1_048_576})
+
+        def do_POST(self):
+            body = json.loads(self.rfile.read(int(self.headers.get("Content-Length", 0))) or b"{}")
+            m = ROUTE.match(self.path)
+            if not m:
+                return self._error(404)
+            if state.latency:
+                time.sleep(state.latency)
+            status, retry_after = state.admit()
+            if status != 200:
+                return self._error(status, retry_after)
+
+            method = m["method"]
+            if method == "embedContent":
+                vec = text_vector(_texts(body.get("content", {})), state.dim)
+                return self._json(200, {"embedding": {"values": vec.tolist()}})
+            if method == "batchEmbedContents":
+                return self._json(200, {"embeddings": [
+                    {"values": text_vector(_texts(r.get("content", {})), state.dim).tolist()}
+                    for r in body.get("requests", [])]})
+            prompt = " ".join(_texts(c) for c in body.get("contents", []))
+            words  = _answer(prompt)
+            if method == "generateContent":
+                return self._json(200, _generation("".join(words), prompt, len(words), last=True))
+            if method == "streamGenerateContent":
+                self.send_response(200)
+                self.send_header("Content-Type", "text/event-stream")
+                self.send_header("Connection", "close")
+                self.end_headers()
+                for i in range(0, len(words), 10):
+                    end   = min(i + 10, len(words))
+                    event = _generation("".join(words[i:end]), prompt, end, last=end == len(words))
+                    self.wfile.write(f"data: {json.dumps(event)}\r\n\r\n".encode("utf-8"))
+                    self.wfile.flush()
+                self.close_connection = True
+                return
+            self._error(404)
+
+    return Handler
+
+def start_standin(port: int = 0, **kw) -> tuple[ThreadingHTTPServer, StandinState]:
+    """Serve in a daemon thread; returns the server (see `server_address`) and its state."""
+    state  = StandinState(**kw)
+    server = ThreadingHTTPServer(("127.0.0.1", port), make_handler(state))
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server, state
+
+if __name__ == "__main__":
+    ap = argparse.ArgumentParser(description="Local Gemini API stand-in with quotas and faults.")
+    ap.add_argument("--port", type=int, default=8089)
+    ap.add_argument("--rpm", type=int, default=0, help="requests per minute before 429 (0 = unlimited)")
+    ap.add_argument("--error-rate", type=float, default=0.0, help="fraction of requests answered 503")
+    ap.add_argument("--latency", type=float, default=0.0, help="seconds added to every request")
+    ap.add_argument("--dim", type=int, default=DIM)
+    args = ap.parse_args()
+
+    server, state = start_standin(args.port, rpm=args.rpm, error_rate=args.error_rate,
+                                  latency=args.latency, dim=args.dim)
+    print(f"Gemini stand-in on http://127.0.0.1:{server.server_address[1]} "
+          f"(rpm={args.rpm or 'unlimited'}, errors={args.error_rate:.0%}, latency={args.latency}s)")
+    try:
+        while True:
+            time.sleep(10)
+            print(f"  {state.counts}")
+    except KeyboardInterrupt:
+        server.shutdown()
@@ -0,0 +1,206 @@
+"""
+Logging, per-stage timing spans and metrics for the question-answering path.
+
+    from utils.logging_conf import span, trace, count, observe
+
+    with trace("student_query", sender=sender):     # one per question
+        with span("embed"):                         # timed stage
+            ...
+        count("askademia_answer_cache_total", result="hit")
+
+Every span feeds the `askademia_stage_seconds` histogram (label `stage`) and
+bumps `askademia_stage_errors_total` if it raises. A sampled fraction of
+traces (`TRACE_SAMPLE_RATE`) is written as one JSON line per question to the
+`askademia.trace` logger. `render_metrics()` returns the Prometheus text
+format; `start_metrics_server(port)` serves it on `/metrics`.
+"""
+import os
+import json
+import time
+import uuid
+import random
+import logging
+import threading
+import contextvars
+from contextlib import contextmanager
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+TRACE_SAMPLE_RATE = float(os.getenv("TRACE_SAMPLE_RATE", "0.1"))
+TRACE_LOG_PATH    = os.getenv("TRACE_LOG_PATH")          # default: normal log output
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+SIZE_BUCKETS    = (1, 2, 5, 10, 20, 50, 100, 250, 500, 1000, 2000, 4000, 8000, 16000)
+
+trace_logger = logging.getLogger("askademia.trace")
+
+# --- Metrics registry ---
+class Metrics:
+    """Minimal thread-safe counters and histograms with Prometheus text output."""
+
+    def __init__(self):
+        self._lock       = threading.Lock()
+        self._counters   = {}            # (name, labels) -> float
+        self._histograms = {}            # (name, labels) -> [bucket counts..., +Inf, sum]
+        self._buckets    = {}            # name -> bucket bounds
+
+    @staticmethod
+    def _key(name: str, labels: dict) -> tuple:
+        return name, tuple(sorted((k, str(v)) for k, v in labels.items()))
+
+    def inc(self, name: str, value: float = 1, **labels):
+        key = self._key(name, labels)
+        with self._lock:
+            self._counters[key] = self._counters.get(key, 0) + value
+
+    def observe(self, name: str, value: float, buckets=LATENCY_BUCKETS, **labels):
+        key = self._key(name, labels)
+        with self._lock:
+            bounds = self._buckets.setdefault(name, buckets)
+            h = self._histograms.get(key)
+            if h is None:
+                h = self._histograms[key] = [0] * (len(bounds) + 1) + [0.0]
+            for i, b in enumerate(bounds):
+                if value <= b:
+                    h[i] += 1
+            h[len(bounds)] += 1                  # +Inf bucket doubles as the count
+            h[-1] += value
+
+    def snapshot(self) -> dict:
+        with self._lock:
+            return {"counters": dict(self._counters),
+                    "histograms": {k: list(v) for k, v in self._histograms.items()}}
+
+    def render(self) -> str:
+        """Prometheus text exposition format."""
+        def fmt(labels, extra=()):
+            pairs = list(labels) + list(extra)
+            return "{" + ",".join(f'{k}="{v}"' for k, v in pairs) + "}" if pairs else ""
+
+        snap, lines, typed = self.snapshot(), [], set()
+        for (name, labels), value in sorted(snap["counters"].items()):
+            if name not in typed:
+                lines.append(f"# TYPE {name} counter")
+                typed.add(name)
+            lines.append(f"{name}{fmt(labels)} {value}")
+        for (name, labels), h in sorted(snap["histograms"].items()):
+            if name not in typed:
+                lines.append(f"# TYPE {name} histogram")
+                typed.add(name)
+            bounds = self._buckets[name]
+            for b, n in zip(bounds, h):
+                lines.append(f"{name}_bucket{fmt(labels, [('le', b)])} {n}")
+            lines.append(f"{name}_bucket{fmt(labels, [('le', '+Inf')])} {h[len(bounds)]}")
+            lines.append(f"{name}_sum{fmt(labels)} {h[-1]}")
+            lines.append(f"{name}_count{fmt(labels)} {h[len(bounds)]}")
+        return "\n".join(lines) + "\n"
+
+METRICS = Metrics()
+
+def count(name: str, value: float = 1, **labels):
+    METRICS.inc(name, value, **labels)
+
+def observe(name: str, value: float, buckets=SIZE_BUCKETS, **labels):
+    METRICS.observe(name, value, buckets=buckets, **labels)
+
+def render_metrics() -> str:
+    return METRICS.render()
+
+# --- Traces and spans ---
+class Trace:
+    __slots__ = ("id", "name", "attrs", "spans", "start", "sampled")
+
+    def __init__(self, name: str, attrs: dict, sampled: bool):
+        self.id      = uuid.uuid4().hex[:16]
+        self.name    = name
+        self.attrs   = attrs
+        self.spans   = []
+        self.start   = time.perf_counter()
+        self.sampled = sampled
+
+_current = contextvars.ContextVar("askademia_trace", default=None)
+
+def current_trace() -> Trace | None:
+    return _current.get()
+
+def annotate(**attrs):
+    """Attach attributes (chunk counts, token counts, ...) to the current trace."""
+    t = _current.get()
+    if t is not None:
+        t.attrs.update(attrs)
+
+@contextmanager
+def trace(name: str, **attrs):
+    """
+    Root of one question's timeline. Spans opened inside it (also in worker
+    threads, as long as the context is propagated) are recorded on it.
+    """
+    t = Trace(name, attrs, sampled=random.random() < TRACE_SAMPLE_RATE)
+    token = _current.set(t)
+    status = "ok"
+    try:
+        yield t
+    except BaseException:
+        status = "error"
+        raise
+    finally:
+        _current.reset(token)
+        total = time.perf_counter() - t.start
+        METRICS.observe("askademia_request_seconds", total, kind=name, status=status)
+        if t.sampled:
+            trace_logger.info(json.dumps({"trace_id": t.id, "name": name, "status": status,
+                                          "duration_ms": round(total * 1000, 2),
+                                          "attrs": t.attrs, "spans": t.spans}, default=str))
+
+@contextmanager
+def span(stage: str, **attrs):
+    """Time one pipeline stage; failures are counted per stage and re-raised."""
+    start = time.perf_counter()
+    status = "ok"
+    try:
+        yield
+    except BaseException:
+        status = "error"
+        METRICS.inc("askademia_stage_errors_total", stage=stage)
+        raise
+    finally:
+        elapsed = time.perf_counter() - start
+        METRICS.observe("askademia_stage_seconds", elapsed, stage=stage)
+        t = _current.get()
+        if t is not None and t.sampled:
+            t.spans.append({"stage": stage, "status": status,
+                            "offset_ms": round((start - t.start) * 1000, 2),
+                            "duration_ms": round(elapsed * 1000, 2), **attrs})
+
+def stage_error(stage: str):
+    """Count a failure that a stage reports by return value instead of raising."""
+    METRICS.inc("askademia_stage_errors_total", stage=stage)
+
+# --- Setup / export ---
+def setup_logging(level: int = logging.INFO):
+    logging.basicConfig(level=level)
+    if TRACE_LOG_PATH and not trace_logger.handlers:
+        handler = logging.FileHandler(TRACE_LOG_PATH)
+        handler.setFormatter(logging.Formatter("%(message)s"))
+        trace_logger.addHandler(handler)
+        trace_logger.propagate = False
+
+class _MetricsHandler(BaseHTTPRequestHandler):
+    def do_GET(self):
+        if self.path.split("?")[0] != "/metrics":
+            self.send_error(404)
+            return
+        body = render_metrics().encode()
+        self.send_response(200)
+        self.send_header("Content-Type", "text/plain; version=0.0.4")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *args):            # keep scrapes out of the agent log
+        pass
+
+def start_metrics_server(port: int, host: str = "0.0.0.0") -> ThreadingHTTPServer:
+    """Serve `/metrics` from a daemon thread."""
+    server = ThreadingHTTPServer((host, port), _MetricsHandler)
+    threading.Thread(target=server.serve_forever, name="metrics", daemon=True).start()
+    return server